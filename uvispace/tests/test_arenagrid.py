@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from uvispace.tests.test_geometry import get_quadrants
+from uvispace.uvisensor import arenagrid
+from uvispace.uvisensor import geometry
+
+
+class CoverageGridTestCases(unittest.TestCase):
+    """Tests the rasterized index of the cameras working spaces."""
+
+    def setUp(self):
+        self.limits, self.vertices = get_quadrants(500)
+        self.grid = arenagrid.CoverageGrid(self.limits, resolution=10)
+        self.polygons = geometry.QuadrantPolygons(self.limits)
+        # Points far enough from the perimeters and from the borders
+        # regions limits, where both evaluations must match.
+        distances = self.polygons.get_distances(self.vertices)
+        margin = 10 * np.sqrt(2)
+        ambiguous = ((distances < margin)
+                     | (np.abs(distances - 150) < margin)).any(axis=0)
+        self.valid = ~ambiguous.reshape(500, 3).any(axis=1)
+
+    def test_contains(self):
+        """CoverageGrid contains: It matches QuadrantPolygons off edges."""
+        points = self.vertices[self.valid, 0]
+        np.testing.assert_array_equal(self.grid.contains(points),
+                                      self.polygons.contains(points))
+        # The points outside the grid are not covered.
+        coverage_masks, borders, _ = self.grid.lookup([[1e5, 0], [0, -1e5]])
+        np.testing.assert_array_equal(coverage_masks, [0, 0])
+        np.testing.assert_array_equal(borders, [0, 0])
+
+    def test_in_borders(self):
+        """CoverageGrid in_borders: It matches QuadrantPolygons off edges."""
+        vertices = self.vertices[self.valid]
+        np.testing.assert_array_equal(self.grid.in_borders(vertices),
+                                      self.polygons.in_borders(vertices))
+        np.testing.assert_array_equal(self.grid.in_borders(vertices[0]),
+                                      self.polygons.in_borders(vertices[0]))
+
+    def test_lookup(self):
+        """CoverageGrid lookup: The cells store the masks and distances."""
+        coverage_masks, borders, distances = self.grid.lookup(
+                [[-1000, 700], [5, 700], [1000, -300]])
+        np.testing.assert_array_equal(coverage_masks, [1, 2, 8])
+        np.testing.assert_array_equal(borders, [0, 3, 0])
+        np.testing.assert_allclose(distances, [700, 5, 300], atol=10)
+        # The bitmasks grow with the number of cameras.
+        self.assertEqual(self.grid.coverage.dtype, np.uint8)
+        grid = arenagrid.CoverageGrid(self.limits * 3, resolution=100)
+        self.assertEqual(grid.coverage.dtype, np.uint16)
+        with self.assertRaises(ValueError):
+            arenagrid.CoverageGrid(self.limits, resolution=0)
@@ -0,0 +1,200 @@
+import os
+import time
+import unittest
+import numpy as np
+from uvispace.tests.test_client import FakeFPGA
+from uvispace.uvisensor.asyncclient import AsyncClient, AsyncVideoSensor
+from uvispace.uvisensor.eventloop import (CancelledError, EventLoop, Return,
+                                          TimeoutError, gather, sleep,
+                                          wait_for)
+from uvispace.uvisensor.videosensor import VideoSensor
+
+CONFIG = os.path.join(os.path.dirname(__file__), os.pardir, 'uvisensor',
+                      'resources', 'config', 'simulator', 'video_sensor2.cfg')
+
+
+def session(client, server, coroutine):
+    """Coroutine connecting to the server and running another one."""
+    yield client.open_connection(*server.address)
+    try:
+        result = yield coroutine
+    finally:
+        yield client.close_connection()
+    raise Return(result)
+
+
+class EventLoopTestCases(unittest.TestCase):
+    """Tests the coroutines scheduling of the EventLoop."""
+
+    def test_nested_coroutines(self):
+        """EventLoop run_until_complete: Nested coroutines return values."""
+        loop = EventLoop()
+
+        def inner(value):
+            yield sleep(loop, 0.01)
+            raise Return(value * 2)
+
+        def outer():
+            first = yield inner(1)
+            second = yield inner(first)
+            raise Return([first, second])
+        self.assertEqual(loop.run_until_complete(outer()), [2, 4])
+
+    def test_wait_for_timeout(self):
+        """wait_for: The operation is cancelled after the timeout."""
+        loop = EventLoop()
+        cleaned = []
+
+        def slow():
+            try:
+                yield sleep(loop, 10)
+            except CancelledError:
+                cleaned.append(True)
+                raise
+        start = time.time()
+        with self.assertRaises(TimeoutError):
+            loop.run_until_complete(wait_for(loop, slow(), 0.05))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(cleaned, [True])
+
+    def test_gather(self):
+        """gather: Operations run concurrently and keep their order."""
+        loop = EventLoop()
+        start = time.time()
+        results = loop.run_until_complete(gather(
+                loop, [sleep(loop, 0.1, 'a'), sleep(loop, 0.1, 'b')]))
+        self.assertLess(time.time() - start, 0.18)
+        self.assertEqual(results, ['a', 'b'])
+
+
+class AsyncClientTestCases(unittest.TestCase):
+    """Tests the register operations of the AsyncClient."""
+
+    def test_registers(self):
+        """AsyncClient: Batched reads and writes are matched in order."""
+        server = FakeFPGA(["(10, 20)\n5\n", ["ACK\n", "ACK\n"]])
+        server.start()
+        loop = EventLoop()
+        client = AsyncClient(loop, timeout=0.5)
+
+        def operations():
+            values = yield client.read_registers(['IMAGE_SHAPE',
+                                                  'IMAGE_EXPOSURE'])
+            messages = yield client.write_registers([('IMAGE_EXPOSURE', 1),
+                                                     ('SYSTEM_OUTPUT', 4)])
+            raise Return((values, messages))
+        values, messages = loop.run_until_complete(
+                session(client, server, operations()))
+        server.join(1)
+        self.assertEqual(values, [(10, 20), 5])
+        self.assertEqual(messages, ["ACK\n", "ACK\n"])
+        self.assertEqual(server.requests[2:4], ['w,ie,1', 'w,so,4'])
+
+    def test_late_reply_discarded(self):
+        """AsyncClient: A reply received after its timeout is discarded."""
+        server = FakeFPGA([[0.3, "1\n"], "2\n"])
+        server.start()
+        loop = EventLoop()
+        client = AsyncClient(loop, timeout=0.1)
+
+        def operations():
+            first = yield client.read_registers(['IMAGE_EXPOSURE'])
+            client.timeout = 1.0
+            second = yield client.read_register('IMAGE_EXPOSURE')
+            raise Return((first, second))
+        first, second = loop.run_until_complete(
+                session(client, server, operations()))
+        server.join(1)
+        self.assertEqual(first, [None])
+        self.assertEqual(second, 2)
+
+    def test_late_reply_before_data(self):
+        """AsyncClient: A late reply is not taken as part of the data."""
+        server = FakeFPGA([[0.3, "1\n"], "abcdef"], welcome="Welcome")
+        server.start()
+        loop = EventLoop()
+        client = AsyncClient(loop, timeout=0.1)
+
+        def operations():
+            yield client.read_registers(['IMAGE_EXPOSURE'])
+            client.timeout = 1.0
+            buffer = bytearray(6)
+            yield client.write_command('GET_GRAY_IMAGE')
+            nbytes = yield client.read_into(buffer)
+            raise Return((nbytes, str(buffer)))
+        result = loop.run_until_complete(session(client, server,
+                                                 operations()))
+        server.join(1)
+        self.assertEqual(result, (6, 'abcdef'))
+
+    def test_concurrent_clients(self):
+        """AsyncClient: Several devices are served by a single thread."""
+        servers = [FakeFPGA([[0.2, "{}\n".format(index)]])
+                   for index in range(3)]
+        loop = EventLoop()
+        operations = []
+        for server in servers:
+            server.start()
+            client = AsyncClient(loop, timeout=1.0)
+            operations.append(session(client, server,
+                                      client.read_register('IMAGE_EXPOSURE')))
+        start = time.time()
+        values = loop.run_until_complete(gather(loop, operations))
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(values, [0, 1, 2])
+
+
+class AsyncVideoSensorTestCases(unittest.TestCase):
+    """Tests the frame capture of the AsyncVideoSensor."""
+
+    def test_capture_frame(self):
+        """AsyncVideoSensor capture_frame: The frame fills the buffer."""
+        loop = EventLoop()
+        sensor = AsyncVideoSensor(loop, CONFIG, timeout=1.0)
+        frame = np.arange(486 * 648, dtype=np.uint8)
+        server = FakeFPGA(["Image captured.\n", [frame.tostring()]])
+        server.start()
+        image = loop.run_until_complete(session(sensor._client, server,
+                                                sensor.capture_frame()))
+        server.join(1)
+        self.assertEqual(image.shape, (486, 648))
+        np.testing.assert_array_equal(image.ravel(), frame)
+        self.assertEqual(server.requests[:2], ['S', 'G'])
+        # The configuration is read without creating a blocking client.
+        self.assertIsNone(sensor._sensor._client)
+
+    def test_startup(self):
+        """AsyncVideoSensor startup: Only the changed registers are written."""
+        loop = EventLoop()
+        sensor = AsyncVideoSensor(loop, CONFIG, timeout=1.0)
+        # The FPGA holds the configuration, except for the exposure.
+        registers = dict(sensor._sensor.get_configuration_registers())
+        registers['IMAGE_EXPOSURE'] = 1000
+        reads = ''.join('{}\n'.format(registers[register]) for register
+                        in VideoSensor.SHADOW_REGISTERS)
+        count = len(VideoSensor.SHADOW_REGISTERS)
+        server = FakeFPGA([reads] + [''] * (count - 1) + ["ACK\n"] * 3
+                          + ["Camera configured.\n"])
+        server.start()
+        sensor._ip, sensor._port = server.address
+
+        def operations():
+            yield sensor.startup()
+            yield sensor._client.close_connection()
+        loop.run_until_complete(operations())
+        server.join(1)
+        self.assertEqual(server.requests[count:],
+                         ['w,ie,1111', 'w,fa,', 'w,so,4', 'C', 'Q'])
+        self.assertEqual(sensor._sensor._shadow['SYSTEM_OUTPUT'], '4')
+
+    def test_capture_tries(self):
+        """AsyncVideoSensor capture_frame: The tries are in the error."""
+        loop = EventLoop()
+        sensor = AsyncVideoSensor(loop, CONFIG, timeout=0.05)
+        server = FakeFPGA([[], [], []])
+        server.start()
+        with self.assertRaises(TimeoutError) as context:
+            loop.run_until_complete(session(sensor._client, server,
+                                            sensor.capture_frame(tries=2)))
+        server.join(1)
+        self.assertIn("after 2 tries", str(context.exception))
@@ -0,0 +1,210 @@
+import ast
+import socket
+import threading
+import time
+import unittest
+from uvispace.uvisensor.client import Client
+from uvispace.uvisensor.tracer import ProtocolTracer
+
+
+class FakeFPGA(threading.Thread):
+    """Minimal TCP server answering with a list of scripted chunks.
+
+    Every time a newline terminated request is received, the next
+    element of *replies* is sent. A reply can be a list of strings, that
+    are sent as separate chunks in order to emulate TCP segmentation.
+    Numbers in the list are delays, in seconds, before the next chunk.
+    """
+
+    def __init__(self, replies, welcome="Welcome\n"):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.replies = list(replies)
+        self.welcome = welcome
+        self.requests = []
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.address = self.server.getsockname()
+
+    def run(self):
+        connection, _ = self.server.accept()
+        connection.sendall(self.welcome)
+        data = ''
+        while True:
+            package = connection.recv(1024)
+            if not package:
+                break
+            data += package
+            # Gather all the complete requests before answering them.
+            while '\n' in data:
+                line, data = data.split('\n', 1)
+                self.requests.append(line)
+                if line == 'Q':
+                    connection.close()
+                    self.server.close()
+                    return
+                if self.replies:
+                    chunks = self.replies.pop(0)
+                    if isinstance(chunks, str):
+                        chunks = [chunks]
+                    for chunk in chunks:
+                        if isinstance(chunk, float):
+                            time.sleep(chunk)
+                            continue
+                        connection.sendall(chunk)
+                        # Let the client receive each chunk separately.
+                        time.sleep(0.01)
+        connection.close()
+        self.server.close()
+
+
+def connect(server):
+    server.start()
+    client = Client(timeout=0.5)
+    client.open_connection(*server.address)
+    return client
+
+
+class ClientBatchTestCases(unittest.TestCase):
+    """Tests the batch register operations of the Client."""
+
+    def test_read_registers(self):
+        """Client read_registers: Replies are matched in order."""
+        server = FakeFPGA(["(10, 20)\n", "5\n", "{'1': [[1, 2]]}\n"])
+        client = connect(server)
+        values = client.read_registers(['IMAGE_SHAPE', 'IMAGE_EXPOSURE',
+                                        'ACTUAL_LOCATION'])
+        client.close_connection()
+        server.join(1)
+        self.assertEqual(values, [(10, 20), 5, {'1': [[1, 2]]}])
+        self.assertEqual(server.requests[:3], ['r,is', 'r,ie', 'r,al'])
+
+    def test_write_registers(self):
+        """Client write_registers: Missing replies are reported."""
+        server = FakeFPGA(["ACK\n", []])
+        client = connect(server)
+        messages = client.write_registers([('IMAGE_EXPOSURE', 1111),
+                                           ('SYSTEM_OUTPUT', 4)])
+        client.close_connection()
+        server.join(1)
+        self.assertEqual(messages, ["ACK\n", "EMPTY BUFFER"])
+        self.assertEqual(server.requests[:2], ['w,ie,1111', 'w,so,4'])
+
+
+class ClientReadIntoTestCases(unittest.TestCase):
+    """Tests the reception of data into preallocated buffers."""
+
+    def test_read_into(self):
+        """Client read_into: Fragmented data fills the buffer."""
+        frame = ''.join(chr(value % 256) for value in range(3000))
+        server = FakeFPGA([[frame[:1000], frame[1000:2500], frame[2500:]]])
+        client = connect(server)
+        buffer = bytearray(4000)
+        client.send('G\n')
+        nbytes = client.read_into(buffer, len(frame))
+        client.close_connection()
+        server.join(1)
+        self.assertEqual(nbytes, len(frame))
+        self.assertEqual(str(buffer[:nbytes]), frame)
+        with self.assertRaises(ValueError):
+            client.read_into(bytearray(10), 20)
+
+
+class ClientFramingTestCases(unittest.TestCase):
+    """Tests the reassembly of the FPGA replies into messages."""
+
+    def test_split_reply(self):
+        """Client read_register: A reply split in several segments."""
+        server = FakeFPGA([["{'1': [[1", ", 2], [3, ", "4]]}\n"]])
+        client = connect(server)
+        value = client.read_register('ACTUAL_LOCATION')
+        client.close_connection()
+        server.join(1)
+        self.assertEqual(value, {'1': [[1, 2], [3, 4]]})
+
+    def test_coalesced_replies(self):
+        """Client read_message: Leftover bytes are kept between calls."""
+        server = FakeFPGA(["Image captured.\n(10, 20)\n", []],
+                          welcome="Welcome\n")
+        client = connect(server)
+        message = client.write_command('GET_NEW_FRAME', True)
+        client.sendall('r,is\n')
+        value = ast.literal_eval(client.read_message())
+        client.close_connection()
+        server.join(1)
+        self.assertEqual(message, "Image captured.\n")
+        self.assertEqual(value, (10, 20))
+
+    def test_unterminated_welcome(self):
+        """Client open_connection: A welcome without newline is discarded."""
+        server = FakeFPGA(["5\n"], welcome="Welcome")
+        start_time = time.time()
+        client = connect(server)
+        elapsed = time.time() - start_time
+        value = client.read_register('IMAGE_EXPOSURE')
+        client.close_connection()
+        server.join(1)
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(value, 5)
+
+    def test_message_followed_by_data(self):
+        """Client read_into: Data coalesced after a text message."""
+        server = FakeFPGA([["Image captured.\nabc", "def"]])
+        client = connect(server)
+        message = client.write_command('GET_NEW_FRAME', True)
+        buffer = bytearray(6)
+        nbytes = client.read_into(buffer)
+        client.close_connection()
+        server.join(1)
+        self.assertEqual(message, "Image captured.\n")
+        self.assertEqual((nbytes, str(buffer)), (6, 'abcdef'))
+
+
+class ClientTracingTestCases(unittest.TestCase):
+    """Tests the timing of the operations of the Client."""
+
+    def test_tracing(self):
+        """Client tracer: Every operation is recorded with its bytes."""
+        frame = 'x' * 1000
+        server = FakeFPGA(["(10, 20)\n", "ACK\n", "5\n", "6\n", [frame],
+                           "Image captured.\n"])
+        client = connect(server)
+        client.tracer = ProtocolTracer()
+        client.read_register('IMAGE_SHAPE')
+        client.write_register('IMAGE_EXPOSURE', 1111)
+        client.read_registers(['IMAGE_EXPOSURE', 'SYSTEM_OUTPUT'])
+        buffer = bytearray(len(frame))
+        nbytes = client.read_command_data('GET_GRAY_IMAGE', buffer)
+        client_tracer, client.tracer = client.tracer, None
+        # Not traced.
+        client.write_command('GET_NEW_FRAME', True)
+        client.close_connection()
+        server.join(1)
+        self.assertEqual(nbytes, len(frame))
+        self.assertEqual(client_tracer.keys,
+                         ['r:IMAGE_SHAPE', 'w:IMAGE_EXPOSURE',
+                          'r:IMAGE_EXPOSURE', 'r:SYSTEM_OUTPUT',
+                          'GET_GRAY_IMAGE'])
+        statistics = client_tracer.get_statistics()
+        self.assertEqual(statistics['r:IMAGE_SHAPE']['sent'], len('r,is\n'))
+        self.assertEqual(statistics['r:IMAGE_SHAPE']['received'],
+                         len('(10, 20)\n'))
+        self.assertEqual(statistics['w:IMAGE_EXPOSURE']['sent'],
+                         len('w,ie,1111\n'))
+        self.assertEqual(statistics['GET_GRAY_IMAGE']['received'], 1000)
+        events = client_tracer.events
+        self.assertEqual(len(events), 5)
+        # The batch registers share the start and round trip times.
+        self.assertEqual(events['start'][2], events['start'][3])
+        self.assertEqual(events['duration'][2], events['duration'][3])
+        self.assertTrue(all(events['duration'] > 0))
+
+    def test_disabled(self):
+        """Client tracer: Nothing is recorded without a tracer."""
+        server = FakeFPGA(["5\n"])
+        client = connect(server)
+        self.assertIsNone(client.tracer)
+        self.assertEqual(client.read_register('IMAGE_EXPOSURE'), 5)
+        client.close_connection()
+        server.join(1)
@@ -0,0 +1,66 @@
+import os
+import unittest
+import numpy as np
+from uvispace.uvisensor import framebus
+
+
+class FrameBusTestCases(unittest.TestCase):
+    """Tests the shared memory ring of frames."""
+
+    def setUp(self):
+        self.name = 'test_{}'.format(os.getpid())
+        self.bus = framebus.FrameBus(self.name, (4, 6, 3), slots=4)
+
+    def tearDown(self):
+        self.bus.close()
+
+    def publish(self, values):
+        for value in values:
+            self.bus.publish(np.full((4, 6, 3), value, dtype=np.uint8))
+
+    def test_readers(self):
+        """FrameBusReader: Several readers get every frame in order."""
+        readers = [framebus.FrameBusReader(self.name) for _ in range(3)]
+        self.assertEqual(readers[0].shape, (4, 6, 3))
+        self.assertEqual(readers[0].get_frame(timeout=0.01),
+                         (None, None, None))
+        self.publish([10, 11])
+        for reader in readers:
+            first = reader.get_frame(timeout=0.01)
+            second = reader.get_frame(timeout=0.01)
+            self.assertEqual((first[0], second[0]), (1, 2))
+            self.assertEqual((first[2][0, 0, 0], second[2][0, 0, 0]),
+                             (10, 11))
+            self.assertEqual(reader.overruns, 0)
+        # The frames are read-only views over the shared memory.
+        self.assertFalse(second[2].flags.writeable)
+        self.publish([12])
+        self.assertEqual(readers[0].get_frame()[2][0, 0, 0], 12)
+
+    def test_overrun(self):
+        """FrameBusReader: A slow reader skips the overwritten frames."""
+        reader = framebus.FrameBusReader(self.name)
+        self.publish([1])
+        sequence, _, frame = reader.get_frame(timeout=0.01)
+        self.publish(range(2, 9))
+        # The frame being processed was overwritten meanwhile.
+        self.assertFalse(reader.is_valid(sequence))
+        sequence, _, frame = reader.get_frame(timeout=0.01)
+        self.assertEqual(sequence, 8)
+        self.assertEqual(frame[0, 0, 0], 8)
+        self.assertEqual(reader.overruns, 6)
+        self.assertTrue(reader.is_valid(sequence))
+
+    def test_invalid_slot_timeout(self):
+        """FrameBusReader: The timeout holds while a slot is invalid."""
+        reader = framebus.FrameBusReader(self.name)
+        self.publish([1])
+        # The producer cleared the slot, as if it was rewriting it.
+        self.bus._ring.sequences[1] = 0
+        self.assertEqual(reader.get_frame(timeout=0.05), (None, None, None))
+        self.assertEqual(reader.sequence, 0)
+
+    def test_missing_bus(self):
+        """FrameBusReader: Attaching to an unknown bus fails."""
+        with self.assertRaises(IOError):
+            framebus.FrameBusReader('{}_missing'.format(self.name))
@@ -0,0 +1,212 @@
+import unittest
+import numpy as np
+from uvispace.uvisensor import geometry
+
+
+def get_triangle(center, angle, height=60, base=30):
+    """Return the vertices of an isosceles triangle, front one first."""
+    along = np.array([np.cos(angle), np.sin(angle)])
+    across = np.array([-along[1], along[0]])
+    midpoint = center - height / 3.0 * along
+    return np.array([midpoint + height * along,
+                     midpoint + base / 2.0 * across,
+                     midpoint - base / 2.0 * across])
+
+
+def get_quadrants(count, seed=0):
+    """Return 4 quadrants of a 4000x3000 mm space and random triangles.
+
+    The last quadrant is clockwise. The vertices of the triangles are
+    spread over the quadrants and a 500 mm margin around them.
+    """
+    limits = []
+    for x, y in [(-2000, 0), (0, 0), (-2000, -1500), (0, -1500)]:
+        limits.append(np.array([[x, y], [x + 2000, y],
+                                [x + 2000, y + 1500], [x, y + 1500]]))
+    limits[3] = limits[3][::-1]
+    random = np.random.RandomState(seed)
+    return limits, random.uniform(-2500, 2500, [count, 3, 2])
+
+
+class ProjectiveTestCases(unittest.TestCase):
+    """Tests the projective transformations of points."""
+
+    def test_projective_transform(self):
+        """Function projective_transform: N points are projected at once."""
+        H = np.array([[1.1, 0.05, 3], [0.02, 0.9, -4], [1e-4, 2e-5, 1]])
+        points = np.random.RandomState(0).uniform(-500, 500, [20, 3, 2])
+        expected = np.zeros(points.shape)
+        for index in np.ndindex(points.shape[:2]):
+            product = np.dot(H, np.hstack([points[index], 1]))
+            expected[index] = product[:2] / product[2]
+        np.testing.assert_allclose(geometry.projective_transform(points, H),
+                                   expected)
+        # The inverse homography of a triangle undoes the direct one.
+        triangle = geometry.Triangle(points[0])
+        triangle.homography(H)
+        triangle.inverse_homography(H)
+        np.testing.assert_allclose(triangle.vertices, points[0], atol=1e-3)
+
+
+class MomentsTestCases(unittest.TestCase):
+    """Tests the triangle fitting with the moments of a contour."""
+
+    def test_polygon_moments(self):
+        """Function get_polygon_moments: The moments of a square are exact."""
+        square = np.array([[0, 0], [4, 0], [4, 2], [0, 2], [0, 0]])
+        area, centroid, covariance, third = geometry.get_polygon_moments(
+                square)
+        self.assertAlmostEqual(area, 8)
+        np.testing.assert_allclose(centroid, [2, 1])
+        np.testing.assert_allclose(covariance, [[16 / 12.0, 0],
+                                                [0, 4 / 12.0]], atol=1e-12)
+        np.testing.assert_allclose(third, 0, atol=1e-12)
+        # The orientation of the contour does not change the moments.
+        reverse = geometry.get_polygon_moments(square[::-1])
+        self.assertAlmostEqual(reverse[0], area)
+        np.testing.assert_allclose(reverse[2], covariance, atol=1e-12)
+        self.assertIsNone(geometry.get_polygon_moments([[0, 0], [1, 1]]))
+
+    def test_moments_triangle(self):
+        """Function get_moments_triangle: Triangles keep their pose."""
+        for angle in np.linspace(-np.pi, np.pi, 13):
+            vertices = get_triangle(np.array([300.0, 200.0]), angle)
+            # Contour with the vertices and the middle points of the sides,
+            # in the format of the FPGA trackers.
+            middle = (vertices + np.roll(vertices, -1, axis=0)) / 2
+            contour = np.array([vertices[0], middle[0], vertices[1],
+                                middle[1], vertices[2], middle[2],
+                                vertices[0]])
+            fitted = geometry.get_moments_triangle(contour)
+            np.testing.assert_allclose(fitted, vertices, atol=1e-6)
+            pose = geometry.Triangle(fitted, cartesian=True).get_pose()
+            expected = geometry.Triangle(vertices, cartesian=True).get_pose()
+            np.testing.assert_allclose(pose, expected, atol=1e-3)
+
+    def test_rejected_shapes(self):
+        """Function get_moments_triangle: Other shapes are rejected."""
+        rectangle = np.array([[0, 0], [10, 0], [10, 30], [0, 30]])
+        self.assertIsNone(geometry.get_moments_triangle(rectangle))
+        circle = 10 * np.column_stack([np.cos(np.linspace(0, 6, 30)),
+                                       np.sin(np.linspace(0, 6, 30))])
+        self.assertIsNone(geometry.get_moments_triangle(circle))
+        small = get_triangle(np.array([0.0, 0.0]), 0, height=6, base=3)
+        self.assertIsNone(geometry.get_moments_triangle(small, min_area=64))
+        self.assertIsNone(geometry.get_moments_triangle(small[:2]))
+
+
+class TriangleBatchTestCases(unittest.TestCase):
+    """Tests the vectorized operations of the TriangleBatch class."""
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.vertices = random.uniform(0, 500, [50, 3, 2]).astype(np.float32)
+        self.batch = geometry.TriangleBatch(self.vertices)
+        self.triangles = [geometry.Triangle(vertices)
+                          for vertices in self.vertices]
+
+    def assert_equivalent(self, attribute, values, decimal=4):
+        expected = [getattr(triangle, attribute)
+                    for triangle in self.triangles]
+        np.testing.assert_almost_equal(values, expected, decimal)
+
+    def test_pose(self):
+        """TriangleBatch get_pose: Poses and windows match the Triangle."""
+        poses = self.batch.get_pose()
+        expected = [triangle.get_pose() for triangle in self.triangles]
+        np.testing.assert_almost_equal(poses, expected, 5)
+        self.assert_equivalent('sides', self.batch.sides)
+        windows = self.batch.get_window(0, (485, 647))
+        for triangle in self.triangles:
+            triangle.get_window(0, (485, 647))
+        self.assert_equivalent('window', windows, 3)
+
+    def test_transformations(self):
+        """TriangleBatch homography: The transformations match Triangle."""
+        H = np.array([[1.1, 0.05, 3], [0.02, 0.9, -4], [1e-4, 2e-5, 1]])
+        self.batch.get_pose()
+        self.batch.local2global([486, 0], K=4)
+        self.batch.homography(H)
+        for triangle in self.triangles:
+            triangle.get_pose()
+            triangle.local2global([486, 0], K=4)
+            triangle.homography(H)
+        self.assertTrue(self.batch.isglobal and self.batch.cartesian)
+        self.assert_equivalent('vertices', self.batch.vertices, 2)
+        self.assert_equivalent('midpoint', self.batch.midpoints, 2)
+        self.batch.inverse_homography(H)
+        self.batch.global2local([486, 0])
+        np.testing.assert_almost_equal(self.batch.vertices, self.vertices, 2)
+        self.assertFalse(self.batch.isglobal or self.batch.cartesian)
+
+    def test_in_borders(self):
+        """TriangleBatch in_borders: The flags match the Triangle ones."""
+        limits = [[0, 0], [400, 0], [400, 300], [0, 300]]
+        for tolerance in (10, 50, 150):
+            flags = self.batch.in_borders(limits, tolerance)
+            expected = [triangle.in_borders(limits, tolerance)
+                        for triangle in self.triangles]
+            np.testing.assert_array_equal(flags, expected)
+
+    def test_views(self):
+        """TriangleBatch __getitem__: Triangle views share the batch data."""
+        self.batch.get_pose()
+        triangle = self.batch[3]
+        self.assertIsInstance(triangle, geometry.Triangle)
+        self.assertAlmostEqual(triangle.angle, self.batch.angles[3])
+        # The views share the data with the batch.
+        self.batch.local2global([486, 0], K=4, image2cartesian=False)
+        np.testing.assert_array_equal(triangle.vertices,
+                                      self.batch.vertices[3])
+        np.testing.assert_array_equal(triangle.midpoint,
+                                      self.batch.midpoints[3])
+        self.assertEqual(len(list(self.batch)), 50)
+        batch = geometry.TriangleBatch.from_triangles(self.triangles[:5])
+        np.testing.assert_array_equal(batch.vertices, self.vertices[:5])
+        with self.assertRaises(ValueError):
+            geometry.TriangleBatch(self.vertices[0])
+
+
+class QuadrantPolygonsTestCases(unittest.TestCase):
+    """Tests the vectorized evaluations of the cameras working spaces."""
+
+    def setUp(self):
+        self.limits, self.vertices = get_quadrants(30)
+        self.polygons = geometry.QuadrantPolygons(self.limits)
+
+    def test_distances(self):
+        """QuadrantPolygons get_distances: They match the Segment ones."""
+        points = self.vertices[:, 0]
+        distances = self.polygons.get_distances(points)
+        self.assertEqual(distances.shape, (4, 30))
+        for index, limits in enumerate(self.limits):
+            for point, distance in zip(points, distances[index]):
+                expected = min(geometry.Segment(
+                        limits[side], limits[side - 1]).distance2point(point)
+                               for side in range(4))
+                self.assertAlmostEqual(distance, expected)
+
+    def test_in_borders(self):
+        """QuadrantPolygons in_borders: N cameras and R triangles at once."""
+        flags = self.polygons.in_borders(self.vertices)
+        self.assertEqual(flags.shape, (4, 30))
+        for index, limits in enumerate(self.limits):
+            expected = [geometry.Triangle(vertices).in_borders(limits)
+                        for vertices in self.vertices]
+            np.testing.assert_array_equal(flags[index], expected)
+        # A single triangle.
+        np.testing.assert_array_equal(
+                self.polygons.in_borders(self.vertices[0]), flags[:, :1])
+
+    def test_contains(self):
+        """QuadrantPolygons contains: Points are assigned to quadrants."""
+        points = np.array([[-1000, 700], [1000, 700], [-1000, -700],
+                           [1000, -700], [3000, 0], [0, 0]])
+        inside = self.polygons.contains(points)
+        expected = np.zeros([4, 6], dtype=bool)
+        expected[range(4), range(4)] = True
+        # The common corner belongs to every quadrant.
+        expected[:, 5] = True
+        np.testing.assert_array_equal(inside, expected)
+        with self.assertRaises(ValueError):
+            geometry.QuadrantPolygons(self.limits[0])
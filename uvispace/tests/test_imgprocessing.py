@@ -0,0 +1,222 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import numpy as np
+from uvispace.uvisensor import geometry
+from uvispace.uvisensor import imgprocessing
+from uvispace.uvisensor.resources import sim_fpga
+
+# Red thresholds of the simulator configuration.
+THRESHOLDS = (551040525, 784051947)
+
+
+class ImageWindowsTestCases(unittest.TestCase):
+    """Tests the processing of the image restricted to windows."""
+
+    def setUp(self):
+        arena = sim_fpga.SimulatedArena((1296, 972), robots=3, seed=3)
+        frame = arena.render((486, 648), 158)
+        self.full = imgprocessing.Image(frame)
+        self.full.binarize(THRESHOLDS)
+        self.full.get_shapes()
+        self.windows = []
+        for triangle in self.full.triangles:
+            triangle.get_pose()
+            self.windows.append(triangle.get_window(0, (485, 647)))
+        self.image = imgprocessing.Image(frame)
+
+    def test_shapes(self):
+        """Image get_shapes: The windows give the full frame triangles."""
+        self.assertEqual(len(self.full.triangles), 3)
+        self.image.binarize(THRESHOLDS, self.windows)
+        triangles = self.image.get_shapes(windows=self.windows)
+        self.assertEqual(len(triangles), len(self.full.triangles))
+        expected = sorted(triangle.vertices.tolist()
+                          for triangle in self.full.triangles)
+        found = sorted(triangle.vertices.tolist() for triangle in triangles)
+        np.testing.assert_allclose(found, expected)
+
+    def test_outside_windows(self):
+        """Image binarize: The pixels outside the windows are 0."""
+        binarized = self.image.binarize(THRESHOLDS, self.windows[:1])
+        (min_row, min_col), (max_row, max_col) = self.windows[0]
+        inside = np.zeros(binarized.shape, dtype=bool)
+        inside[int(min_row):int(np.ceil(max_row)) + 1,
+               int(min_col):int(np.ceil(max_col)) + 1] = True
+        self.assertFalse(binarized[~inside].any())
+        self.assertTrue(binarized[inside].any())
+        self.assertEqual(len(self.image.get_shapes(
+                windows=self.windows[:1])), 1)
+
+    def test_window_regions(self):
+        """get_window_regions: Windows are clipped and merged."""
+        windows = [np.array([[-5.5, 10.2], [20.1, 30]]),
+                   np.array([[15, 25], [40, 50]]),
+                   np.array([[100, 600], [120, 700]])]
+        regions = imgprocessing.get_window_regions(windows, (486, 648))
+        self.assertEqual(regions, [(slice(0, 41), slice(10, 51)),
+                                   (slice(100, 121), slice(600, 648))])
+
+
+class BinarizeBackendsTestCases(unittest.TestCase):
+    """Compares the binarization backends on simulated frames."""
+
+    def setUp(self):
+        # Frames with several sizes, positions and number of triangles.
+        # The noise is seeded, as it can leave holes inside the shapes,
+        # that are only filled by the opencv backend.
+        np.random.seed(0)
+        self.frames = []
+        for seed in range(6):
+            arena = sim_fpga.SimulatedArena((1296, 972), robots=seed % 3 + 1,
+                                            seed=seed)
+            for timestamp in (0, 5, 10):
+                self.frames.append(arena.render((486, 648), 158, timestamp,
+                                                noise=140))
+
+    def binarize(self, frame, backend):
+        start_time = time.time()
+        mask = imgprocessing.Image(frame).binarize(THRESHOLDS,
+                                                   backend=backend)
+        return mask.copy(), time.time() - start_time
+
+    def test_identical_masks(self):
+        """Image binarize: The opencv backend gives the same masks."""
+        timings = {'skimage': 0, 'opencv': 0}
+        for frame in self.frames:
+            masks = {}
+            for backend in timings:
+                masks[backend], duration = self.binarize(frame, backend)
+                timings[backend] += duration
+            self.assertEqual(masks['opencv'].dtype, np.uint8)
+            np.testing.assert_array_equal(masks['opencv'], masks['skimage'])
+        self.assertLess(timings['opencv'], timings['skimage'],
+                        "Timings: {}".format(timings))
+
+    def test_holes(self):
+        """Image binarize: The opencv backend fills the shapes' holes."""
+        frame = np.zeros((100, 100), dtype=np.uint8)
+        frame[20:60, 30:80] = 158
+        frame[35:40, 50:55] = 0
+        mask, _ = self.binarize(frame, 'opencv')
+        self.assertTrue(mask[20:60, 30:80].all())
+        self.assertEqual(np.count_nonzero(mask), 40 * 50)
+        with self.assertRaises(ValueError):
+            self.binarize(frame, 'numpy')
+
+
+class DistortionTestCases(unittest.TestCase):
+    """Tests the distortion correction with precalculated maps."""
+
+    def setUp(self):
+        self.shape = (486, 648)
+        self.maps = imgprocessing.get_distortion_maps(self.shape)
+        # Subpixel points all over the image, as the contours points.
+        generator = np.random.RandomState(0)
+        self.points = generator.uniform(0, 1, (200, 2)) * [485, 647]
+
+    def polynomial(self, points, kx=0.035, ky=0.035):
+        """Distortion model, evaluated as in the original implementation."""
+        center = np.array(self.shape) / 2
+        distance = points - center
+        r = (distance ** 2).sum(axis=1).astype(np.float)
+        r /= (center ** 2).sum() * 2
+        coeffs = np.array([r * ky, r * kx]).transpose() + 1
+        return distance * coeffs + center
+
+    def test_contours(self):
+        """Image correct_distortion: Contours match the polynomial."""
+        image = imgprocessing.Image(np.zeros(self.shape, dtype=np.uint8),
+                                    [self.points[:100], self.points[100:]])
+        image.correct_distortion()
+        np.testing.assert_allclose(np.vstack(image.contours),
+                                   self.polynomial(self.points), atol=1e-3)
+        # The same maps are reused.
+        self.assertIs(imgprocessing.get_distortion_maps(self.shape),
+                      self.maps)
+
+    def test_image(self):
+        """Image correct_distortion: Pixels are moved as the contours."""
+        frame = np.zeros(self.shape, dtype=np.uint8)
+        frame[100:110, 50:60] = 255
+        image = imgprocessing.Image(frame, [])
+        image.correct_distortion(only_contours=False)
+        self.assertEqual(image.image.shape, self.shape)
+        # The center of the square is moved to its corrected position.
+        rows, cols = np.nonzero(image.image > 127)
+        expected = self.polynomial(np.array([[104.5, 54.5]]))[0]
+        np.testing.assert_allclose([rows.mean(), cols.mean()], expected,
+                                   atol=0.5)
+
+    def test_disk_cache(self):
+        """get_distortion_maps: The maps are saved and loaded."""
+        folder = tempfile.mkdtemp()
+        try:
+            maps = imgprocessing.get_distortion_maps((48, 64), 0.02, 0.03,
+                                                     folder)
+            self.assertEqual(len(os.listdir(folder)), 1)
+            imgprocessing._distortion_maps.clear()
+            loaded = imgprocessing.get_distortion_maps((48, 64), 0.02, 0.03,
+                                                       folder)
+        finally:
+            shutil.rmtree(folder)
+        self.assertIsNot(loaded, maps)
+        for name, array in maps.arrays.items():
+            np.testing.assert_array_equal(loaded.arrays[name], array)
+
+
+class ShapesBackendsTestCases(unittest.TestCase):
+    """Compares the shapes extraction backends on simulated frames."""
+
+    def setUp(self):
+        arena = sim_fpga.SimulatedArena((1296, 972), robots=3, seed=3)
+        self.image = imgprocessing.Image(arena.render((486, 648), 158))
+        self.image.binarize(THRESHOLDS)
+        self.reference = [triangle.vertices for triangle
+                          in self.image.get_shapes()]
+
+    def assert_triangles(self, triangles, tolerance):
+        """Check that each reference triangle has a near triangle."""
+        self.assertEqual(len(triangles), len(self.reference))
+        for vertices in self.reference:
+            errors = [np.abs(np.sort(vertices, axis=0)
+                             - np.sort(triangle.vertices, axis=0)).max()
+                      for triangle in triangles]
+            self.assertLess(min(errors), tolerance)
+
+    def test_opencv(self):
+        """Image get_shapes: The opencv backend finds the same triangles."""
+        # The polygon vertices can be different contour points, within
+        # the approximation tolerance.
+        self.assert_triangles(self.image.get_shapes(backend='opencv'), 4)
+        # The contours are in image coordinates, as with skimage.
+        windows = []
+        for triangle in self.image.triangles:
+            triangle.get_pose()
+            windows.append(triangle.get_window(0, (485, 647)))
+        self.assert_triangles(self.image.get_shapes(windows=windows,
+                                                    backend='opencv'), 4)
+        with self.assertRaises(ValueError):
+            self.image.get_shapes(backend='numpy')
+
+    def test_enclosing_triangle(self):
+        """Image get_shapes: The enclosing triangles contain the shapes."""
+        triangles = self.image.get_shapes(backend='opencv', fit='enclosing')
+        self.assert_triangles(triangles, 8)
+        for triangle in triangles:
+            self.assertIsInstance(triangle, geometry.Triangle)
+        # The noise contours are not fitted.
+        self.assertIsNone(imgprocessing.get_enclosing_triangle(
+                np.array([[0, 0], [0, 2], [2, 0]]), min_area=64))
+        self.assertIsNone(imgprocessing.get_enclosing_triangle(
+                np.array([[0, 0], [0, 5], [0, 10]])))
+
+    def test_moments_triangle(self):
+        """Image get_shapes: The moments triangles match the shapes."""
+        for backend in ('skimage', 'opencv'):
+            triangles = self.image.get_shapes(backend=backend, fit='moments')
+            self.assert_triangles(triangles, 4)
+        with self.assertRaises(ValueError):
+            self.image.get_shapes(fit='circle')
@@ -0,0 +1,213 @@
+import ConfigParser
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+from uvispace.tests.test_client import FakeFPGA
+from uvispace.uvisensor import recording
+from uvispace.uvisensor import videosensor
+from uvispace.uvisensor.resources import sim_fpga
+
+CONFIG = os.path.join(os.path.dirname(__file__), os.pardir, 'uvisensor',
+                      'resources', 'config', 'simulator', 'video_sensor1.cfg')
+
+
+class SessionFileTestCases(unittest.TestCase):
+    """Tests the session files format."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'session.rec')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_write_read(self):
+        """SessionReader: Records are read back in order."""
+        frame = np.arange(12, dtype=np.uint8).reshape(3, 4)
+        recorder = recording.SessionRecorder(self.filename, "[Camera]\n")
+        recorder.add_frame('GET_GRAY_IMAGE', frame)
+        recorder.add_register('ACTUAL_LOCATION', "{'1': [[1, 2]]}\n")
+        recorder.close()
+        reader = recording.SessionReader(self.filename)
+        self.assertEqual([record[0] for record in reader.records],
+                         [recording.CONFIG, recording.FRAME,
+                          recording.REGISTER])
+        self.assertEqual(reader.get_config(), "[Camera]\n")
+        np.testing.assert_array_equal(reader.get_frame(reader.records[1]),
+                                      frame)
+        self.assertEqual(reader.get_payload(reader.records[2]),
+                         "{'1': [[1, 2]]}\n")
+
+    def test_incomplete_record(self):
+        """SessionReader: A truncated last record is discarded."""
+        recorder = recording.SessionRecorder(self.filename)
+        recorder.add_register('IMAGE_SHAPE', "(648, 486)\n")
+        recorder.add_frame('GET_GRAY_IMAGE', np.zeros((10, 10), np.uint8))
+        recorder.close()
+        with open(self.filename, 'r+b') as session_file:
+            session_file.truncate(os.path.getsize(self.filename) - 5)
+        reader = recording.SessionReader(self.filename)
+        self.assertEqual(len(reader), 1)
+
+
+class ReplayTestCases(unittest.TestCase):
+    """Tests the replay of sessions recorded on a simulated node."""
+
+    def setUp(self):
+        arena = sim_fpga.SimulatedArena((1296, 972), seed=2)
+        simulator = sim_fpga.SimulatedFPGA(('127.0.0.1', 0), arena)
+        thread = threading.Thread(target=simulator.serve_forever)
+        thread.daemon = True
+        thread.start()
+        conf = ConfigParser.RawConfigParser()
+        conf.read(CONFIG)
+        conf.set('VideoSensor', 'port', simulator.server_address[1])
+        self.folder = tempfile.mkdtemp()
+        conf_filename = os.path.join(self.folder, 'camera.cfg')
+        with open(conf_filename, 'w') as conf_file:
+            conf.write(conf_file)
+        self.filename = os.path.join(self.folder, 'session.rec')
+        # Record a session with 3 frames and the tracker locations.
+        camera = videosensor.camera_startup(conf_filename)
+        camera.start_recording(self.filename)
+        self.frames = []
+        self.locations = []
+        for _ in range(3):
+            image = videosensor.get_image(camera)
+            self.frames.append(np.copy(image.image))
+            time.sleep(0.05)
+        videosensor.set_tracker(camera, image)
+        for _ in range(3):
+            self.locations.append(np.copy(camera.get_locations()['1']))
+        camera.disconnect_client()
+        simulator.shutdown()
+        simulator.server_close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_replay(self):
+        """ReplayVideoSensor: The recorded frames and replies are served."""
+        camera = videosensor.ReplayVideoSensor(self.filename)
+        self.assertEqual(camera._params['width'], 648)
+        for frame in self.frames:
+            image = videosensor.get_image(camera)
+            np.testing.assert_array_equal(image.image, frame)
+        self.assertEqual(len(image.triangles), 1)
+        # The tracker writes are ignored.
+        videosensor.set_tracker(camera, image)
+        for location in self.locations:
+            np.testing.assert_array_equal(camera.get_locations()['1'],
+                                          location)
+        with self.assertRaises(EOFError):
+            camera.capture_frame()
+        camera.disconnect_client()
+
+    def test_realtime_replay(self):
+        """ReplayVideoSensor: The frames are served at recorded pace."""
+        camera = videosensor.ReplayVideoSensor(self.filename, realtime=True)
+        start_time = time.time()
+        for _ in self.frames:
+            camera.capture_frame()
+        self.assertGreaterEqual(time.time() - start_time, 0.1)
+
+    def test_replay_without_link(self):
+        """ReplayVideoSensor: No TCP/IP client is created."""
+        camera = videosensor.ReplayVideoSensor(self.filename)
+        self.assertIsNone(camera._client)
+        self.assertIsNone(camera.start_tracing())
+
+
+class WindowRecordingTestCases(unittest.TestCase):
+    """Tests the recording of region, decimated and grabbed frames."""
+
+    def setUp(self):
+        arena = sim_fpga.SimulatedArena((1296, 972), seed=3)
+        self.simulator = sim_fpga.SimulatedFPGA(('127.0.0.1', 0), arena)
+        thread = threading.Thread(target=self.simulator.serve_forever)
+        thread.daemon = True
+        thread.start()
+        conf = ConfigParser.RawConfigParser()
+        conf.read(CONFIG)
+        conf.set('VideoSensor', 'port', self.simulator.server_address[1])
+        self.folder = tempfile.mkdtemp()
+        self.conf_filename = os.path.join(self.folder, 'camera.cfg')
+        with open(self.conf_filename, 'w') as conf_file:
+            conf.write(conf_file)
+        self.filename = os.path.join(self.folder, 'session.rec')
+
+    def tearDown(self):
+        self.simulator.shutdown()
+        self.simulator.server_close()
+        shutil.rmtree(self.folder)
+
+    def test_replay_windows(self):
+        """ReplayVideoSensor: Region and decimated frames are replayed."""
+        camera = videosensor.camera_startup(self.conf_filename)
+        camera.start_recording(self.filename)
+        region, offsets = camera.capture_roi(10, 20, 64, 32)
+        region = np.copy(region)
+        decimated = np.copy(camera.capture_decimated(2))
+        camera.disconnect_client()
+        replay = videosensor.ReplayVideoSensor(self.filename)
+        replayed, replayed_offsets = replay.capture_roi(10, 20, 64, 32)
+        np.testing.assert_array_equal(replayed, region)
+        self.assertEqual(replayed_offsets, offsets)
+        np.testing.assert_array_equal(replay.capture_decimated(2), decimated)
+        with self.assertRaises(EOFError):
+            replay.capture_frame()
+
+    def test_record_grabber(self):
+        """FrameGrabber: The grabbed frames are recorded as full frames."""
+        camera = videosensor.camera_startup(self.conf_filename)
+        camera.start_recording(self.filename)
+        grabber = videosensor.FrameGrabber(camera, buffers=2)
+        grabber.start()
+        _, frame = grabber.get_frame(timeout=5)
+        frame = np.copy(frame)
+        grabber.stop()
+        camera.disconnect_client()
+        reader = recording.SessionReader(self.filename)
+        frames = [reader.get_frame(record) for record in reader.records
+                  if record[0] == recording.FRAME]
+        self.assertGreaterEqual(len(frames), 1)
+        self.assertTrue(any(np.array_equal(frame, recorded)
+                            for recorded in frames))
+
+
+class TornFrameTestCases(unittest.TestCase):
+    """Tests the frames whose transfer is interrupted."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'session.rec')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_short_transfer(self):
+        """VideoSensor capture_frame: A torn frame is not recorded."""
+        frame = 'x' * (486 * 648)
+        server = FakeFPGA(["Image captured.\n", [frame],
+                           "Image captured.\n", [frame[:1000]]])
+        server.start()
+        camera = videosensor.VideoSensor()
+        camera.read_conffile(CONFIG)
+        camera.load_configuration(write2fpga=False)
+        camera._client.settimeout(0.3)
+        camera._client.open_connection(*server.address)
+        camera.start_recording(self.filename)
+        self.assertEqual(camera.capture_frame().shape, (486, 648))
+        with self.assertRaises(socket.timeout):
+            camera.capture_frame()
+        camera.stop_recording()
+        camera._client.close_connection()
+        server.join(1)
+        reader = recording.SessionReader(self.filename)
+        self.assertEqual([record[0] for record in reader.records],
+                         [recording.CONFIG, recording.FRAME])
@@ -0,0 +1,224 @@
+import ConfigParser
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+from uvispace.uvisensor import trackerwindow
+from uvispace.uvisensor import videosensor
+from uvispace.uvisensor.resources import sim_fpga
+
+CONFIG = os.path.join(os.path.dirname(__file__), os.pardir, 'uvisensor',
+                      'resources', 'config', 'simulator', 'video_sensor1.cfg')
+
+
+class SimulatedNodeTestCases(unittest.TestCase):
+    """Tests the video sensor routines against a simulated FPGA node."""
+
+    def setUp(self):
+        # Simulated node on a free port, with fragmented replies.
+        arena = sim_fpga.SimulatedArena((1296, 972), seed=1)
+        self.simulator = sim_fpga.SimulatedFPGA(('127.0.0.1', 0), arena,
+                                                fragment=64)
+        thread = threading.Thread(target=self.simulator.serve_forever)
+        thread.daemon = True
+        thread.start()
+        conf = ConfigParser.RawConfigParser()
+        conf.read(CONFIG)
+        conf.set('VideoSensor', 'port', self.simulator.server_address[1])
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'camera.cfg')
+        with open(self.filename, 'w') as conf_file:
+            conf.write(conf_file)
+
+    def tearDown(self):
+        self.simulator.shutdown()
+        self.simulator.server_close()
+        shutil.rmtree(self.folder)
+
+    def test_detect_and_track(self):
+        """sim_fpga: The triangle is detected and then tracked."""
+        camera = videosensor.camera_startup(self.filename)
+        image, position = videosensor.set_tracker(camera)
+        locations = camera.get_locations()
+        camera.disconnect_client()
+        self.assertEqual(len(image.triangles), 1)
+        self.assertEqual(position[0], 1)
+        # The detected vertices [row, col] are those of the scene [x, y].
+        expected = self.simulator.arena.get_triangles()[0] / 2
+        detected = image.triangles[0].vertices[:, ::-1]
+        distances = np.linalg.norm(expected[:, None] - detected[None], axis=2)
+        self.assertLess(distances.min(axis=1).max(), 10)
+        self.assertEqual(locations['1'].shape, (8, 2))
+
+    def test_shadow_registers(self):
+        """sim_fpga: Unchanged registers are not written again."""
+        camera = videosensor.camera_startup(self.filename)
+        camera.disconnect_client()
+        self.simulator.requests.clear()
+        camera = videosensor.camera_startup(self.filename)
+        requests = list(self.simulator.requests)
+        # Only the trackers and the output are written on the 2nd startup.
+        self.assertEqual(requests.count('C'), 0)
+        writes = [line for line in requests if line.startswith('w,')]
+        self.assertEqual(writes, ['w,fa,', 'w,so,4'])
+        # A geometry change is written and applied.
+        camera.set_register('IMAGE_EXPOSURE', 1500)
+        self.assertIsNone(camera.set_register('IMAGE_EXPOSURE', 1500))
+        camera.configure_camera()
+        self.assertIsNone(camera.configure_camera())
+        camera.disconnect_client()
+        requests = list(self.simulator.requests)
+        self.assertEqual(requests.count('w,ie,1500'), 1)
+        self.assertEqual(requests.count('C'), 1)
+
+    def test_continuous_acquisition(self):
+        """sim_fpga: Frames are captured in the background."""
+        camera = videosensor.camera_startup(self.filename)
+        camera.start_acquisition(buffers=2)
+        numbers = []
+        frames = []
+        for _ in range(4):
+            number, frame = camera._grabber.get_frame(timeout=2)
+            numbers.append(number)
+            frames.append(frame)
+        image = videosensor.get_image(camera)
+        camera.disconnect_client()
+        self.assertFalse(camera.acquiring)
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertEqual(frames[0].shape, (486, 648))
+        # The frames alternate between the 2 buffers of the ring.
+        self.assertIsNot(frames[0].base, frames[1].base)
+        self.assertIs(frames[0].base, frames[2].base)
+        self.assertEqual(len(image.triangles), 1)
+
+    def test_stalled_acquisition(self):
+        """sim_fpga: A stalled or stopped acquisition gives no old frame."""
+        camera = videosensor.camera_startup(self.filename)
+        camera.start_acquisition(buffers=2)
+        self.simulator.latency = 0.5
+        # Consume the frame that was being captured without latency.
+        time.sleep(0.05)
+        camera.get_frame(timeout=2)
+        with self.assertRaises(socket.timeout):
+            videosensor.get_image(camera, timeout=0.1)
+        self.simulator.latency = 0
+        # A frame is captured directly after the grabber stops.
+        camera._grabber.stop()
+        image = videosensor.get_image(camera, timeout=0.1)
+        camera.disconnect_client()
+        self.assertEqual(len(image.triangles), 1)
+
+    def test_region_capture(self):
+        """sim_fpga: A region is captured and mapped to the full frame."""
+        camera = videosensor.camera_startup(self.filename)
+        full_image = videosensor.get_image(camera)
+        window = full_image.triangles[0].vertices.min(axis=0) - 20, \
+            full_image.triangles[0].vertices.max(axis=0) + 20
+        window = np.array(window)
+        region, offsets = camera.capture_roi(10, 20, 64, 32)
+        self.assertEqual(region.shape, (32, 64))
+        self.assertEqual(offsets, [20, 10])
+        image = videosensor.get_image_roi(camera, window)
+        registers = dict(self.simulator.registers)
+        camera.disconnect_client()
+        # The full frame window is restored after the capture.
+        self.assertEqual(registers['is'], (648, 486))
+        self.assertEqual(registers['ss'], (2592, 1944))
+        self.assertLess(image.image.size, full_image.image.size / 20)
+        self.assertEqual(len(image.triangles), 1)
+        expected = self.simulator.arena.get_triangles()[0] / 2
+        detected = image.triangles[0].vertices[:, ::-1]
+        distances = np.linalg.norm(expected[:, None] - detected[None], axis=2)
+        self.assertLess(distances.min(axis=1).max(), 10)
+
+    def test_scan_arena(self):
+        """sim_fpga: The coarse to fine scan finds the triangle."""
+        camera = videosensor.camera_startup(self.filename)
+        image = videosensor.scan_arena(camera, factor=4)
+        registers = dict(self.simulator.registers)
+        camera.disconnect_client()
+        self.assertEqual(image.image.shape, (121, 162))
+        self.assertEqual(sorted(image.timings), ['coarse', 'fine'])
+        self.assertEqual(registers['is'], (648, 486))
+        self.assertEqual(registers['sm'], (1, 1))
+        self.assertEqual(len(image.triangles), 1)
+        expected = self.simulator.arena.get_triangles()[0] / 2
+        detected = image.triangles[0].vertices[:, ::-1]
+        distances = np.linalg.norm(expected[:, None] - detected[None], axis=2)
+        self.assertLess(distances.min(axis=1).max(), 10)
+
+    def test_restore_trackers(self):
+        """sim_fpga: Saved windows are restored without a frame search."""
+        camera = videosensor.camera_startup(self.filename)
+        videosensor.set_tracker(camera)
+        windows = dict((key, window.tolist()) for key, window
+                       in camera.get_windows().items())
+        camera.disconnect_client()
+        camera = videosensor.camera_startup(self.filename)
+        self.simulator.requests.clear()
+        found = videosensor.restore_trackers(camera, dict(
+                windows, **{'2': [0, 0, 10, 10]}))
+        locations = camera.get_locations()
+        camera.disconnect_client()
+        self.assertEqual(found, ['1'])
+        self.assertEqual(sorted(locations), ['1'])
+        self.assertNotIn('S', self.simulator.requests)
+        self.assertIn('w,ft,2', self.simulator.requests)
+
+    def test_restore_invalid_windows(self):
+        """sim_fpga: Malformed and out of bounds windows are skipped."""
+        camera = videosensor.camera_startup(self.filename)
+        videosensor.set_tracker(camera)
+        windows = dict((key, window.tolist()) for key, window
+                       in camera.get_windows().items())
+        camera.disconnect_client()
+        camera = videosensor.camera_startup(self.filename)
+        windows.update({'2': [2500, 1900, 100, 100], '3': [0, 0, 10],
+                        '4': [0, 0, 'a', 10], '5': [-5, 0, 10, 10],
+                        '6': [0.5, 0, 10, 10]})
+        found = videosensor.restore_trackers(camera, windows)
+        camera.disconnect_client()
+        self.assertEqual(found, ['1'])
+
+
+class StaticTrackersTestCases(unittest.TestCase):
+    """Tests the tracker windows of a node that does not move them."""
+
+    def setUp(self):
+        self.arena = sim_fpga.SimulatedArena((1296, 972), seed=1)
+        self.simulator = sim_fpga.SimulatedFPGA(('127.0.0.1', 0), self.arena,
+                                                follow=False)
+
+    def tearDown(self):
+        self.simulator.server_close()
+
+    def set_window(self, window):
+        """Program the tracker 1 with a [[x, y], [x, y]] window."""
+        (min_x, min_y), (max_x, max_y) = np.round(window).astype(int)
+        self.simulator.write_register('sw', '1,{},{},{},{}'.format(
+                min_x, min_y, max_x - min_x, max_y - min_y))
+
+    def locate(self, elapsed=0):
+        """Return the tracker 1 locations after some time, or None."""
+        self.arena.start_time -= elapsed
+        return self.simulator.get_locations().get('1')
+
+    def test_window_loss(self):
+        """sim_fpga: A UGV out of its static window is lost."""
+        barycenter = self.arena.get_triangles()[0].mean(axis=0)
+        self.set_window([barycenter - 100, barycenter + 100])
+        window = trackerwindow.AdaptiveWindow(self.arena.shape)
+        window.update(self.locate(), 0)
+        programmed = window.get_window(0)
+        self.set_window(programmed)
+        trackers = dict(self.simulator.trackers)
+        # A jump and a rotation within the window, as in a missed cycle.
+        self.assertIsNotNone(self.locate(1))
+        self.assertEqual(self.simulator.trackers, trackers)
+        # The window is not moved after the UGV, that is lost.
+        self.assertIsNone(self.locate(2))
+        self.assertEqual(self.simulator.trackers, trackers)
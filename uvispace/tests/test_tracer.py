@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from uvispace.uvisensor import tracer
+
+
+class ProtocolTracerTestCases(unittest.TestCase):
+    """Tests the statistics and trace files of the ProtocolTracer."""
+
+    def setUp(self):
+        self.tracer = tracer.ProtocolTracer(capacity=100)
+        # 1 to 200 ms round trips of a register read, in 1 ms steps.
+        for index in range(200):
+            self.tracer.record('r:ACTUAL_LOCATION', index,
+                               sent=5, received=20,
+                               end=index + (index + 1) / 1000.0)
+        self.tracer.record('GET_GRAY_IMAGE', 300, received=314928,
+                           end=300.05)
+
+    def test_statistics(self):
+        """ProtocolTracer: Percentiles are estimated from histograms."""
+        statistics = self.tracer.get_statistics()
+        location = statistics['r:ACTUAL_LOCATION']
+        self.assertEqual(location['count'], 200)
+        self.assertEqual((location['sent'], location['received']),
+                         (1000, 4000))
+        self.assertAlmostEqual(location['mean'], 0.1005, places=6)
+        self.assertAlmostEqual(location['max'], 0.2, places=6)
+        for name, expected in (('p50', 0.1), ('p95', 0.19), ('p99', 0.198)):
+            self.assertGreaterEqual(location[name], expected * 0.999)
+            self.assertLessEqual(location[name], expected * 1.13)
+        self.assertAlmostEqual(statistics['GET_GRAY_IMAGE']['p50'], 0.05,
+                               places=6)
+        self.assertIsNone(self.tracer.get_percentile('w:SET_WINDOW', 50))
+
+    def test_ring(self):
+        """ProtocolTracer: Only the last events are kept in memory."""
+        events = self.tracer.events
+        self.assertEqual(len(events), 100)
+        self.assertEqual(list(events['start'][[0, -2, -1]]),
+                         [101, 199, 300])
+        self.assertEqual(events['key'][-1], 1)
+
+    def test_dump(self):
+        """load_trace: The dumped events are read back."""
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, 'link.trace')
+            self.tracer.dump(filename)
+            self.assertEqual(os.path.getsize(filename),
+                             len(tracer.MAGIC) + 4
+                             + len('["r:ACTUAL_LOCATION", "GET_GRAY_IMAGE"]')
+                             + 100 * tracer.EVENT_DTYPE.itemsize)
+            keys, events = tracer.load_trace(filename)
+        finally:
+            shutil.rmtree(folder)
+        self.assertEqual(keys, ['r:ACTUAL_LOCATION', 'GET_GRAY_IMAGE'])
+        np.testing.assert_array_equal(events, self.tracer.events)
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+from uvispace.uvisensor.trackerdecoder import TrackerDecoder
+
+
+class TrackerDecoderTestCases(unittest.TestCase):
+    """Tests the decoding of the FPGA tracker replies."""
+
+    def test_decode_locations(self):
+        """TrackerDecoder decode: Checks several trackers decoding."""
+        decoder = TrackerDecoder(columns=2, rows=2)
+        trackers = decoder.fast_decode("{'1': [[10, 20], [30, 40]], "
+                                       "'2': [[-1, 2.5], [3, 4]]}\n")
+        self.assertEqual(sorted(trackers.keys()), ['1', '2'])
+        npt.assert_equal(trackers['1'], [[10, 20], [30, 40]])
+        npt.assert_equal(trackers['2'], [[-1, 2.5], [3, 4]])
+        self.assertEqual(decoder.fast_decode("{}\n"), {})
+
+    def test_arrays_reused(self):
+        """TrackerDecoder decode: The same array is filled every call."""
+        decoder = TrackerDecoder(columns=2, rows=2)
+        decoder.preallocate(['1'])
+        first = decoder.decode("{'1': [[1, 2], [3, 4]]}")['1']
+        second = decoder.decode("{'1': [[5, 6], [7, 8]]}")['1']
+        self.assertIs(first, second)
+        npt.assert_equal(second, [[5, 6], [7, 8]])
+
+    def test_decode_flat(self):
+        """TrackerDecoder decode: Checks flat values decoding."""
+        decoder = TrackerDecoder(columns=None, rows=4)
+        trackers = decoder.fast_decode("{'1': [10, 20, 30, 40]}")
+        npt.assert_equal(trackers['1'], [10, 20, 30, 40])
+
+    def test_literal_fallback(self):
+        """TrackerDecoder decode: Other layouts use literal_eval."""
+        decoder = TrackerDecoder(columns=2)
+        self.assertIsNone(decoder.fast_decode('{"1": [[1, 2]]}'))
+        trackers = decoder.decode('{"1": [[1, 2]]}')
+        npt.assert_equal(trackers['1'], [[1, 2]])
+
+    def test_malformed(self):
+        """TrackerDecoder decode: Malformed replies return None."""
+        decoder = TrackerDecoder(columns=2)
+        for payload in ("", "Image captured.\n", "{'1': [[1, 2], [3]]}",
+                        "{'1': [[1, 2], [3, x]]}", "{'1': [[1, 2], [3, 4]}",
+                        "{'1': [1, 2, 3]}", "{'1': }", "{'1': [[1, 2]]"):
+            self.assertIsNone(decoder.decode(payload), payload)
@@ -0,0 +1,93 @@
+import unittest
+import numpy as np
+from uvispace.uvisensor import geometry
+from uvispace.uvisensor import trackerwindow
+
+
+def get_square(center, size=20):
+    """Return the contour of a square around a [row, col] center."""
+    row, col = center
+    half = size / 2.0
+    return np.array([[row - half, col - half], [row - half, col + half],
+                     [row + half, col + half], [row + half, col - half]])
+
+
+class AdaptiveWindowTestCases(unittest.TestCase):
+    """Tests the tracker windows that follow the UGV motion."""
+
+    def setUp(self):
+        self.window = trackerwindow.AdaptiveWindow((486, 648))
+
+    def track(self, velocity, cycles=10, period=0.1, start=(200, 200)):
+        """Update the window with a shape moving at constant velocity."""
+        start = np.array(start, dtype=np.float64)
+        for cycle in range(cycles):
+            center = start + np.array(velocity) * cycle * period
+            self.window.update(get_square(center), cycle * period)
+        return center, (cycles - 1) * period
+
+    def test_no_estimate(self):
+        """AdaptiveWindow: There is no window without detections."""
+        self.assertIsNone(self.window.get_window(0))
+
+    def test_prediction(self):
+        """AdaptiveWindow: The window is centred on the predicted position."""
+        center, timestamp = self.track([0, 100])
+        window = self.window.get_window(timestamp + 0.1)
+        np.testing.assert_allclose(window.mean(axis=0), center + [0, 10],
+                                   atol=0.5)
+        # The shape is inside the window at the next cycle.
+        square = get_square(center + [0, 10])
+        self.assertTrue(np.all(square >= window[0]))
+        self.assertTrue(np.all(square <= window[1]))
+
+    def test_speed(self):
+        """AdaptiveWindow: The window grows with the UGV speed."""
+        center, timestamp = self.track([0, 0])
+        still = self.window.get_window(timestamp + 0.1)
+        self.window.reset()
+        center, timestamp = self.track([0, 200])
+        moving = self.window.get_window(timestamp + 0.1)
+        self.assertGreater(np.ptp(moving[:, 1]), np.ptp(still[:, 1]))
+        self.assertAlmostEqual(np.ptp(moving[:, 0]), np.ptp(still[:, 0]),
+                               places=3)
+
+    def test_hysteresis(self):
+        """AdaptiveWindow: Small changes don't reprogram the window."""
+        center, timestamp = self.track([0, 0])
+        self.assertTrue(self.window.needs_update(
+                self.window.get_window(timestamp)))
+        self.window.window = self.window.get_window(timestamp)
+        # One pixel of jitter.
+        self.window.update(get_square(center + [1, -1]), timestamp + 0.1)
+        self.assertFalse(self.window.needs_update(
+                self.window.get_window(timestamp + 0.2)))
+        # A big jump.
+        self.window.update(get_square(center + [0, 30]), timestamp + 0.2)
+        self.assertTrue(self.window.needs_update(
+                self.window.get_window(timestamp + 0.3)))
+
+    def test_lost(self):
+        """AdaptiveWindow: The window of a lost UGV grows until a timeout."""
+        center, timestamp = self.track([0, 100])
+        first = self.window.get_window(timestamp + 0.2)
+        second = self.window.get_window(timestamp + 0.5)
+        self.assertGreater(np.ptp(second[:, 1]), np.ptp(first[:, 1]))
+        self.assertIsNone(self.window.get_window(timestamp + 1.5))
+
+    def test_frame_limits(self):
+        """AdaptiveWindow: The window is clipped to the frame."""
+        self.track([0, -100], start=(5, 20))
+        window = self.window.get_window(1.0)
+        self.assertTrue(np.all(window >= 0))
+        self.assertTrue(np.all(window <= [485, 647]))
+
+    def test_baseline_window(self):
+        """AdaptiveWindow: A still shape gets the Triangle window."""
+        vertices = np.array([[200, 300], [230, 270], [180, 260]])
+        for timestamp in (0, 0.1, 0.2):
+            self.window.update(vertices, timestamp)
+        triangle = geometry.Triangle(vertices)
+        triangle.get_pose()
+        expected = triangle.get_window(0, (485, 647))
+        np.testing.assert_allclose(self.window.get_window(0.3), expected)
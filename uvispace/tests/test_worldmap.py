@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from uvispace.uvisensor import geometry
+from uvispace.uvisensor import imgprocessing
+from uvispace.uvisensor import videosensor
+from uvispace.uvisensor import worldmap
+
+CONFIG = os.path.join(os.path.dirname(__file__), os.pardir, 'uvisensor',
+                      'resources', 'config', 'simulator', 'video_sensor2.cfg')
+
+
+class WorldMapTestCases(unittest.TestCase):
+    """Tests the pixel to world lookup tables."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.camera = videosensor.VideoSensor()
+        self.camera.read_conffile(CONFIG)
+        self.camera.load_configuration(write2fpga=False)
+        self.world_map = worldmap.get_world_map(self.camera,
+                                                cache_dir=self.folder)
+        # Sub-pixel FPGA points all over the frame.
+        generator = np.random.RandomState(0)
+        self.points = generator.uniform(0, 1, (50, 2)) * [1295, 971]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_lookup(self):
+        """WorldMap lookup: Points are interpolated from the table."""
+        self.assertEqual(self.world_map.shape, (972, 1296))
+        expected = worldmap.pixels_to_world(
+                self.points, (486, 648), 2.0, self.camera.offsets,
+                self.camera._H)
+        np.testing.assert_allclose(self.world_map.lookup(self.points),
+                                   expected, atol=0.05)
+
+    def test_chain(self):
+        """WorldMap lookup: Same result as the Triangle transformations."""
+        vertices = self.points[:3]
+        image = imgprocessing.Image(np.zeros((486, 648), dtype=np.uint8),
+                                    [vertices[:, ::-1] / 2.0])
+        image.correct_distortion()
+        triangle = geometry.Triangle(image.contours[0])
+        triangle.local2global(self.camera.offsets, K=4)
+        triangle.homography(self.camera._H)
+        np.testing.assert_allclose(self.world_map.lookup(vertices),
+                                   triangle.vertices, atol=0.1)
+
+    def test_handover(self):
+        """Triangle inverse_homography: The cached inverse undoes H."""
+        np.testing.assert_allclose(np.dot(self.camera._H, self.camera._H_inv),
+                                   np.eye(3), atol=1e-9)
+        triangle = geometry.Triangle(self.world_map.lookup(self.points[:3]),
+                                     isglobal=True, cartesian=True)
+        vertices = triangle.vertices.copy()
+        triangle.inverse_homography(self.camera._H, self.camera._H_inv)
+        triangle.homography(self.camera._H)
+        np.testing.assert_allclose(triangle.vertices, vertices, atol=1e-2)
+
+    def test_cache(self):
+        """get_world_map: The table is memory-mapped from its file."""
+        world_map = worldmap.get_world_map(self.camera,
+                                           cache_dir=self.folder)
+        self.assertIsInstance(world_map.table, np.memmap)
+        self.assertEqual(len(os.listdir(self.folder)), 1)
+        # Other parameters produce a new table.
+        self.camera.offsets = [0, 0]
+        worldmap.get_world_map(self.camera, cache_dir=self.folder)
+        self.assertEqual(len(os.listdir(self.folder)), 2)
@@ -10,4 +10,7 @@ serial ports.
 
 from __future__ import absolute_import, division, print_function
 
-__all__ = ['client', 'geometry', 'imgprocessing', 'multiplecamera', 'videosensor']
+__all__ = ['arenagrid', 'asyncclient', 'client', 'eventloop', 'framebus',
+           'geometry', 'imgprocessing', 'multiplecamera', 'recording',
+           'tracer', 'trackerdecoder', 'trackerwindow', 'videosensor',
+           'worldmap']
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""This module contains the CoverageGrid class, a raster of the arena.
+
+The fusion of the cameras data has to know, for every detected UGV,
+which cameras can see it and if it is in the borders region of any of
+them, where the handover to a neighbour camera starts. These questions
+only depend on the working space limits of each camera, which are fixed
+during an execution.
+
+A *CoverageGrid* divides the arena in square cells and evaluates the
+geometric tests once for the center of every cell, with
+*geometry.QuadrantPolygons*. Every cell stores:
+
+* A bitmask of the cameras whose working space contains the cell.
+* A bitmask of the cameras whose perimeter is closer than the border
+  tolerance to the cell.
+* The distance from the cell to the nearest perimeter.
+
+Afterwards, any point is evaluated with a single array lookup. The
+results are approximate, as the points are represented by the center of
+their cells: they can differ from the geometric tests for the points
+closer than half a cell diagonal to the limits of the regions.
+"""
+# Standard libraries
+import logging
+import sys
+# Third party libraries
+import numpy as np
+# Local libraries
+import geometry
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+
+class CoverageGrid(object):
+    """Rasterized index of the working spaces of N cameras.
+
+    The grid covers the bounding box of all the limits, extended with
+    the border tolerance and one more cell. Thus, the cells of its outer
+    ring are not covered by any camera nor in any borders region, and
+    the points outside the grid are given their values.
+
+    :param limits: N arrays with the coordinates of the vertices of each
+     camera working space, in global millimetres (e.g. the *_limits*
+     attribute of the *VideoSensor* objects).
+    :type limits: iterable of Kx2 arrays
+    :param resolution: side of the cells, in millimetres.
+    :type resolution: int or float
+    :param tolerance: Maximum allowed distance (mm) to the limits to be
+     considered within the borders region.
+    :type tolerance: int or float
+    :param int chunk: number of cells evaluated at once while the grid
+     is built, to bound the memory usage.
+    """
+
+    def __init__(self, limits, resolution=10, tolerance=150, chunk=16384):
+        """CoverageGrid class constructor."""
+        if resolution <= 0:
+            raise ValueError("The resolution must be greater than 0")
+        polygons = geometry.QuadrantPolygons(limits)
+        self.cameras = len(polygons)
+        self.resolution = float(resolution)
+        self.tolerance = tolerance
+        vertices = polygons.vertices.reshape(-1, 2)
+        self.origin = vertices.min(axis=0) - tolerance - self.resolution
+        extent = (vertices.max(axis=0) + tolerance + self.resolution
+                  - self.origin)
+        # Number of cells along the x and y axes.
+        self.size = np.ceil(extent / self.resolution).astype(int)
+        self._max_cell = self.size - 1
+        # Smallest unsigned integer type for the bitmasks.
+        mask_dtype = np.min_scalar_type(2 ** self.cameras - 1)
+        bits = (2 ** np.arange(self.cameras)).astype(mask_dtype)
+        # The tables are indexed as [y, x], as the images.
+        cells = self.size[1] * self.size[0]
+        coverage = np.zeros(cells, dtype=mask_dtype)
+        borders = np.zeros(cells, dtype=mask_dtype)
+        distances = np.zeros(cells, dtype=np.float32)
+        for start in range(0, cells, chunk):
+            indexes = np.arange(start, min(start + chunk, cells))
+            centers = (self.origin + self.resolution
+                       * (np.column_stack([indexes % self.size[0],
+                                           indexes // self.size[0]]) + 0.5))
+            inside = polygons.contains(centers)
+            cell_distances = polygons.get_distances(centers)
+            coverage[indexes] = np.dot(bits, inside)
+            borders[indexes] = np.dot(bits, cell_distances < tolerance)
+            distances[indexes] = cell_distances.min(axis=0)
+        self.coverage = coverage.reshape(self.size[::-1])
+        self.borders = borders.reshape(self.size[::-1])
+        self.distances = distances.reshape(self.size[::-1])
+        self._bits = bits
+        logger.debug("Coverage grid of {}x{} cells for {} cameras".format(
+                self.size[0], self.size[1], self.cameras))
+
+    def get_cells(self, points):
+        """Get the indexes of the cells that contain the points.
+
+        :param points: array with the [x, y] global coordinates of P
+         points.
+        :type points: np.array(shape=Px2)
+        :return: the [y, x] indexes of the cells. The points outside
+         the grid get the indexes of the nearest cell.
+        :rtype: tuple(np.array, np.array)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        indexes = ((points - self.origin) // self.resolution).astype(int)
+        x, y = np.clip(indexes, 0, self._max_cell).T
+        return y, x
+
+    def lookup(self, points):
+        """Get the values of the cells that contain the points.
+
+        :param points: array with the [x, y] global coordinates of P
+         points.
+        :type points: np.array(shape=Px2)
+        :return: the bitmasks of the cameras that cover the points, the
+         bitmasks of the cameras whose borders region contains them, and
+         their distances to the nearest perimeter. The distances of the
+         points outside the grid are the ones of the nearest cell, so
+         they are underestimated.
+        :rtype: np.array, np.array, np.array
+        """
+        cells = self.get_cells(points)
+        return self.coverage[cells], self.borders[cells], self.distances[cells]
+
+    def contains(self, points):
+        """Evaluate which cameras cover the points.
+
+        It is the rasterized version of *QuadrantPolygons.contains*.
+
+        :param points: array with the [x, y] global coordinates of P
+         points.
+        :type points: np.array(shape=Px2)
+        :return: flags set to True for the points inside the working
+         spaces of the cameras.
+        :rtype: np.array(shape=NxP, dtype=bool)
+        """
+        coverage = self.coverage[self.get_cells(points)]
+        return (coverage & self._bits[:, np.newaxis]) > 0
+
+    def in_borders(self, vertices):
+        """Evaluate if the shapes are in the borders regions.
+
+        It is the rasterized version of *QuadrantPolygons.in_borders*,
+        with the tolerance of the grid.
+
+        :param vertices: coordinates of the V vertices of R shapes. A
+         single Vx2 shape is accepted as well.
+        :type vertices: np.array(shape=RxVx2)
+        :return: flags set to True if any vertex of the shape is within
+         the borders region of the camera.
+        :rtype: np.array(shape=NxR, dtype=bool)
+        """
+        vertices = np.asarray(vertices)
+        if vertices.ndim == 2:
+            vertices = vertices[np.newaxis]
+        borders = self.borders[self.get_cells(vertices)]
+        masks = np.bitwise_or.reduce(borders.reshape(len(vertices), -1),
+                                     axis=1)
+        return (masks & self._bits[:, np.newaxis]) > 0
@@ -0,0 +1,639 @@
+#!/usr/bin/env python
+"""Event loop counterparts of the Client and VideoSensor classes.
+
+The blocking *client.Client* needs a thread per camera, that waits in
+the socket calls and busy-waits the rest of its cycle. The classes of
+this module perform the same operations as coroutines driven by an
+*eventloop.EventLoop*, so a single thread can handle all the cameras
+concurrently:
+
+* *AsyncClient*: register operations, commands and data reception on a
+  non-blocking socket. It uses the same registers and commands
+  dictionaries as *client.Client*.
+* *AsyncVideoSensor*: configuration, trackers and frame capture of an
+  FPGA-camera system, as *videosensor.VideoSensor* does.
+
+Every request is limited by the client timeout, and can be cancelled.
+If a request is cancelled while waiting for its text replies, they are
+discarded when they arrive. If it is cancelled while sending data or
+while receiving an image, the stream can not be recovered and the
+connection is closed.
+"""
+# Standard libraries
+import ast
+import errno
+import logging
+import os
+import socket
+import sys
+# Third party libraries
+import numpy as np
+# Local libraries
+from client import Client
+from eventloop import (CancelledError, Future, Return, TimeoutError, gather,
+                       sleep, wait_for)
+from trackerdecoder import TrackerDecoder
+from videosensor import VideoSensor
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+# Error codes of the non-blocking socket operations that have to be retried.
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+
+class AsyncClient(object):
+    """Non-blocking client for the registers and commands of an FPGA.
+
+    The methods performing requests are coroutines, that have to be
+    yielded from another coroutine or run with the loop.
+
+    :param loop: *eventloop.EventLoop* instance driving the client.
+    :param int buffer_size: number of bytes of the incoming data.
+    :param timeout: value, in seconds, of the maximum duration of each
+     request. If None, the requests are not limited in time.
+    :type timeout: int, float or None
+    """
+    _REGISTERS = Client._REGISTERS
+    _COMMANDS = Client._COMMANDS
+
+    def __init__(self, loop, buffer_size=2048, timeout=2.0):
+        """Class constructor. Set the connection attributes."""
+        self.loop = loop
+        self.ip = ''
+        self.port = None
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+        self._sock = None
+        # Received bytes that were not consumed yet by a read operation.
+        self._input = bytearray()
+        # Number of replies of cancelled requests, still to be discarded.
+        self._stale = 0
+
+    @property
+    def connected(self):
+        """True if the connection with the device is open."""
+        return self._sock is not None
+
+    def _wait_fd(self, writing=False):
+        """Return a future that is done when the socket is ready."""
+        future = Future(self.loop)
+        fd = self._sock.fileno()
+        if writing:
+            add, remove = self.loop.add_writer, self.loop.remove_writer
+        else:
+            add, remove = self.loop.add_reader, self.loop.remove_reader
+
+        def ready():
+            remove(fd)
+            if not future.done():
+                future.set_result(None)
+        add(fd, ready)
+        # Stop watching the socket if the future is cancelled.
+        future.add_done_callback(lambda _: remove(fd))
+        return future
+
+    def _abort(self, reason):
+        """Close the connection after an unrecoverable stream error."""
+        logger.error("Closing the connection with {}: {}".format(self.ip,
+                                                                 reason))
+        if self._sock is not None:
+            self.loop.remove_reader(self._sock.fileno())
+            self.loop.remove_writer(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+        del self._input[:]
+        self._stale = 0
+
+    def _check_connected(self):
+        if self._sock is None:
+            raise socket.error(errno.ENOTCONN, "The client is not connected")
+
+    def _sendall(self, data):
+        """Coroutine that sends all the data through the socket."""
+        self._check_connected()
+        view = memoryview(data)
+        try:
+            while len(view):
+                try:
+                    sent = self._sock.send(view)
+                except socket.error as error:
+                    if error.errno not in _WOULD_BLOCK:
+                        raise
+                    yield self._wait_fd(writing=True)
+                    continue
+                view = view[sent:]
+        except CancelledError:
+            # A partially sent request would corrupt the next ones.
+            if len(view) and len(view) != len(data):
+                self._abort("request cancelled while being sent")
+            raise
+
+    def _fill_input(self):
+        """Coroutine that appends the next received package to the input."""
+        self._check_connected()
+        while True:
+            try:
+                package = self._sock.recv(self.buffer_size)
+            except socket.error as error:
+                if error.errno not in _WOULD_BLOCK:
+                    raise
+                yield self._wait_fd()
+                continue
+            break
+        if not package:
+            self._abort("connection closed by the remote device")
+            raise socket.error(errno.ECONNRESET,
+                               "Connection closed by the remote device")
+        self._input.extend(package)
+
+    def _next_message(self):
+        """Coroutine returning the next newline terminated message."""
+        start = 0
+        while True:
+            end = self._input.find('\n', start)
+            if end >= 0:
+                break
+            start = len(self._input)
+            yield self._fill_input()
+        message = str(self._input[:end + 1])
+        del self._input[:end + 1]
+        raise Return(message)
+
+    def _drain_stale(self):
+        """Coroutine discarding the replies of cancelled requests."""
+        while self._stale:
+            yield self._next_message()
+            self._stale -= 1
+
+    def _read_messages(self, count):
+        """Coroutine returning the replies to the last sent requests.
+
+        Before, the replies to previously cancelled requests are
+        discarded. If the coroutine is cancelled, the replies not yet
+        received are marked to be discarded as well.
+        """
+        yield self._drain_stale()
+        messages = []
+        try:
+            for _ in range(count):
+                message = yield self._next_message()
+                messages.append(message)
+        except CancelledError:
+            self._stale += count - len(messages)
+            raise
+        raise Return(messages)
+
+    def read_message(self):
+        """Coroutine returning the next message sent by the device.
+
+        Contrary to the replies of the requests, a message that is not
+        received within the timeout is not discarded later, so this
+        method can be used for polling asynchronous notifications.
+
+        :return: the next newline terminated message, or None if it was
+         not received within the timeout.
+        :rtype: str or None
+        """
+        def next_message():
+            yield self._drain_stale()
+            message = yield self._next_message()
+            raise Return(message)
+        try:
+            message = yield wait_for(self.loop, next_message(), self.timeout)
+        except TimeoutError:
+            message = None
+        raise Return(message)
+
+    def _transaction(self, data, replies):
+        """Coroutine sending requests and returning their replies."""
+        yield self._sendall(data)
+        messages = yield self._read_messages(replies)
+        raise Return(messages)
+
+    def _request(self, data, replies):
+        """Run a transaction limited by the client timeout."""
+        messages = yield wait_for(self.loop, self._transaction(data, replies),
+                                  self.timeout)
+        raise Return(messages)
+
+    def open_connection(self, ip, port):
+        """Coroutine that creates a TCP/IP socket connection.
+
+        After connecting, the 'Welcome message' generated by the device
+        is read and discarded. A single package is read, as the message
+        may have no terminator.
+
+        :param str ip: IP address of the device.
+        :param int port: socket port.
+        """
+        self.ip = ip
+        self.port = port
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setblocking(False)
+        code = self._sock.connect_ex((ip, port))
+        if code in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            try:
+                yield wait_for(self.loop, self._wait_fd(writing=True),
+                               self.timeout)
+            except (CancelledError, TimeoutError):
+                self._abort("connection not established")
+                raise
+            code = self._sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if code:
+            self._abort("connection failed")
+            raise socket.error(code, os.strerror(code))
+        logger.info('Started TCP client with IP: {} and PORT:{}.'.format(
+                self.ip, self.port))
+        try:
+            yield wait_for(self.loop, self._fill_input(), self.timeout)
+        except TimeoutError:
+            pass
+        del self._input[:]
+
+    def close_connection(self):
+        """Coroutine sending 'CLOSE_CONNECTION' and closing the socket."""
+        if self._sock is None:
+            logger.debug('Unable to close TCP client. Already closed')
+            return
+        yield self.write_command('CLOSE_CONNECTION')
+        self.loop.remove_reader(self._sock.fileno())
+        self.loop.remove_writer(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        del self._input[:]
+        self._stale = 0
+        logger.info('Closed the TCP client {}'.format(75 * '-'))
+
+    def write_command(self, command, clean_buffer=False):
+        """Coroutine that sends a command to the device.
+
+        :param str command: FPGA command to be executed.
+        :param bool clean_buffer: if True, the message returned by the
+         FPGA after the command is read.
+        :return: message returned from the FPGA after writing the
+         command. If *clean_buffer* is False or there was no message,
+         'EMPTY BUFFER' is returned.
+        """
+        data = '{}\n'.format(self._COMMANDS[command])
+        message = "EMPTY BUFFER"
+        if clean_buffer:
+            try:
+                messages = yield self._request(data, 1)
+                message = messages[0]
+            except TimeoutError:
+                pass
+        else:
+            yield wait_for(self.loop, self._sendall(data), self.timeout)
+        raise Return(message)
+
+    def read_register(self, regkey, raw=False):
+        """Coroutine that reads the value of a register.
+
+        :param str regkey: register identifier.
+        :param bool raw: if True, the reply is returned as received.
+        :return: the content of the register.
+        :raises eventloop.TimeoutError: if the reply is not received.
+        """
+        values = yield self.read_registers([regkey], raw)
+        if values[0] is None:
+            raise TimeoutError("No reply when reading {} register"
+                               "".format(regkey))
+        raise Return(values[0])
+
+    def read_registers(self, regkeys, raw=False):
+        """Coroutine that reads several registers in one round trip.
+
+        :param regkeys: register identifiers to be read.
+        :type regkeys: iterable of str
+        :param bool raw: if True, the replies are returned as received.
+        :return: the contents of the registers, in the same order. None
+         is returned for the registers whose reply was not received.
+        :rtype: list
+        """
+        regkeys = list(regkeys)
+        data = ''.join(['r,{}\n'.format(self._REGISTERS[regkey])
+                        for regkey in regkeys])
+        try:
+            replies = yield self._request(data, len(regkeys))
+        except TimeoutError:
+            logger.warn("No reply when reading {}".format(regkeys))
+            raise Return([None] * len(regkeys))
+        if not raw:
+            # Convert the string inputs into valid values e.g. list or int
+            replies = [ast.literal_eval(reply) for reply in replies]
+        raise Return(replies)
+
+    def write_register(self, regkey, value):
+        """Coroutine that writes a value into a register.
+
+        :param str regkey: register identifier that will be written.
+        :param value: data that will be written, as a string.
+        :return: message given back by the FPGA.
+        """
+        messages = yield self.write_registers([(regkey, value)])
+        raise Return(messages[0])
+
+    def write_registers(self, values):
+        """Coroutine that writes several registers in one round trip.
+
+        :param values: pairs of register identifiers and data to be
+         written, as strings.
+        :type values: dict or iterable of (str, value) pairs
+        :return: messages given back by the FPGA, in the writing order.
+         'EMPTY BUFFER' is returned if they were not received.
+        :rtype: list
+        """
+        if hasattr(values, 'items'):
+            values = values.items()
+        requests = ['w,{},{}\n'.format(self._REGISTERS[regkey], value)
+                    for regkey, value in values]
+        try:
+            messages = yield self._request(''.join(requests), len(requests))
+        except TimeoutError:
+            messages = ["EMPTY BUFFER"] * len(requests)
+        raise Return(messages)
+
+    def read_into(self, buffer, size=None):
+        """Coroutine that fills a buffer with the incoming data.
+
+        Before, the replies to previously cancelled requests are
+        discarded, so they are not taken as part of the data.
+
+        :param buffer: writable object supporting the buffer interface.
+        :param int size: number of bytes to be read. If None, the whole
+         length of the buffer is filled.
+        :return: number of bytes written into the buffer.
+        :rtype: int
+        """
+        view = memoryview(buffer)
+        if size is None:
+            size = len(view)
+        nbytes = [0]
+
+        def receive():
+            yield self._drain_stale()
+            nbytes[0] = min(size, len(self._input))
+            if nbytes[0]:
+                view[:nbytes[0]] = self._input[:nbytes[0]]
+                del self._input[:nbytes[0]]
+            while nbytes[0] < size:
+                self._check_connected()
+                try:
+                    received = self._sock.recv_into(view[nbytes[0]:size],
+                                                    size - nbytes[0])
+                except socket.error as error:
+                    if error.errno not in _WOULD_BLOCK:
+                        raise
+                    yield self._wait_fd()
+                    continue
+                if not received:
+                    self._abort("connection closed by the remote device")
+                    break
+                nbytes[0] += received
+        try:
+            yield wait_for(self.loop, receive(), self.timeout)
+        except (CancelledError, TimeoutError):
+            # The rest of the data would be taken as the next replies.
+            self._abort("data reception stopped with {} of {} bytes".format(
+                    nbytes[0], size))
+            raise
+        raise Return(nbytes[0])
+
+
+class _SensorState(VideoSensor):
+    """VideoSensor without a link, that holds the state of a sensor.
+
+    It keeps the configuration parameters, the frame buffers and the
+    shadow copy of the registers of an *AsyncVideoSensor*, whose link is
+    an *AsyncClient*. Its helpers build and filter the register writes,
+    so both classes configure the FPGA in the same way.
+    """
+
+    def _new_client(self):
+        """The FPGA is accessed through the AsyncClient instead."""
+        return None
+
+
+class AsyncVideoSensor(object):
+    """Event loop counterpart of the *videosensor.VideoSensor* class.
+
+    The configuration file is read in the same way as in the blocking
+    class, but the operations with the FPGA are coroutines.
+
+    :param loop: *eventloop.EventLoop* instance driving the sensor.
+    :param str filename: Path to the configuration file of the camera.
+    :param float scale: scale ratio of the camera.
+    :param timeout: maximum duration, in seconds, of each request.
+    """
+
+    def __init__(self, loop, filename, scale=2.0, timeout=2.0):
+        """Read the configuration file without connecting to the device."""
+        self.loop = loop
+        self.filename = filename
+        # The blocking class holds the configuration, without a link.
+        sensor = _SensorState(scale=scale)
+        sensor.read_conffile(filename)
+        sensor.load_configuration(write2fpga=False)
+        self.conf = sensor.conf
+        self.offsets = sensor.offsets
+        self._params = sensor._params
+        self._scale = scale
+        self._H = sensor._H
+        self._H_inv = sensor._H_inv
+        self._limits = sensor._limits
+        self._ip = self.conf.get('VideoSensor', 'IP')
+        self._port = self.conf.getint('VideoSensor', 'PORT')
+        self._client = AsyncClient(loop, timeout=timeout)
+        # The frame formats and reusable buffers are the blocking ones.
+        self._sensor = sensor
+        self._locations_decoder = TrackerDecoder(columns=2, rows=8)
+
+    @property
+    def _connected(self):
+        return self._client.connected
+
+    def startup(self):
+        """Coroutine that connects and configures the camera.
+
+        It is the counterpart of *videosensor.camera_startup*. The
+        registers are read first, and only the ones that differ from the
+        configuration are written, in a single round trip.
+        """
+        yield self._client.open_connection(self._ip, self._port)
+        values = yield self._client.read_registers(
+                VideoSensor.SHADOW_REGISTERS)
+        self._sensor._load_shadow(values)
+        # The configured output is replaced by the one of the trackers.
+        registers = [(register, value) for register, value
+                     in self._sensor.get_configuration_registers()
+                     if register != 'SYSTEM_OUTPUT']
+        yield self.set_registers(registers + [('FREE_ALL', ''),
+                                              ('SYSTEM_OUTPUT', 4)])
+        yield self.configure_camera()
+
+    def disconnect_client(self):
+        """Coroutine that closes the connection with the device."""
+        if not self._connected:
+            logger.warn('Cannot disconnect, as it was not connected.')
+            return
+        yield self.set_register('SYSTEM_OUTPUT', 0)
+        yield self._client.close_connection()
+        self._sensor._shadow = {}
+
+    def configure_camera(self, force=False):
+        """Coroutine sending the 'CONFIGURE_CAMERA' command if needed.
+
+        As in *VideoSensor.configure_camera*, the command is only sent if
+        any geometry register was written since the last time.
+
+        :param bool force: if True, the command is always sent.
+        :return: message obtained back from the FPGA, or None if the
+         command was not needed.
+        """
+        if not (force or self._sensor._configure_pending):
+            logger.debug("Geometry unchanged. 'CONFIGURE_CAMERA' not sent")
+            raise Return(None)
+        conf = yield self._client.write_command('CONFIGURE_CAMERA', True)
+        self._sensor._configure_pending = False
+        logger.debug(repr("Obtained '{}' "
+                          "after 'CONFIGURE_CAMERA'".format(conf)))
+        raise Return(conf)
+
+    def get_register(self, register):
+        """Coroutine returning the content of a register."""
+        value = yield self._client.read_register(register)
+        raise Return(value)
+
+    def set_register(self, register, value, force=False):
+        """Coroutine writing a value into a register.
+
+        The value is formatted as in *VideoSensor.set_register*.
+        """
+        messages = yield self.set_registers([(register, value)], force)
+        raise Return(messages[0])
+
+    def set_registers(self, values, force=False):
+        """Coroutine writing several registers in one round trip.
+
+        As in *VideoSensor.set_registers*, the registers that already
+        hold their value in the shadow copy are not written.
+
+        :return: messages obtained back from the FPGA. None for the
+         skipped writes.
+        :rtype: list
+        """
+        formatted, changed = self._sensor._filter_writes(values, force)
+        pending = [pair for pair, write in zip(formatted, changed) if write]
+        replies = []
+        if pending:
+            replies = yield self._client.write_registers(pending)
+        raise Return(self._sensor._apply_writes(formatted, changed, replies))
+
+    def get_locations(self):
+        """Coroutine returning the contour points of the active trackers.
+
+        :return: dictionary whose keys are the tracker ids and whose
+         values are Nx2 arrays. It is empty if the reply is malformed.
+        :rtype: dict
+        """
+        payload = yield self._client.read_register('ACTUAL_LOCATION',
+                                                   raw=True)
+        locations = self._locations_decoder.decode(payload)
+        raise Return(locations or {})
+
+    def configure_tracker(self, tracker_id, min_x, min_y, width, height):
+        """Coroutine sending a tracker window to the FPGA."""
+        logger.debug('Configuring tracker {}'.format(tracker_id))
+        yield self.set_register('SET_WINDOW', '{},{},{},{},{}'.format(
+                tracker_id, min_x, min_y, width, height))
+
+    def capture_frame(self, gray=True, tries=20):
+        """Coroutine that requests a frame to the FPGA.
+
+        As in *VideoSensor.capture_frame*, the returned array is a view
+        over a reusable buffer.
+
+        :param bool gray: if True, a gray-scale image is requested.
+        :param int tries: number of timeouts waited for the capture
+         confirmation before giving up.
+        :return: MxNxdim array with the captured image.
+        :raises eventloop.TimeoutError: if the frame is not captured.
+        :raises socket.error: if the connection is closed before the
+         whole image is received.
+        """
+        yield self._client.write_command('GET_NEW_FRAME')
+        message = None
+        remaining = tries
+        # The capture confirmation may take longer than a single timeout.
+        while message != "Image captured.\n":
+            if not remaining:
+                raise TimeoutError("Stop waiting for a frame after {} "
+                                   "tries".format(tries))
+            remaining -= 1
+            message = yield self._client.read_message()
+        command, shape = self._sensor.get_frame_format(gray)
+        buffer = self._sensor.get_frame_buffer(command, int(np.prod(shape)))
+        yield self._client.write_command(command)
+        nbytes = yield self._client.read_into(buffer)
+        if nbytes < len(buffer):
+            raise socket.error(errno.ECONNRESET, "Received {} of {} image "
+                               "bytes".format(nbytes, len(buffer)))
+        image = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+        raise Return(image)
+
+    def track(self, callback, end_event, cycletime=0.02):
+        """Coroutine that reads the trackers locations every cycle.
+
+        Instead of busy-waiting, the coroutine sleeps the rest of each
+        cycle, letting the loop serve the other cameras.
+
+        :param callback: function called as *callback(sensor, locations)*
+         every cycle, with the dictionary of locations.
+        :param end_event: *threading.Event* object. The loop ends when it
+         is set.
+        :param float cycletime: duration of each cycle, in seconds.
+        """
+        while not end_event.isSet():
+            cycle_start_time = self.loop.time()
+            try:
+                locations = yield self.get_locations()
+            except TimeoutError:
+                logger.warn("No locations received from {}".format(
+                        self._ip))
+                locations = {}
+            callback(self, locations)
+            remaining = cycletime - (self.loop.time() - cycle_start_time)
+            if remaining > 0:
+                yield sleep(self.loop, remaining)
+
+
+def start_cameras(loop, filenames, timeout=5.0):
+    """Coroutine that brings up several cameras concurrently.
+
+    :param loop: *eventloop.EventLoop* instance.
+    :param filenames: paths to the configuration files of the cameras.
+    :param float timeout: maximum time for each camera to start up.
+    :return: list with an *AsyncVideoSensor* for each file, or the
+     exception raised when trying to start it up.
+    :rtype: list
+    """
+    sensors = [AsyncVideoSensor(loop, filename) for filename in filenames]
+    results = yield gather(loop, [wait_for(loop, sensor.startup(), timeout)
+                                  for sensor in sensors],
+                           return_exceptions=True)
+    started = []
+    for sensor, result in zip(sensors, results):
+        if isinstance(result, Exception):
+            logger.error("Unable to start camera {}: {}".format(
+                    sensor.filename, repr(result)))
+            started.append(result)
+        else:
+            started.append(sensor)
+    raise Return(started)
@@ -39,8 +39,13 @@ class Client(Socket):
     * close(): close the socket opened with the client
     * send(data): send data to the client
     * recv(buflen): read the specified number of bytes
+    * recv_into(buffer, nbytes): read bytes directly into a buffer
     * settimeout(timeout): time to wait for the client to respond
 
+    The operations can be timed by assigning a *tracer.ProtocolTracer*
+    to the *tracer* attribute. When it is None, the only cost is an
+    attribute check per operation.
+
     :param int buffer_size: number of bytes of the incoming data.
     :param timeout: value, in seconds, of the time that will be waited 
      for reading incoming data. This will set the object to timeout mode
@@ -94,6 +99,10 @@ class Client(Socket):
         self.ip = ''
         self.port = None
         self.buffer_size = buffer_size
+        # Received bytes that were not consumed yet by a read operation.
+        self._input = bytearray()
+        # Optional tracer.ProtocolTracer timing every operation.
+        self.tracer = None
         # Call parent method for setting the timeout
         self.settimeout(timeout)
 
@@ -105,6 +114,7 @@ class Client(Socket):
         if not isinstance(self._sock, socket._closedsocket):
             self.write_command('CLOSE_CONNECTION')
             self.close()
+            del self._input[:]
             logger.info('Closed the TCP client {}'.format(75 * '-'))
         else:
             logger.debug('Unable to close TCP client. Already closed')
@@ -124,8 +134,76 @@ class Client(Socket):
         self.connect((self.ip, self.port))
         logger.info('Started TCP client with IP: {} and PORT:{}.'.format(
                 self.ip, self.port))
-        # Empty the data buffer, as it contains the 'welcome message'.
-        self.recv(self.buffer_size)
+        # Empty the data buffer, as it contains the 'welcome message'. A
+        # single package is read, as the message may have no terminator.
+        self._fill_input()
+        del self._input[:]
+
+    def _fill_input(self):
+        """Append the next received package to the input buffer.
+
+        :return: False if no data could be received, due to a timeout or
+         to the connection being closed by the device. True otherwise.
+        :rtype: bool
+        """
+        while True:
+            try:
+                package = self.recv(self.buffer_size)
+            except socket.timeout:
+                return False
+            except socket.error as error:
+                # Ignore system (user) interrupts and keep reading.
+                if error.errno == errno.EINTR:
+                    continue
+                raise
+            break
+        if not package:
+            logger.warn('Connection closed by the remote device')
+            return False
+        self._input.extend(package)
+        return True
+
+    def read_message(self):
+        """Return the next complete newline terminated message.
+
+        If the message is not complete yet, new packages are received
+        until its terminator arrives. The bytes after the terminator are
+        kept for the next read operations.
+
+        :return: the message, including its newline character. If the
+         device stops sending data before the message is complete, None
+         is returned and the incomplete data is kept in the input buffer.
+        :rtype: str or None
+        """
+        # Only the new bytes are scanned when looking for the terminator.
+        start = 0
+        while True:
+            end = self._input.find('\n', start)
+            if end >= 0:
+                break
+            start = len(self._input)
+            if not self._fill_input():
+                return None
+        message = str(self._input[:end + 1])
+        del self._input[:end + 1]
+        return message
+
+    def read_messages(self, count):
+        """Return the given number of newline terminated messages.
+
+        :param int count: number of messages to be read.
+        :return: the received messages. If the device stops sending data,
+         the missing messages are returned as None.
+        :rtype: list
+        """
+        messages = []
+        for _ in range(count):
+            message = self.read_message()
+            if message is None:
+                messages.extend([None] * (count - len(messages)))
+                break
+            messages.append(message)
+        return messages
 
     def read_data(self, size):
         """Perform the input buffer read operation several times.
@@ -135,60 +213,126 @@ class Client(Socket):
         :return: A data concatenation of all packages read from the 
          input buffer.
         """
-        bytes = 0
-        packages = []
+        buffer = bytearray(size)
+        nbytes = self.read_into(buffer, size)
+        data = str(buffer[:nbytes])
+        return data
+
+    def read_into(self, buffer, size=None):
+        """Fill a preallocated buffer with data from the input buffer.
+
+        Contrary to *read_data*, the incoming packages are not stored as
+        separate strings and then concatenated. Instead, they are
+        written directly into the given buffer with *recv_into*, so the
+        same buffer can be reused for every transfer without allocating
+        new memory.
+
+        :param buffer: writable object supporting the buffer interface,
+         e.g. a *bytearray*, a *memoryview* or a numpy array.
+        :param int size: number of bytes to be read. If None, the whole
+         length of the buffer is filled.
+        :return: number of bytes actually written into the buffer.
+        :rtype: int
+        """
+        view = memoryview(buffer)
+        if size is None:
+            size = len(view)
+        elif size > len(view):
+            raise ValueError("Buffer too small: {} bytes for {} bytes of data"
+                             "".format(len(view), size))
+        # Begin with the bytes already stored in the input buffer.
+        nbytes = min(size, len(self._input))
+        if nbytes:
+            view[:nbytes] = self._input[:nbytes]
+            del self._input[:nbytes]
         # Do not stop reading new packages until target 'size' is reached.
-        while bytes < size:
+        while nbytes < size:
             try:
-                received_package = self.recv(self.buffer_size)
+                received = self.recv_into(view[nbytes:size], size - nbytes)
             except socket.timeout:
-                amount = 100 * float(bytes) / size
+                amount = 100 * float(nbytes) / size
                 logger.warn('Stopped data acquisition with {:.2f}% '
                             'of the data acquired'.format(amount))
                 break
-            bytes += len(received_package)
-            packages.append(received_package)
+            # A zero-length read means that the connection was closed.
+            if not received:
+                logger.warn('Connection closed by the remote device')
+                break
+            nbytes += received
         logger.debug('Received {} bytes of {} ({:.2f}%)'.format(
-                bytes, size, (100 * float(bytes) / size)))
-        # Concatenate all the packages in a unique variable
-        data = ''.join(packages)
-        return data
+                nbytes, size, (100 * float(nbytes) / size)))
+        return nbytes
 
     def write_command(self, command, clean_buffer=False):
         """Send a command to the TCP/IP client.
         
         :param str command: FPGA command to be executed.
-        :param bool clean_buffer: if True, a clean-up reading of the 
-         input buffer is done after writing.
+        :param bool clean_buffer: if True, the message returned by the
+         FPGA after the command is read from the input buffer.
         :return: message returned from the FPGA after writing the 
          command. If *clean_buffer* is False or there was no message, 
          'EMPTY_BUFFER' is returned.
         """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
         data = self._COMMANDS[command]
-        self.send('{}\n'.format(data))
+        self.sendall('{}\n'.format(data))
         message = "EMPTY BUFFER"
         if clean_buffer:
-            try:
-                message = self.recv(self.buffer_size)
-            except socket.timeout:
-                pass
+            message = self.read_message() or message
+        if tracer is not None:
+            tracer.record(command, start, len(data) + 1,
+                          len(message) if clean_buffer else 0)
         return message
 
-    def read_register(self, regkey):
+    def read_command_data(self, command, buffer, size=None):
+        """Send a command and receive its binary reply into a buffer.
+
+        It is used for downloading the frames, so that the whole
+        transfer is timed as a single operation when tracing.
+
+        :param str command: FPGA command to be executed.
+        :param buffer: writable object supporting the buffer interface.
+        :param int size: number of bytes to be read. If None, the whole
+         length of the buffer is filled.
+        :return: number of bytes actually written into the buffer.
+        :rtype: int
+        """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        data = self._COMMANDS[command]
+        self.sendall('{}\n'.format(data))
+        nbytes = self.read_into(buffer, size)
+        if tracer is not None:
+            tracer.record(command, start, len(data) + 1, nbytes)
+        return nbytes
+
+    def read_register(self, regkey, raw=False):
         """Read the value of a register and return it formatted.
 
         :param str regkey: register identifier
+        :param bool raw: if True, the reply is returned as received,
+         without converting it to a Python value.
         :return: the content of the register
-        :rtype: int or list
+        :rtype: int or list, or str if *raw* is True
+        :raises socket.timeout: if the reply is not received.
         """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
         reg = self._REGISTERS[regkey]
-        self.send('r,{}\n'.format(reg))
-        try:
-            result = self.recv(self.buffer_size)
-        except socket.error as (code, msg):
-            # Ignore system (user) interrupts and finish the buffer reading.
-            if code != errno.EINTR:
-                raise
+        self.sendall('r,{}\n'.format(reg))
+        result = self.read_message()
+        if tracer is not None:
+            tracer.record('r:' + regkey, start, len(reg) + 3,
+                          len(result or ''))
+        if result is None:
+            raise socket.timeout("No reply when reading {} register"
+                                 "".format(regkey))
+        if raw:
+            return result
         # Convert the string input into a valid value e.g. list or int
         formatted_result = ast.literal_eval(result)
         return formatted_result
@@ -202,12 +346,94 @@ class Client(Socket):
         :return: message given back by the FPGA after writing the 
          register
         """
-        reg = self._REGISTERS[regkey]
-        self.send('w,{},{}\n'.format(reg, value))
-        # Sometimes an ACK message is returned. It has to be checked for
-        # cleaning the buffer.
-        try:
-            message = self.recv(self.buffer_size)
-        except socket.timeout:
-            message = "EMPTY BUFFER"
-        return message
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        request = 'w,{},{}\n'.format(self._REGISTERS[regkey], value)
+        self.sendall(request)
+        # An ACK message is returned. It has to be read for cleaning the
+        # buffer before the next operation.
+        message = self.read_message()
+        if tracer is not None:
+            tracer.record('w:' + regkey, start, len(request),
+                          len(message or ''))
+        return message or "EMPTY BUFFER"
+
+    def read_registers(self, regkeys):
+        """Read the value of several registers in a single round trip.
+
+        All the read requests are sent in one write operation, and then
+        the replies are matched in order with the requested registers.
+        Thus, N register reads cost the latency of a single one.
+
+        :param regkeys: register identifiers to be read.
+        :type regkeys: iterable of str
+        :return: the formatted contents of the registers, in the same
+         order as *regkeys*. A None element is returned for the
+         registers whose reply was not received.
+        :rtype: list
+        """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        regkeys = list(regkeys)
+        requests = ['r,{}\n'.format(self._REGISTERS[regkey])
+                    for regkey in regkeys]
+        self.sendall(''.join(requests))
+        replies = self.read_messages(len(requests))
+        if tracer is not None:
+            self._trace_batch('r:', regkeys, requests, replies, start)
+        values = []
+        for regkey, reply in zip(regkeys, replies):
+            if reply is None:
+                logger.warn("No reply when reading {} register".format(regkey))
+                values.append(None)
+                continue
+            # Convert the string input into a valid value e.g. list or int
+            values.append(ast.literal_eval(reply))
+        return values
+
+    def write_registers(self, values):
+        """Write several registers in a single round trip.
+
+        All the write requests are sent in one write operation, and then
+        the acknowledge messages are matched in order with the written
+        registers.
+
+        :param values: register identifiers and the data to be written
+         on them. The data will be converted to a string before sending.
+         Use a list of pairs or an *OrderedDict* if the writing order
+         matters.
+        :type values: dict or iterable of (str, value) pairs
+        :return: messages given back by the FPGA after writing each
+         register, in the writing order. 'EMPTY BUFFER' is returned for
+         the registers whose message was not received.
+        :rtype: list
+        """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        if hasattr(values, 'items'):
+            values = values.items()
+        values = list(values)
+        requests = ['w,{},{}\n'.format(self._REGISTERS[regkey], value)
+                    for regkey, value in values]
+        self.sendall(''.join(requests))
+        replies = self.read_messages(len(requests))
+        if tracer is not None:
+            self._trace_batch('w:', [regkey for regkey, _ in values],
+                              requests, replies, start)
+        messages = ["EMPTY BUFFER" if reply is None else reply
+                    for reply in replies]
+        return messages
+
+    def _trace_batch(self, prefix, regkeys, requests, replies, start):
+        """Record the events of a batch of register operations.
+
+        Every register is recorded with the round trip time of the
+        whole batch, as it is the latency seen by the caller.
+        """
+        end = self.tracer.clock()
+        for regkey, request, reply in zip(regkeys, requests, replies):
+            self.tracer.record(prefix + regkey, start, len(request),
+                               len(reply or ''), end)
@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+"""Single-threaded event loop for driving several sockets concurrently.
+
+The project runs on Python 2.7, which lacks the *asyncio* module. This
+module provides a small subset of it, built on *select.select*:
+
+* *EventLoop*: dispatches socket readiness events, timers and callbacks.
+* *Future*: placeholder for a result that will be available later.
+* *Task*: drives a coroutine, i.e. a generator function that yields
+  futures or other coroutines and gets back their results.
+
+As generators can not return values in Python 2, a coroutine returns its
+result raising *Return(value)*. An example of coroutine:
+
+.. code-block:: python
+
+    def read_twice(client):
+        first = yield client.read_register('IMAGE_SHAPE')
+        yield sleep(loop, 0.1)
+        second = yield client.read_register('IMAGE_SHAPE')
+        raise Return((first, second))
+
+    loop = EventLoop()
+    result = loop.run_until_complete(read_twice(client))
+
+Every operation can be limited in time with *wait_for*, and any pending
+task can be stopped with its *cancel* method, that raises a
+*CancelledError* inside the coroutine at the point where it is waiting.
+"""
+# Standard libraries
+import collections
+import errno
+import heapq
+import itertools
+import logging
+import select
+import sys
+import time
+import types
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+
+class CancelledError(Exception):
+    """Raised inside a coroutine when its task is cancelled."""
+    pass
+
+
+class TimeoutError(Exception):
+    """Raised by *wait_for* when the operation was not finished in time."""
+    pass
+
+
+class Return(Exception):
+    """Raised by a coroutine in order to return a value to its caller.
+
+    :param value: result of the coroutine.
+    """
+
+    def __init__(self, value=None):
+        Exception.__init__(self)
+        self.value = value
+
+
+class Handle(object):
+    """Callback scheduled on the event loop, that can be cancelled."""
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Prevent the callback from being run."""
+        self.cancelled = True
+
+    def run(self):
+        """Run the callback, unless it was cancelled."""
+        if not self.cancelled:
+            self.callback(*self.args)
+
+
+class Future(object):
+    """Placeholder of the result of an operation that is not finished.
+
+    Coroutines yield futures in order to wait for them. When the result
+    is set, the coroutine is resumed with it, or the exception is raised
+    inside it.
+
+    :param loop: *EventLoop* instance where the callbacks are scheduled.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._done = False
+        self._cancelled = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        """Return True if the future has a result, an error or was cancelled."""
+        return self._done
+
+    def cancelled(self):
+        """Return True if the future was cancelled."""
+        return self._cancelled
+
+    def result(self):
+        """Return the result, or raise the exception of the future."""
+        if not self._done:
+            raise RuntimeError("The result is not available yet")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        """Return the exception of the future, or None."""
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """Call *callback(future)* when the future is done."""
+        if self._done:
+            self.loop.call_soon(callback, self)
+        else:
+            self._callbacks.append(callback)
+
+    def set_result(self, result):
+        """Mark the future as done and set its result."""
+        if self._done:
+            raise RuntimeError("The future is already done")
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        """Mark the future as done and set an exception."""
+        if self._done:
+            raise RuntimeError("The future is already done")
+        self._exception = exception
+        self._finish()
+
+    def cancel(self):
+        """Cancel the future. Return False if it was already done."""
+        if self._done:
+            return False
+        self._cancelled = True
+        self._exception = CancelledError()
+        self._finish()
+        return True
+
+    def _finish(self):
+        """Schedule the done callbacks."""
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self.loop.call_soon(callback, self)
+
+
+class Task(Future):
+    """Future that drives the execution of a coroutine.
+
+    The coroutine can yield *Future* objects, whose result is sent back
+    to it when available, or other coroutines, that are executed until
+    they return their result.
+
+    :param loop: *EventLoop* instance running the task.
+    :param coroutine: generator object to be run.
+    """
+
+    def __init__(self, loop, coroutine):
+        Future.__init__(self, loop)
+        # Stack of nested coroutines. The last one is the running one.
+        self._stack = [coroutine]
+        # Future whose result is being waited for.
+        self._waiting = None
+        self._must_cancel = False
+        loop.call_soon(self._step, None, None)
+
+    def cancel(self):
+        """Request the cancellation of the task.
+
+        A *CancelledError* is raised inside the coroutine, which may catch
+        it for cleaning up resources.
+
+        :return: False if the task was already done.
+        :rtype: bool
+        """
+        if self._done:
+            return False
+        # If the awaited future is cancelled, the task will be resumed with
+        # a CancelledError. Otherwise, it is raised on the next step.
+        if self._waiting is None or not self._waiting.cancel():
+            self._must_cancel = True
+        return True
+
+    def _step(self, value, error):
+        """Resume the coroutine with a value or an exception."""
+        if self._done:
+            return
+        self._waiting = None
+        if self._must_cancel:
+            self._must_cancel = False
+            error = CancelledError()
+        while True:
+            coroutine = self._stack[-1]
+            try:
+                if error is not None:
+                    exception, error = error, None
+                    yielded = coroutine.throw(exception)
+                else:
+                    yielded = coroutine.send(value)
+            except Return as returned:
+                value = returned.value
+            except StopIteration:
+                value = None
+            except Exception as exception:
+                self._stack.pop()
+                if not self._stack:
+                    if isinstance(exception, CancelledError):
+                        Future.cancel(self)
+                    else:
+                        self.set_exception(exception)
+                    return
+                error = exception
+                continue
+            else:
+                if isinstance(yielded, types.GeneratorType):
+                    # Run the nested coroutine before resuming this one.
+                    self._stack.append(yielded)
+                    value = None
+                elif isinstance(yielded, Future):
+                    self._waiting = yielded
+                    yielded.add_done_callback(self._wakeup)
+                    return
+                else:
+                    error = TypeError("Coroutines can only yield futures or "
+                                      "coroutines, not {}".format(yielded))
+                continue
+            # The running coroutine finished. Return the value to its caller.
+            self._stack.pop()
+            if not self._stack:
+                self.set_result(value)
+                return
+
+    def _wakeup(self, future):
+        """Resume the task after the awaited future is done."""
+        try:
+            value = future.result()
+        except Exception as exception:
+            self._step(None, exception)
+        else:
+            self._step(value, None)
+
+
+class EventLoop(object):
+    """Dispatcher of socket events, timers and callbacks.
+
+    All the callbacks and tasks are run on the thread that calls
+    *run_until_complete*, so the sockets handled by the loop shall not
+    be used from other threads.
+    """
+
+    def __init__(self):
+        self._ready = collections.deque()
+        # Heap with the scheduled timers, as (time, sequence, handle).
+        self._timers = []
+        self._sequence = itertools.count()
+        # Handles to be called when a file descriptor is ready.
+        self._readers = {}
+        self._writers = {}
+
+    def time(self):
+        """Return the current time of the loop, in seconds."""
+        return time.time()
+
+    def call_soon(self, callback, *args):
+        """Schedule *callback(\\*args)* on the next loop iteration."""
+        handle = Handle(callback, args)
+        self._ready.append(handle)
+        return handle
+
+    def call_later(self, delay, callback, *args):
+        """Schedule *callback(\\*args)* after *delay* seconds."""
+        handle = Handle(callback, args)
+        heapq.heappush(self._timers, (self.time() + delay,
+                                      next(self._sequence), handle))
+        return handle
+
+    def add_reader(self, fd, callback, *args):
+        """Call *callback(\\*args)* whenever *fd* is ready for reading."""
+        self._readers[fd] = Handle(callback, args)
+
+    def remove_reader(self, fd):
+        """Stop watching *fd* for reading."""
+        return self._readers.pop(fd, None) is not None
+
+    def add_writer(self, fd, callback, *args):
+        """Call *callback(\\*args)* whenever *fd* is ready for writing."""
+        self._writers[fd] = Handle(callback, args)
+
+    def remove_writer(self, fd):
+        """Stop watching *fd* for writing."""
+        return self._writers.pop(fd, None) is not None
+
+    def create_task(self, coroutine):
+        """Schedule the execution of a coroutine and return its Task."""
+        return Task(self, coroutine)
+
+    def ensure_future(self, coroutine_or_future):
+        """Return the argument if it is a future, or wrap it in a Task."""
+        if isinstance(coroutine_or_future, Future):
+            return coroutine_or_future
+        return self.create_task(coroutine_or_future)
+
+    def run_until_complete(self, coroutine_or_future):
+        """Run the loop until the given coroutine or future is done.
+
+        :return: the result of the coroutine or future.
+        :raises: the exception of the coroutine or future, if any.
+        """
+        future = self.ensure_future(coroutine_or_future)
+        while not future.done():
+            self._run_once()
+        return future.result()
+
+    def _run_once(self):
+        """Wait for the next events and run the ready callbacks."""
+        if self._ready:
+            timeout = 0
+        elif self._timers:
+            timeout = max(0, self._timers[0][0] - self.time())
+        elif self._readers or self._writers:
+            timeout = None
+        else:
+            raise RuntimeError("Nothing to wait for in the event loop")
+        if self._readers or self._writers:
+            try:
+                readable, writable, _ = select.select(
+                        self._readers.keys(), self._writers.keys(), [],
+                        timeout)
+            except select.error as error:
+                # Ignore system (user) interrupts and loop again.
+                if error.args[0] != errno.EINTR:
+                    raise
+                readable, writable = [], []
+            for fd in readable:
+                handle = self._readers.get(fd)
+                if handle is not None:
+                    self._ready.append(handle)
+            for fd in writable:
+                handle = self._writers.get(fd)
+                if handle is not None:
+                    self._ready.append(handle)
+        elif timeout:
+            time.sleep(timeout)
+        # Move the expired timers to the ready queue.
+        now = self.time()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, handle = heapq.heappop(self._timers)
+            self._ready.append(handle)
+        # Only run the callbacks that were ready at this point.
+        for _ in range(len(self._ready)):
+            self._ready.popleft().run()
+
+
+def sleep(loop, delay, result=None):
+    """Return a future that will be done after *delay* seconds."""
+    future = Future(loop)
+
+    def wake_up():
+        if not future.done():
+            future.set_result(result)
+    handle = loop.call_later(delay, wake_up)
+    future.add_done_callback(lambda _: handle.cancel())
+    return future
+
+
+def wait_for(loop, coroutine_or_future, timeout):
+    """Coroutine that waits for an operation for a limited time.
+
+    If the timeout expires, the operation is cancelled and a
+    *TimeoutError* is raised.
+
+    :param loop: *EventLoop* instance.
+    :param coroutine_or_future: operation to be waited for.
+    :param timeout: maximum time to wait, in seconds. If None, the wait
+     is not limited.
+    :type timeout: int, float or None
+    """
+    task = loop.ensure_future(coroutine_or_future)
+    if timeout is None:
+        result = yield task
+        raise Return(result)
+    expired = []
+
+    def expire():
+        expired.append(True)
+        task.cancel()
+    handle = loop.call_later(timeout, expire)
+    try:
+        result = yield task
+    except CancelledError:
+        if expired:
+            raise TimeoutError("Operation not finished after {}s".format(
+                    timeout))
+        raise
+    finally:
+        handle.cancel()
+    raise Return(result)
+
+
+def gather(loop, coroutines, return_exceptions=False):
+    """Run several coroutines concurrently and wait for all of them.
+
+    :param loop: *EventLoop* instance.
+    :param coroutines: coroutines or futures to be run.
+    :param bool return_exceptions: if True, the exceptions raised by the
+     operations are returned in the results list instead of being raised.
+    :return: future whose result is the list of results, in order.
+    :rtype: Future
+    """
+    futures = [loop.ensure_future(coroutine) for coroutine in coroutines]
+    outer = Future(loop)
+    pending = [len(futures)]
+    if not futures:
+        outer.set_result([])
+        return outer
+
+    def child_done(child):
+        if outer.done():
+            return
+        if not return_exceptions and child.exception() is not None:
+            outer.set_exception(child.exception())
+            return
+        pending[0] -= 1
+        if pending[0]:
+            return
+        results = []
+        for future in futures:
+            if future.exception() is not None:
+                results.append(future.exception())
+            else:
+                results.append(future.result())
+        outer.set_result(results)
+
+    def outer_done(_):
+        # Cancelling the gathering future cancels all the operations.
+        if outer.cancelled():
+            for future in futures:
+                future.cancel()
+    for future in futures:
+        future.add_done_callback(child_done)
+    outer.add_done_callback(outer_done)
+    return outer
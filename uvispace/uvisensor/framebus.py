@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""This module contains a shared memory ring of frames for several readers.
+
+A single capture process writes the frames of a camera into a *FrameBus*
+and any number of processes attach to it by name with a
+*FrameBusReader*. The readers get the frames as views over the shared
+memory, so the frames are transferred once from the camera and never
+copied.
+
+The bus is a file in */dev/shm* (or in the temporary folder if it is not
+available) mapped in memory by every process, with this layout:
+
+* Header: 8 unsigned 64-bit integers with the magic number, the layout
+  version, the number of slots, the frame size, the frame shape (rows,
+  columns and channels) and the sequence number of the last published
+  frame.
+* Sequence number and timestamp of the frame stored in each slot.
+* Frame data of each slot.
+
+The frames are numbered from 1, and frame *n* is stored in slot
+*n % slots*. Before overwriting a slot, the producer sets its sequence
+number to 0, and it sets the new one once the frame is complete. The
+producer never waits for the readers: a reader that is too slow skips
+the overwritten frames, and it can check with *is_valid* whether the
+frame it was processing was overwritten meanwhile.
+"""
+# Standard libraries
+import logging
+import os
+import sys
+import tempfile
+import time
+# Third party libraries
+import numpy as np
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+MAGIC = np.frombuffer("UVIBUS01", dtype=np.uint64)[0]
+VERSION = 1
+# Number of fields of the header, and index of each one.
+_HEADER_FIELDS = 8
+(_MAGIC, _VERSION, _SLOTS, _FRAME_SIZE, _ROWS, _COLUMNS, _CHANNELS,
+ _LATEST) = range(_HEADER_FIELDS)
+# The frames data is aligned to this number of bytes.
+_ALIGNMENT = 64
+
+
+def get_bus_path(name):
+    """Return the path of the file that backs the bus with a given name."""
+    folder = '/dev/shm'
+    if not os.path.isdir(folder):
+        folder = tempfile.gettempdir()
+    return os.path.join(folder, 'uvispace_bus_{}'.format(name))
+
+
+class _FrameRing(object):
+    """Views over the memory map of a bus file.
+
+    :param memory: *numpy.memmap* with the whole bus file.
+    :param int slots: number of frames in the ring.
+    :param tuple shape: shape of each frame.
+    """
+
+    def __init__(self, memory, slots, shape):
+        self.memory = memory
+        self.slots = slots
+        self.shape = shape
+        header_size = _HEADER_FIELDS * 8
+        self.header = memory[:header_size].view(np.uint64)
+        offset = header_size
+        self.sequences = memory[offset:offset + slots * 8].view(np.uint64)
+        offset += slots * 8
+        self.timestamps = memory[offset:offset + slots * 8].view(np.float64)
+        offset = _data_offset(slots)
+        frame_size = int(np.prod(shape))
+        self.frames = memory[offset:offset + slots * frame_size].reshape(
+                (slots,) + tuple(shape))
+
+
+def _data_offset(slots):
+    """Offset of the frames data in the bus file."""
+    offset = _HEADER_FIELDS * 8 + 2 * slots * 8
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+class FrameBus(object):
+    """Producer side of a shared memory ring of frames.
+
+    The bus file is created, or overwritten if it already existed.
+
+    :param str name: identifier of the bus, used by the readers.
+    :param shape: shape of the frames e.g. (rows, columns) for gray
+     images, or (rows, columns, channels).
+    :type shape: tuple
+    :param int slots: number of frames in the ring. A reader can be
+     *slots - 1* frames behind the producer without losing frames.
+    """
+
+    def __init__(self, name, shape, slots=8):
+        if slots < 2:
+            raise ValueError("At least 2 slots are needed")
+        shape = tuple(int(value) for value in shape)
+        rows, columns = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
+        self.name = name
+        self.path = get_bus_path(name)
+        frame_size = int(np.prod(shape))
+        size = _data_offset(slots) + slots * frame_size
+        with open(self.path, 'wb') as bus_file:
+            bus_file.truncate(size)
+        memory = np.memmap(self.path, dtype=np.uint8, mode='r+')
+        self._ring = _FrameRing(memory, slots, shape)
+        header = self._ring.header
+        header[:_LATEST] = [MAGIC, VERSION, slots, frame_size, rows,
+                            columns, channels]
+        header[_LATEST] = 0
+        self.sequence = 0
+        logger.info("Frame bus '{}' created at {}".format(name, self.path))
+
+    def begin_frame(self):
+        """Reserve the slot of the next frame for writing.
+
+        The returned array can be filled directly e.g. with
+        *socket.recv_into*, avoiding an intermediate copy. The frame is
+        not visible to the readers until *commit_frame* is called.
+
+        :return: sequence number of the new frame and writable view over
+         its slot.
+        :rtype: int, numpy.array
+        """
+        sequence = self.sequence + 1
+        slot = sequence % self._ring.slots
+        # Invalidate the slot before its content is overwritten.
+        self._ring.sequences[slot] = 0
+        return sequence, self._ring.frames[slot]
+
+    def commit_frame(self, sequence, timestamp=None):
+        """Publish the frame written after *begin_frame*.
+
+        :param int sequence: sequence number returned by *begin_frame*.
+        :param float timestamp: capture time. Current time if None.
+        """
+        if sequence != self.sequence + 1:
+            raise ValueError("Frame {} was not begun".format(sequence))
+        slot = sequence % self._ring.slots
+        if timestamp is None:
+            timestamp = time.time()
+        self._ring.timestamps[slot] = timestamp
+        self._ring.sequences[slot] = sequence
+        self._ring.header[_LATEST] = sequence
+        self.sequence = sequence
+
+    def publish(self, frame, timestamp=None):
+        """Copy a frame into the bus and publish it.
+
+        :param numpy.array frame: image with the shape of the bus.
+        :return: sequence number of the frame.
+        :rtype: int
+        """
+        sequence, slot = self.begin_frame()
+        slot[...] = frame
+        self.commit_frame(sequence, timestamp)
+        return sequence
+
+    def close(self, unlink=True):
+        """Release the bus. The attached readers keep their mapping.
+
+        :param bool unlink: if True, the bus file is removed, so no new
+         readers can attach.
+        """
+        self._ring = None
+        if unlink and os.path.exists(self.path):
+            os.remove(self.path)
+        logger.info("Frame bus '{}' closed".format(self.name))
+
+
+class FrameBusReader(object):
+    """Reader side of a shared memory ring of frames.
+
+    :param str name: identifier of the bus, set by its producer.
+    :raises: IOError if there is no bus with that name, or ValueError if
+     the file is not a valid bus.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = get_bus_path(name)
+        memory = np.memmap(self.path, dtype=np.uint8, mode='r')
+        header = memory[:_HEADER_FIELDS * 8].view(np.uint64)
+        if header[_MAGIC] != MAGIC or header[_VERSION] != VERSION:
+            raise ValueError("{} is not a valid frame bus".format(self.path))
+        slots = int(header[_SLOTS])
+        shape = (int(header[_ROWS]), int(header[_COLUMNS]))
+        if header[_CHANNELS] > 1:
+            shape += (int(header[_CHANNELS]),)
+        self._ring = _FrameRing(memory, slots, shape)
+        self.shape = shape
+        # Sequence number of the last frame read.
+        self.sequence = 0
+        # Number of frames that were overwritten before being read.
+        self.overruns = 0
+
+    @property
+    def latest(self):
+        """Sequence number of the last published frame."""
+        return int(self._ring.header[_LATEST])
+
+    def is_valid(self, sequence):
+        """Check that a frame was not overwritten by the producer.
+
+        It has to be checked after processing a frame, in order to
+        discard results obtained from a partially overwritten frame.
+        """
+        slot = sequence % self._ring.slots
+        return int(self._ring.sequences[slot]) == sequence
+
+    def get_frame(self, timeout=None, poll=0.001):
+        """Return the frame after the last one read.
+
+        If the reader fell behind and that frame was overwritten, the
+        missed frames are added to *overruns* and the newest frame is
+        returned instead.
+
+        :param timeout: maximum time to wait for a new frame, in
+         seconds. If None, wait until it is published.
+        :type timeout: int, float or None
+        :param float poll: time between checks of the bus, in seconds.
+        :return: sequence number, timestamp and read-only view of the
+         frame. (None, None, None) after a timeout.
+        :rtype: int, float, numpy.array
+        """
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while True:
+            latest = self.latest
+            if latest > self.sequence:
+                sequence = self.sequence + 1
+                # The slot after the newest one may be being written.
+                if latest - sequence >= self._ring.slots - 1:
+                    sequence = latest
+                slot = sequence % self._ring.slots
+                timestamp = float(self._ring.timestamps[slot])
+                if self.is_valid(sequence):
+                    break
+            # Wait for a new frame, or for the producer to move on if the
+            # frame was being overwritten.
+            if timeout is not None and time.time() >= deadline:
+                return None, None, None
+            time.sleep(poll)
+        if sequence > self.sequence + 1:
+            missed = sequence - self.sequence - 1
+            self.overruns += missed
+            logger.debug("Frame bus '{}': {} frames lost".format(self.name,
+                                                                 missed))
+        self.sequence = sequence
+        return sequence, timestamp, self._ring.frames[slot]
@@ -285,41 +285,29 @@ class Triangle(object):
         :type H: np.array(shape=3x3)
         :return: the new vertices coordinates values.
         """
-        points = np.copy(self.vertices)
-        # Loop for performing the homography to every 2-D vertex' coordinates.
-        for index, row in enumerate(points):
-            # Append '1' to the point vector and perform a matrix product with H
-            operand = np.hstack([row, 1])
-            product = np.dot(H, operand)
-            new_point = product[0:2] / product[2]
-            points[index] = new_point
-        self.vertices = np.copy(points)
+        self.vertices = projective_transform(self.vertices,
+                                             H).astype(np.float32)
         return self.vertices
 
-    def inverse_homography(self, H):
+    def inverse_homography(self, H, H_inv=None):
         """Perform an inverse homography operation to the vertices.
 
-        Get :math:`X_u` from the equation 
-        :math:`(w \\cdot X) = H \\cdot Y`.
-
-        First of all, get :math:`\\frac{1}{w \\cdot Y}` using least 
-        squares method. Then, extracts :math:`\\frac{1}{w}` from the 
-        column matrix, with the hypothesis that :math:`Y_{11} = 1`.
+        Get :math:`Y` from the equation
+        :math:`(w \\cdot X) = H \\cdot Y`, i.e. apply the homography
+        of the inverse matrix of H.
 
         :param H: Homography matrix.
         :type H: np.array(shape=3x3)
+        :param H_inv: Inverse of the homography matrix. If not given, it
+         is calculated from H. The *VideoSensor* class keeps it in its
+         *_H_inv* attribute.
+        :type H_inv: np.array(shape=3x3)
         :return: the new vertices coordinates values.
         """
-        points = np.copy(self.vertices)
-        # Loop for performing the homography to every 2-D vertex' coordinates.
-        for index, row in enumerate(points):
-            # Append '1' to the point vector and perform a matrix product with H
-            operand = np.hstack([row, 1])
-            # Use least squares method to get Y from X=H.Y
-            product = np.linalg.lstsq(H, operand)[0]
-            new_point = product[0:2] / product[2]
-            points[index] = new_point
-        self.vertices = np.copy(points)
+        if H_inv is None:
+            H_inv = np.linalg.inv(H)
+        self.vertices = projective_transform(self.vertices,
+                                             H_inv).astype(np.float32)
         return self.vertices
 
     def in_borders(self, limits, tolerance=150):
@@ -354,6 +342,364 @@ class Triangle(object):
         return False
 
 
+class TriangleBatch(object):
+    """Class for dealing with the geometric operations of N triangles.
+
+    The vertices of the N triangles are stored in a single contiguous
+    Nx3x2 array, and the operations of the *Triangle* class are applied
+    to all of them at once, with array operations instead of Python
+    loops. The rest of attributes have the same names as in *Triangle*,
+    in plural, with an extra first dimension of length N. The values
+    that are not calculated yet are NaN.
+
+    Indexing a batch returns *Triangle* objects whose arrays are views
+    of the batch arrays, so they can be used by the existing callers
+    without copying the data. The operations of the batch are reflected
+    on the previously obtained triangles, as long as they are not
+    transformed on their own.
+
+    :param vertices: vertices coordinates of the N triangles.
+    :type vertices: np.array(shape=Nx3x2)
+    :param bool isglobal: Flag that indicates if the coordinate system
+     refers to the 4-quadrant system (global) or to a local quadrant
+     system.
+    :param bool cartesian: This flag indicates if the coordinates are
+     referred to a cartesian system [x,y] instead of the images typical
+     standard [row. column] = [y,x]
+    """
+
+    def __init__(self, vertices, isglobal=False, cartesian=False):
+        """TriangleBatch class constructor."""
+        self.vertices = np.array(vertices, dtype=np.float32)
+        if self.vertices.ndim != 3 or self.vertices.shape[1:] != (3, 2):
+            raise ValueError("Expected an array with Nx3 vertices")
+        # These flags indicate the coordinates system that is being used
+        self.isglobal = isglobal
+        self.cartesian = cartesian
+        self.barycenters = self.vertices.sum(axis=1) / 3
+        length = len(self.vertices)
+        self.sides = np.zeros([length, 3])
+        self.base_indexes = np.zeros([length], dtype=int)
+        self.midpoints = np.full([length, 2], np.nan, dtype=np.float32)
+        self.angles = np.full([length], np.nan, dtype=np.float32)
+        self.windows = np.full([length, 2, 2], np.nan)
+        # Scale ratio for converting pixel coordinates to millimetres.
+        self._scale = 1
+
+    @classmethod
+    def from_triangles(cls, triangles):
+        """Create a batch with the vertices of a list of triangles.
+
+        :param triangles: *Triangle* objects, all of them in the same
+         coordinates system.
+        :type triangles: list of Triangle
+        :raises ValueError: if the coordinates systems are different.
+        """
+        triangles = list(triangles)
+        flags = set((triangle.isglobal, triangle.cartesian)
+                    for triangle in triangles)
+        if len(flags) > 1:
+            raise ValueError("The triangles are in different coordinates "
+                             "systems")
+        isglobal, cartesian = flags.pop() if flags else (False, False)
+        vertices = np.zeros([len(triangles), 3, 2], dtype=np.float32)
+        for index, triangle in enumerate(triangles):
+            vertices[index] = triangle.vertices
+        return cls(vertices, isglobal, cartesian)
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def __str__(self):
+        return "TriangleBatch\n{}".format(self.vertices)
+
+    def __repr__(self):
+        return "TriangleBatch\n{}".format(self.vertices)
+
+    def __getitem__(self, index):
+        """Return a *Triangle* view of the batch element *index*."""
+        triangle = Triangle(self.vertices[index], self.isglobal,
+                            self.cartesian)
+        triangle.vertices = self.vertices[index]
+        triangle.barycenter = self.barycenters[index]
+        triangle.sides = self.sides[index]
+        triangle._scale = self._scale
+        if not np.isnan(self.angles[index]):
+            triangle.base_index = self.base_indexes[index]
+            triangle.midpoint = self.midpoints[index]
+            triangle.angle = self.angles[index]
+        if not np.isnan(self.windows[index]).any():
+            triangle.window = self.windows[index]
+        return triangle
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def _set_scale(self, K):
+        """Assess K and assign value to 'scale' attribute if it is valid."""
+        if K is None:
+            return
+        elif K <= 0:
+            raise ValueError("The scale ratio K must be greater than 0")
+        self._scale = K
+
+    def local2global(self, offsets, K=None, image2cartesian=True):
+        """Convert the coordinates to the global coordinates system.
+
+        See *Triangle.local2global*.
+
+        :param offsets: column and row offsets between the local and the
+          global systems.
+        :type offsets: list[int, int]
+        :param K: Scale ratio to be applied to the points coordinates.
+        :type K: positive int or float
+        :param bool image2cartesian: If True, a conversion from image
+         coordinate system to cartesian system is performed.
+        :raises ValueError: if the scale ratio is negative.
+        """
+        if self.isglobal:
+            return
+        self._set_scale(K)
+        for points in (self.vertices, self.barycenters, self.midpoints):
+            points[..., 0] = offsets[0] - points[..., 0]
+            points[..., 1] -= offsets[1]
+            points *= self._scale
+            if image2cartesian:
+                points[...] = points[..., ::-1]
+        self.cartesian = self.cartesian or image2cartesian
+        self.isglobal = True
+
+    def global2local(self, offsets, K=None, cartesian2image=True):
+        """Convert the coordinates to the local coordinates system.
+
+        See *Triangle.global2local*.
+
+        :param offsets: column and row offsets between the local and the
+          global systems.
+        :type offsets: list[int, int]
+        :param K: Scale ratio to be applied to the points coordinates.
+        :type K: positive int or float
+        :param bool cartesian2image: If True, a conversion from
+         cartesian coordinates system to image system is performed.
+        :raises ValueError: if the scale ratio is negative.
+        """
+        if not self.isglobal:
+            return
+        self._set_scale(K)
+        for points in (self.vertices, self.barycenters, self.midpoints):
+            if cartesian2image:
+                points[...] = points[..., ::-1]
+            points /= self._scale
+            points[..., 0] = offsets[0] - points[..., 0]
+            points[..., 1] += offsets[1]
+        self.cartesian = self.cartesian and not cartesian2image
+        self.isglobal = False
+
+    def get_pose(self):
+        """Return the base midpoints and angles of the triangles.
+
+        The *sides*, *base_indexes*, *midpoints* and *angles* attributes
+        are updated. See *Triangle.get_pose*.
+
+        :return: each row contains the [X,Y] coordinates of the midpoint
+         of a triangle's base side and its orientation angle.
+        :rtype: np.array(shape=Nx3)
+        """
+        vertices = self.vertices
+        # Side i is the one opposite to vertex i.
+        self.sides[:] = np.linalg.norm(np.roll(vertices, 1, axis=1)
+                                       - np.roll(vertices, -1, axis=1),
+                                       axis=2)
+        self.base_indexes[:] = np.argmin(self.sides, axis=1)
+        rows = np.arange(len(self))
+        self.midpoints[:] = (vertices[rows, self.base_indexes - 1]
+                             + vertices[rows, self.base_indexes - 2]) / 2
+        delta = vertices[rows, self.base_indexes] - self.midpoints
+        if self.cartesian:
+            self.angles[:] = np.arctan2(delta[:, 1], delta[:, 0])
+        else:
+            # The array 'y'(rows) counts downwards, contrary to cartesian
+            # system.
+            self.angles[:] = np.arctan2(-delta[:, 0], delta[:, 1])
+        return np.column_stack([self.midpoints, self.angles])
+
+    def get_window(self, min_value, max_value, k=1.25):
+        """Get the windows around the triangles.
+
+        The *windows* attribute is updated. See *Triangle.get_window*.
+
+        :param min_value: value or values of the minimum allowed
+         coordinates.
+        :param max_value: value or values of the maximum allowed
+         coordinates.
+        :param k: relative size between the windows and the triangles.
+        :type min_value: int or np.array[int,int]
+        :type max_value: int or np.array[int,int]
+        :type k: int or float
+        :return: windows in the format of *Triangle.window*.
+        :rtype: Nx2x2 np.array
+        """
+        distances = self.sides.max(axis=1) * k
+        windows = (self.barycenters[:, np.newaxis]
+                   + distances[:, np.newaxis, np.newaxis] * [[-1], [1]])
+        # Move the windows inside the bounds. The maximum bound has
+        # priority, as in the Triangle class.
+        excess = np.max(windows - max_value, axis=1)
+        defect = np.max(min_value - windows, axis=1)
+        shifts = np.where(excess > 0, -excess, np.where(defect > 0, defect, 0))
+        self.windows[:] = windows + shifts[:, np.newaxis]
+        return self.windows
+
+    def homography(self, H):
+        """Perform an homography operation to the vertices.
+
+        :param H: Homography matrix.
+        :type H: np.array(shape=3x3)
+        :return: the new vertices coordinates values.
+        """
+        self.vertices[:] = projective_transform(self.vertices, H)
+        return self.vertices
+
+    def inverse_homography(self, H, H_inv=None):
+        """Perform an inverse homography operation to the vertices.
+
+        See *Triangle.inverse_homography*.
+
+        :param H: Homography matrix.
+        :type H: np.array(shape=3x3)
+        :param H_inv: Inverse of the homography matrix. If not given, it
+         is calculated from H.
+        :type H_inv: np.array(shape=3x3)
+        :return: the new vertices coordinates values.
+        """
+        if H_inv is None:
+            H_inv = np.linalg.inv(H)
+        self.vertices[:] = projective_transform(self.vertices, H_inv)
+        return self.vertices
+
+    def in_borders(self, limits, tolerance=150):
+        """Evaluate if the vertices are near a 4-sides polygon perimeter.
+
+        See *Triangle.in_borders*.
+
+        :param limits: Array containing the coordinates of the 4 points
+         defining the borders of the polygon.
+        :param tolerance: Maximum allowed distance (mm) to the limits
+         to be considered within the borders region.
+        :type limits: iterable of length 4
+        :type tolerance: int or float
+        :return: flags set to True for the triangles evaluated to be
+         inside the given polygon.
+        :rtype: np.array(shape=N, dtype=bool)
+        """
+        return QuadrantPolygons([limits]).in_borders(self.vertices,
+                                                     tolerance)[0]
+
+
+class QuadrantPolygons(object):
+    """Class for evaluating points against the working spaces of N cameras.
+
+    The perimeters of the N polygons are precomputed as arrays of edges,
+    so that the distances from every point to every edge of every
+    polygon are obtained with a single vectorized operation, instead of
+    creating *Segment* objects for each evaluation.
+
+    As in *Triangle.in_borders*, the edge *i* of a polygon goes from its
+    vertex *i* to its vertex *i-1*.
+
+    :param limits: N arrays with the coordinates of the K vertices of
+     each polygon, in order (e.g. the *_limits* attribute of the
+     *VideoSensor* objects). All of them must have the same K.
+    :type limits: iterable of Kx2 arrays
+    """
+
+    def __init__(self, limits):
+        """QuadrantPolygons class constructor."""
+        self.vertices = np.array(limits, dtype=np.float64)
+        if self.vertices.ndim != 3 or self.vertices.shape[2] != 2:
+            raise ValueError("Expected N arrays with Kx2 vertices")
+        self.edges = np.roll(self.vertices, 1, axis=1) - self.vertices
+        self.lengths = np.linalg.norm(self.edges, axis=2)
+        # Degenerated edges are treated as points.
+        tiny = np.finfo(np.float64).tiny
+        self._squared_lengths = np.maximum(self.lengths ** 2, tiny)
+        # Unit vectors perpendicular to the edges. They point inwards for
+        # counterclockwise polygons, whose area is positive.
+        normals = np.dstack([self.edges[..., 1], -self.edges[..., 0]])
+        normals /= np.maximum(self.lengths, tiny)[..., np.newaxis]
+        x, y = self.vertices[..., 0], self.vertices[..., 1]
+        areas = (x * np.roll(y, -1, axis=1)
+                 - np.roll(x, -1, axis=1) * y).sum(axis=1)
+        self.normals = np.sign(areas)[:, np.newaxis, np.newaxis] * normals
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def _get_vectors(self, points):
+        """Return the vectors from every edge start to every point."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return (points[np.newaxis, :, np.newaxis]
+                - self.vertices[:, np.newaxis])
+
+    def get_distances(self, points):
+        """Get the distances from the points to the polygons perimeters.
+
+        :param points: array with the 2-D coordinates of P points.
+        :type points: np.array(shape=Px2)
+        :return: the distance from every point to the nearest point of
+         the perimeter of every polygon.
+        :rtype: np.array(shape=NxP)
+        """
+        vectors = self._get_vectors(points)
+        edges = self.edges[:, np.newaxis]
+        # Relative position of the projections on the edges, limited to
+        # the edges' ends.
+        projections = np.clip((vectors * edges).sum(axis=3)
+                              / self._squared_lengths[:, np.newaxis], 0, 1)
+        distances = np.linalg.norm(
+                vectors - projections[..., np.newaxis] * edges, axis=3)
+        return distances.min(axis=2)
+
+    def in_borders(self, vertices, tolerance=150):
+        """Evaluate if the shapes are near the polygons perimeters.
+
+        It is the vectorized version of *Triangle.in_borders*, for R
+        shapes and the N polygons.
+
+        :param vertices: coordinates of the V vertices of R shapes. A
+         single Vx2 shape is accepted as well.
+        :type vertices: np.array(shape=RxVx2)
+        :param tolerance: Maximum allowed distance (mm) to the limits
+         to be considered within the borders region.
+        :type tolerance: int or float
+        :return: flags set to True if any vertex of the shape is within
+         the borders region of the polygon.
+        :rtype: np.array(shape=NxR, dtype=bool)
+        """
+        vertices = np.asarray(vertices)
+        if vertices.ndim == 2:
+            vertices = vertices[np.newaxis]
+        distances = self.get_distances(vertices).reshape(len(self),
+                                                         len(vertices), -1)
+        return (distances < tolerance).any(axis=2)
+
+    def contains(self, points):
+        """Evaluate if the points are inside the polygons.
+
+        The polygons are assumed to be convex.
+
+        :param points: array with the 2-D coordinates of P points.
+        :type points: np.array(shape=Px2)
+        :return: flags set to True for the points inside the polygons,
+         including their perimeters.
+        :rtype: np.array(shape=NxP, dtype=bool)
+        """
+        vectors = self._get_vectors(points)
+        heights = (vectors * self.normals[:, np.newaxis]).sum(axis=3)
+        return (heights >= 0).all(axis=2)
+
+
 class Segment(object):
     """This class contains methods for dealing with 2D segments operations.
 
@@ -414,3 +760,130 @@ class Segment(object):
             # Pythagoras theorem for getting the leg of a right-angled triangle.
             distance = np.sqrt((vector2 ** 2).sum() - projection ** 2)
         return distance
+
+
+def projective_transform(points, H):
+    """Apply a projective transformation (homography) to points.
+
+    All the points are transformed with a single matrix product, using
+    homogeneous coordinates.
+
+    :param points: array with the 2-D coordinates of the points in its
+     last dimension, e.g. Nx2 or Nx3x2.
+    :param H: Homography matrix.
+    :type H: np.array(shape=3x3)
+    :return: the transformed points, with the same shape as the input.
+    :rtype: np.array
+    """
+    H = np.asarray(H, dtype=np.float64)
+    product = np.dot(points, H[:, :2].T) + H[:, 2]
+    return product[..., :2] / product[..., 2:]
+
+
+def get_polygon_moments(points):
+    """Get the area, centroid and central moments of a polygon.
+
+    The moments of the region enclosed by the polygon are calculated
+    with the Green's theorem, as sums over its edges, so there is no
+    need to rasterize it. It works with the contours of the binarized
+    images, or with the 8 points of an FPGA tracker.
+
+    :param points: Mx2 array with the vertices of the polygon, in
+     contour order. The first vertex may be repeated at the end.
+    :return: area of the polygon; its centroid; the covariance matrix
+     of the region i.e. the second order central moments divided by the
+     area; and the third order central moments divided by the area, in
+     the order [mu30, mu21, mu12, mu03], where the first index refers
+     to the first coordinate. None if the area is 0.
+    :rtype: float, np.array, 2x2 np.array, np.array or None
+    """
+    points = np.asarray(points, dtype=np.float64)
+    x0, y0 = points.T
+    x1, y1 = np.roll(points, -1, axis=0).T
+    cross = x0 * y1 - x1 * y0
+    # The area is negative if the vertices are in clockwise order, but
+    # the moments divided by it are not affected.
+    area = cross.sum() / 2
+    if abs(area) < 1e-9:
+        return None
+    centroid = np.array([(cross * (x0 + x1)).sum(),
+                         (cross * (y0 + y1)).sum()]) / (6 * area)
+    # Move the origin to the centroid, to get the central moments.
+    x0, y0 = (points - centroid).T
+    x1, y1 = np.roll(points - centroid, -1, axis=0).T
+    cross = x0 * y1 - x1 * y0
+    mu20 = (cross * (x0 ** 2 + x0 * x1 + x1 ** 2)).sum() / 12
+    mu02 = (cross * (y0 ** 2 + y0 * y1 + y1 ** 2)).sum() / 12
+    mu11 = (cross * (x0 * y1 + 2 * x0 * y0 + 2 * x1 * y1
+                     + x1 * y0)).sum() / 24
+    mu30 = (cross * (x0 ** 3 + x0 ** 2 * x1 + x0 * x1 ** 2
+                     + x1 ** 3)).sum() / 20
+    mu03 = (cross * (y0 ** 3 + y0 ** 2 * y1 + y0 * y1 ** 2
+                     + y1 ** 3)).sum() / 20
+    mu21 = (cross * (x0 ** 2 * (3 * y0 + y1) + 2 * x0 * x1 * (y0 + y1)
+                     + x1 ** 2 * (y0 + 3 * y1))).sum() / 60
+    mu12 = (cross * (y0 ** 2 * (3 * x0 + x1) + 2 * y0 * y1 * (x0 + x1)
+                     + y1 ** 2 * (x0 + 3 * x1))).sum() / 60
+    covariance = np.array([[mu20, mu11], [mu11, mu02]]) / area
+    third = np.array([mu30, mu21, mu12, mu03]) / area
+    return abs(area), centroid, covariance, third
+
+
+def get_moments_triangle(points, max_error=0.15, min_skewness=0.25,
+                         min_area=0):
+    """Fit an isosceles triangle to a contour with its moments.
+
+    Contrary to the polygon approximation, every point of the contour
+    contributes to the result, so it is not affected by noisy corners
+    that would add vertices to the polygon.
+
+    For an isosceles triangle whose 2 equal sides are bigger than the
+    base, the symmetry axis is the principal axis with the biggest
+    variance. Along that axis, the variance is :math:`h^2/18`, being
+    *h* the height, and the mass is concentrated near the base, so the
+    third moment is positive in the direction of the front vertex. The
+    variance across the axis is :math:`b^2/24`, being *b* the base.
+
+    The fit is rejected for shapes whose area differs from the fitted
+    triangle area, or whose mass is too symmetric along the axis e.g.
+    rectangles or ellipses. The skewness of a triangle is 0.566.
+
+    :param points: Mx2 array with the vertices of the contour.
+    :param float max_error: maximum relative difference between the
+     contour area and the fitted triangle area.
+    :param float min_skewness: minimum normalized third moment along
+     the symmetry axis.
+    :param float min_area: contours with a smaller area are discarded.
+    :return: 3x2 array with the vertices of the triangle, with the front
+     one first, in the coordinates system of the input points. None if
+     the contour is not a triangle.
+    :rtype: np.array or None
+    """
+    if len(points) < 3:
+        return None
+    moments = get_polygon_moments(points)
+    if moments is None or moments[0] < min_area:
+        return None
+    area, centroid, covariance, third = moments
+    # Eigenvalues are returned in ascending order.
+    variances, axes = np.linalg.eigh(covariance)
+    if variances[0] <= 0:
+        return None
+    dx, dy = along = axes[:, 1]
+    skewness = (dx ** 3 * third[0] + 3 * dx ** 2 * dy * third[1]
+                + 3 * dx * dy ** 2 * third[2] + dy ** 3 * third[3])
+    skewness /= variances[1] ** 1.5
+    if abs(skewness) < min_skewness:
+        return None
+    if skewness < 0:
+        along = -along
+    # The base vertices are returned in counterclockwise order.
+    across = np.array([-along[1], along[0]])
+    height = np.sqrt(18 * variances[1])
+    base = np.sqrt(24 * variances[0])
+    if abs(area / (height * base / 2) - 1) > max_error:
+        return None
+    front = centroid + 2 * height / 3 * along
+    midpoint = centroid - height / 3 * along
+    return np.array([front, midpoint + base / 2 * across,
+                     midpoint - base / 2 * across])
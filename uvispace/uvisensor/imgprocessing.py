@@ -32,6 +32,7 @@ the typical used system.
 """
 # Standard libraries
 import logging
+import os
 import sys
 # Third party libraries
 import cv2
@@ -50,6 +51,13 @@ except ImportError:
              "set. Run the environment .sh script at the project root folder.")
 logger = logging.getLogger("sensor")
 
+# Structuring elements of the opencv binarization backend. The 5
+# iterations of a 5x5 dilation are equivalent to a single 21x21 one.
+_ERODE_KERNEL = np.ones((5, 5), np.uint8)
+_DILATE_KERNEL = np.ones((21, 21), np.uint8)
+# Distortion maps already calculated, indexed by (shape, kx, ky).
+_distortion_maps = {}
+
 
 class Image(object):
     """Class with image processing methods oriented to UGV detection.
@@ -68,7 +76,7 @@ class Image(object):
         self.triangles = []
         self.contours = contours
 
-    def binarize(self, thresholds):
+    def binarize(self, thresholds, windows=None, backend='skimage'):
         """Get a binarized image from a grey image given the thresholds.
         
         The input image can only have one dimension. This method is 
@@ -83,46 +91,77 @@ class Image(object):
         around the triangles, masks around them are used to get rid of 
         the noise in the rest of the image.
 
+        If the approximate position of the triangles is known e.g. from
+        the tracker windows, the processing can be restricted to windows
+        around them. Then, the cost does not depend on the image size
+        but on the number of windows. The pixels outside the windows
+        are set to 0.
+
         :param [int or float, int or float] thresholds : minimum and 
          maximum values between whom the image intensity values will be
          accepted as 1 (rescaled to 255). Values greater than the 
          maximum and smaller than the minimum will be truncated to 0.
+        :param windows: regions of the image that are processed, in the
+         format of the *geometry.Triangle.window* attribute. Each one
+         should contain a whole triangle, with some margin around it.
+         If None, the whole image is processed.
+        :type windows: list of 2x2 np.array
+        :param str backend: implementation of the filters, 'skimage' or
+         'opencv'. See *binarize_region* and *binarize_region_cv*.
         
         :return bin_image: Image of the same size as the input image 
          with only 255 or 0 values (Equivalent to 1 and 0), according 
          to the input threshold values.
         :rtype: binary numpy.array(shape=MxN)
         """
-        # Obtain the thresholds in base 2 and get the red component slice.
-        th_min = bin(thresholds[0])
-        th_max = bin(thresholds[1])
-        red_c = (th_min[-30:-20], th_max[-30:-20])
-        # Why is it necessary to divide by 4??
-        thr_min = int(red_c[0], 2) / 4
-        thr_max = int(red_c[1], 2) / 4
+        try:
+            binarize_function = BINARIZE_BACKENDS[backend]
+        except KeyError:
+            raise ValueError("Unknown binarization backend: {}".format(
+                    backend))
+        thr_min, thr_max = get_gray_thresholds(thresholds)
         logger.debug("Thresholding between {} and {}"
                      .format(thr_min, thr_max))
-        # The first binary approach is obtained evaluating 2 thresholds
-        raw_binarized = cv2.inRange(self.image, thr_min, thr_max)
-        # A simple erosion gets rid of the whole noise. Dilating the eroded
-        # image several times provides an acceptable ROI for the binary mask.
-        kernel = np.ones((5, 5), np.uint8)
-        erosion = cv2.erode(raw_binarized, kernel, iterations=1)
-        kernel = np.ones((5, 5), np.uint8)
-        dilate = cv2.dilate(erosion, kernel, iterations=5)
-        mask = dilate / 255
-        filtered = raw_binarized * mask
-        # Eliminate holes inside the detected shapes
-        labels = skimage.morphology.label(filtered)
-        label_count = np.bincount(labels.ravel())
-        # Detect the background pixels, assuming they are majority in the image.
-        background = np.argmax(label_count)
-        self._binarized = filtered
-        self._binarized[labels != background] = 255
+        if windows is None:
+            self._binarized = binarize_function(self.image, thr_min, thr_max)
+        else:
+            self._binarized = np.zeros(self.image.shape, dtype=np.uint8)
+            for region in get_window_regions(windows, self.image.shape):
+                self._binarized[region] = binarize_function(
+                        self.image[region], thr_min, thr_max)
         logger.debug("Image binarization finished")
         return self._binarized
 
-    def correct_distortion(self, kx=0.035, ky=0.035, only_contours=True):
+    def get_blobs(self, thresholds, min_area=4):
+        """Get the bounding boxes of the bright regions of the image.
+
+        It is a cheap detector intended for low resolution images, where
+        the triangles are too small for the *binarize* filters. Only the
+        intensity thresholds are applied, and the regions smaller than
+        *min_area* are discarded as noise.
+
+        :param [int, int] thresholds: register thresholds, in the same
+         format as in *binarize*.
+        :param int min_area: minimum number of pixels of a region.
+        :return: bounding box of each region, in the form
+         [[min_row, min_col], [max_row, max_col]], with the maximum
+         values excluded.
+        :rtype: list of 2x2 numpy.array
+        """
+        thr_min, thr_max = get_gray_thresholds(thresholds)
+        raw_binarized = cv2.inRange(self.image, thr_min, thr_max)
+        labels = skimage.measure.label(raw_binarized > 0, connectivity=2)
+        blobs = []
+        for region in skimage.measure.regionprops(labels):
+            if region.area < min_area:
+                continue
+            min_row, min_col, max_row, max_col = region.bbox
+            blobs.append(np.array([[min_row, min_col], [max_row, max_col]]))
+        logger.debug("{} blobs were found".format(len(blobs)))
+        return blobs
+
+    def correct_distortion(self, kx=0.035, ky=0.035, only_contours=True,
+                           cache_dir=None):
         """Correct barrel distortion on contours or on the whole image.
         
         The distortion is corrected using a 2nd polynomial equation for
@@ -137,28 +176,30 @@ class Image(object):
            Y_u &= (Y_d - C_y) * (1 + k_y * r^2) + C_y \\
 
            r  &= [(X_d - C_x)^2 + (Y_d - C_y)^2] / [(C_x^2 + C_y^2) * 2]
+
+        The equations are evaluated once for every pixel of an image
+        shape, and the results are kept in a *DistortionMaps* object
+        that is reused by the next calls (see *get_distortion_maps*).
+        The contours are corrected interpolating those results, and the
+        whole image with a single remap operation.
         
         :param float kx: X-Axe Distortion coefficient of the lens.
         :param float ky: Y-Axe Distortion coefficient of the lens.
         :param bool only_contours: Specify if the correction is to be 
-         applied to the whole image or only to the contours.
+         applied to the whole image or only to the contours. The
+         contours are corrected in both cases.
+        :param str cache_dir: folder where the distortion maps are
+         stored, so they are loaded instead of calculated by other
+         processes. If None, they are only kept in memory.
         """
-        # Calculate the image center as the middle point of the width and height
-        center = np.array(self.image.shape) / 2
-        # If contours is an empty list, algorithm is not outperformed.
-        if only_contours and self.contours:
-            for index, cnt in enumerate(self.contours):
-                distance = cnt - center
-                # Calculate the r distance. First numerator and then denominator
-                r = (distance ** 2).sum(axis=1).astype(np.float)
-                r /= (center ** 2).sum() * 2
-                coeffs = np.array([r*ky, r*kx]).transpose() + 1
-                corrected = distance * coeffs + center
-                self.contours[index] = corrected
-        elif not only_contours:
-            pass
-
-    def get_shapes(self, tolerance=8, get_contours=True):
+        maps = get_distortion_maps(self.image.shape[:2], kx, ky, cache_dir)
+        for index, cnt in enumerate(self.contours):
+            self.contours[index] = maps.undistort_points(cnt)
+        if not only_contours:
+            self.image = maps.undistort_image(self.image)
+
+    def get_shapes(self, tolerance=8, get_contours=True, windows=None,
+                   backend='skimage', fit='polygon'):
         """Get the shapes' vertices in the binarized image.
 
         Update the *self.triangles* attribute.
@@ -179,21 +220,62 @@ class Image(object):
          Algorithm* is applied to the binarized image. Specifically set 
          to False when the binarization algorithm is implemented in the 
          external device (i.e. the FPGA).
+        :param windows: if given, the contours are only searched inside
+         these regions of the binarized image, in the format of the
+         *geometry.Triangle.window* attribute. They should be the ones
+         passed to *binarize*.
+        :type windows: list of 2x2 np.array
+        :param str backend: implementation of the contours extraction
+         and the polygon approximation, 'skimage' or 'opencv'. The
+         opencv contours pass through the centers of the border pixels
+         of the shapes, while the skimage ones are half a pixel outside.
+        :param str fit: method used to get the triangles from the
+         contours. 'polygon' is the polygon approximation, and only the
+         3 vertices approximations are kept. 'enclosing' is the minimum
+         enclosing triangle (see *get_enclosing_triangle*). 'moments'
+         is the isosceles triangle with the same moments of the contour
+         (see *geometry.get_moments_triangle*). With the last 2, the
+         contours with an area smaller than the square of *tolerance*
+         are discarded.
         :return: vertices of the N shapes detected on the
          image. each element contains an Mx2 *np.rray* with the 
          coordinates of the M vertices of the shape.
         :rtype: list
         """
+        try:
+            find_contours, approximate_polygon = SHAPES_BACKENDS[backend]
+        except KeyError:
+            raise ValueError("Unknown shapes backend: {}".format(backend))
+        if fit not in ('polygon', 'enclosing', 'moments'):
+            raise ValueError("Unknown triangle fitting: {}".format(fit))
         logger.debug("Getting the shapes' vertices in the image")
         # Obtain a list with all the contours in the image, separating each
         # shape in a different element of the list
-        if get_contours:
-            self.contours = skimage.measure.find_contours(self._binarized, 200)
+        if get_contours and windows is None:
+            self.contours = find_contours(self._binarized)
+        elif get_contours:
+            self.contours = []
+            for region in get_window_regions(windows, self._binarized.shape):
+                # Move the contours from window to image coordinates.
+                offsets = [region[0].start, region[1].start]
+                contours = find_contours(self._binarized[region])
+                self.contours.extend(cnt + offsets for cnt in contours)
         self.triangles = []
+        max_coords = np.array(self.image.shape[:2]) - 1
         # Get the vertices of each shape in the image.
         for cnt in self.contours:
-            coords = skimage.measure.approximate_polygon(cnt, tolerance)
-            max_coords = np.array(self.image.shape) - 1
+            if fit == 'enclosing':
+                coords = get_enclosing_triangle(cnt,
+                                                min_area=tolerance ** 2)
+            elif fit == 'moments':
+                coords = geometry.get_moments_triangle(
+                        cnt, min_area=tolerance ** 2)
+            if fit != 'polygon':
+                if coords is not None:
+                    self.triangles.append(geometry.Triangle(
+                            np.clip(coords, [0, 0], max_coords)))
+                continue
+            coords = approximate_polygon(cnt, tolerance)
             # Sometimes, the initial vertex is repeatead at the end.
             # Thus, if len is 3 and vertex is NOT repeated, it is a triangle
             if len(coords) == 3 and (not np.array_equal(coords[0], coords[-1])):
@@ -207,3 +289,348 @@ class Image(object):
                 self.triangles.append(triangle)
             logger.debug("A {}-vertices shape was found".format(len(coords)))
         return self.triangles
+
+
+def find_contours_sk(binarized):
+    """Get the contours of a binarized image with skimage.
+
+    :param binarized: image with 0 and 255 values.
+    :return: each element is an Mx2 array with the [row, col]
+     coordinates of a contour.
+    :rtype: list
+    """
+    return skimage.measure.find_contours(binarized, 200)
+
+
+def find_contours_cv(binarized):
+    """Get the outer contours of a binarized image with OpenCV.
+
+    :param binarized: image with 0 and 255 values.
+    :return: each element is an Mx2 array with the [row, col]
+     coordinates of a contour.
+    :rtype: list
+    """
+    # The number of returned values changed in OpenCV 4.
+    contours = cv2.findContours(np.ascontiguousarray(binarized),
+                                cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
+    return [cnt[:, 0, ::-1].astype(np.float64) for cnt in contours]
+
+
+def approximate_polygon_cv(contour, tolerance):
+    """Approximate a closed contour with the OpenCV Douglas-Peucker.
+
+    :param contour: Mx2 array with the [row, col] contour points.
+    :param float tolerance: maximum distance from the contour points to
+     the polygon.
+    :return: Nx2 array with the polygon vertices. Contrary to the skimage
+     function, the first vertex is not repeated at the end.
+    :rtype: numpy.array
+    """
+    points = np.ascontiguousarray(contour[:, ::-1], dtype=np.float32)
+    polygon = cv2.approxPolyDP(points.reshape(-1, 1, 2), tolerance, True)
+    return polygon[:, 0, ::-1].astype(np.float64)
+
+
+def get_enclosing_triangle(contour, min_fill=0.75, min_area=0):
+    """Fit the minimum area triangle that encloses a contour.
+
+    Contrary to the polygon approximation, it always gives 3 vertices,
+    even for shapes with rounded or noisy corners. The shapes that fill
+    a small fraction of their triangle are not considered triangles.
+
+    :param contour: Mx2 array with the [row, col] contour points.
+    :param float min_fill: minimum ratio between the contour area and
+     the triangle area.
+    :param float min_area: minimum area of the contour, in pixels. The
+     smaller shapes are discarded as noise.
+    :return: 3x2 array with the [row, col] vertices, or None if the
+     shape is not a triangle.
+    :rtype: numpy.array or None
+    """
+    points = np.ascontiguousarray(contour[:, ::-1], dtype=np.float32)
+    hull = cv2.convexHull(points.reshape(-1, 1, 2))
+    if len(hull) < 3:
+        return None
+    try:
+        area, triangle = cv2.minEnclosingTriangle(hull)
+    except cv2.error:
+        # The fit fails for some degenerate hulls e.g. collinear points.
+        logger.debug("No enclosing triangle for a {}-points hull".format(
+                len(hull)))
+        return None
+    hull_area = cv2.contourArea(hull)
+    if hull_area < max(min_area, min_fill * area) or not area:
+        return None
+    return triangle[:, 0, ::-1].astype(np.float64)
+
+
+# Available implementations of the contours and polygons extraction.
+SHAPES_BACKENDS = {
+    'skimage': (find_contours_sk, skimage.measure.approximate_polygon),
+    'opencv': (find_contours_cv, approximate_polygon_cv),
+}
+
+
+def get_gray_thresholds(thresholds):
+    """Get the gray level limits from the thresholds registers values.
+
+    :param [int, int] thresholds: register thresholds, in the format
+     described in *Image.binarize*.
+    :return: minimum and maximum gray levels.
+    :rtype: (int, int)
+    """
+    # Obtain the thresholds in base 2 and get the red component slice.
+    th_min = bin(thresholds[0])
+    th_max = bin(thresholds[1])
+    red_c = (th_min[-30:-20], th_max[-30:-20])
+    # Why is it necessary to divide by 4??
+    thr_min = int(red_c[0], 2) / 4
+    thr_max = int(red_c[1], 2) / 4
+    return thr_min, thr_max
+
+
+def binarize_region(image, thr_min, thr_max):
+    """Apply the binarization filters of *Image.binarize* to an array.
+
+    :param np.array image: grey scale image, or a view of a region of it.
+    :param int thr_min: minimum accepted gray level.
+    :param int thr_max: maximum accepted gray level.
+    :return: binarized image, with the same shape as the input one.
+    :rtype: binary numpy.array(shape=MxN)
+    """
+    # The first binary approach is obtained evaluating 2 thresholds
+    raw_binarized = cv2.inRange(image, thr_min, thr_max)
+    # A simple erosion gets rid of the whole noise. Dilating the eroded
+    # image several times provides an acceptable ROI for the binary mask.
+    kernel = np.ones((5, 5), np.uint8)
+    erosion = cv2.erode(raw_binarized, kernel, iterations=1)
+    kernel = np.ones((5, 5), np.uint8)
+    dilate = cv2.dilate(erosion, kernel, iterations=5)
+    mask = dilate / 255
+    filtered = raw_binarized * mask
+    # Eliminate holes inside the detected shapes
+    labels = skimage.morphology.label(filtered)
+    label_count = np.bincount(labels.ravel())
+    # Detect the background pixels, assuming they are majority in the image.
+    background = np.argmax(label_count)
+    filtered[labels != background] = 255
+    return filtered
+
+
+def binarize_region_cv(image, thr_min, thr_max):
+    """Apply the binarization filters with OpenCV primitives.
+
+    It is a faster alternative to *binarize_region*, with the same
+    steps, whose intermediate images are all uint8 arrays:
+
+    * The masking dilations are done in a single pass, and the mask is
+      applied with a bitwise and.
+    * The zero valued regions are labelled with their areas, and all
+      of them but the biggest one (the background) are filled.
+
+    The masks are identical to the ones of *binarize_region*, except
+    for the holes: the skimage label function treats the zero pixels as
+    its own background, so that backend does not fill them.
+
+    :param np.array image: grey scale image, or a view of a region of it.
+    :param int thr_min: minimum accepted gray level.
+    :param int thr_max: maximum accepted gray level.
+    :return: binarized image, with the same shape as the input one.
+    :rtype: binary numpy.array(shape=MxN)
+    """
+    raw_binarized = cv2.inRange(image, thr_min, thr_max)
+    erosion = cv2.erode(raw_binarized, _ERODE_KERNEL)
+    mask = cv2.dilate(erosion, _DILATE_KERNEL)
+    filtered = cv2.bitwise_and(raw_binarized, mask)
+    # Label the zero valued regions, as they are the foreground of the
+    # negative image. Label 0 corresponds to the detected shapes.
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(
+            cv2.bitwise_not(filtered), connectivity=8)
+    if count > 2:
+        background = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+        filtered[labels != background] = 255
+    return filtered
+
+
+# Available implementations of the binarization filters.
+BINARIZE_BACKENDS = {'skimage': binarize_region,
+                     'opencv': binarize_region_cv}
+
+
+def get_window_regions(windows, shape):
+    """Get the image slices covered by a list of windows.
+
+    The windows are clipped to the image, and the overlapping ones are
+    merged, so that every pixel is processed only once and every shape
+    is found in a single region.
+
+    :param windows: regions of the image, in the format of the
+     *geometry.Triangle.window* attribute i.e. [[min_row, min_col],
+     [max_row, max_col]], with the maximum values included.
+    :type windows: list of 2x2 np.array
+    :param shape: number of rows and columns of the image.
+    :type shape: (int, int)
+    :return: row and column slices of each region.
+    :rtype: list of (slice, slice)
+    """
+    boxes = []
+    for window in windows:
+        window = np.asarray(window, dtype=np.float64)
+        min_row, min_col = np.maximum(np.floor(window[0]), 0).astype(int)
+        max_row, max_col = np.minimum(np.ceil(window[1]) + 1,
+                                      shape[:2]).astype(int)
+        if min_row < max_row and min_col < max_col:
+            boxes.append([min_row, min_col, max_row, max_col])
+    # Merge pairs of overlapping boxes until there are none left.
+    merged = True
+    while merged:
+        merged = False
+        for index, box in enumerate(boxes):
+            for other in boxes[index + 1:]:
+                if (box[0] < other[2] and other[0] < box[2]
+                        and box[1] < other[3] and other[1] < box[3]):
+                    box[:2] = np.minimum(box[:2], other[:2])
+                    box[2:] = np.maximum(box[2:], other[2:])
+                    boxes.remove(other)
+                    merged = True
+                    break
+            if merged:
+                break
+    return [(slice(box[0], box[2]), slice(box[1], box[3])) for box in boxes]
+
+
+class DistortionMaps(object):
+    """Precalculated barrel distortion correction of an image shape.
+
+    The distortion model is described in *Image.correct_distortion*.
+    Two sets of tables are calculated from it:
+
+    * Forward tables, with the corrected [row, col] coordinates of
+      every distorted pixel. They are interpolated for correcting
+      points, instead of evaluating the polynomial.
+    * Inverse maps, with the distorted coordinates of every corrected
+      pixel, as needed by *cv2.remap*. The model has no closed inverse,
+      so it is solved with fixed point iterations.
+
+    :param shape: number of rows and columns of the images.
+    :type shape: (int, int)
+    :param float kx: X-Axe Distortion coefficient of the lens.
+    :param float ky: Y-Axe Distortion coefficient of the lens.
+    :param arrays: previously calculated forward tables and inverse
+     maps, as returned by the *arrays* attribute. If None, they are
+     calculated.
+    :type arrays: dict
+    """
+
+    def __init__(self, shape, kx=0.035, ky=0.035, arrays=None):
+        self.shape = tuple(shape)
+        self.kx = kx
+        self.ky = ky
+        self.center = np.array(self.shape) / 2
+        if arrays is None:
+            arrays = self._calculate()
+        self.arrays = arrays
+        # Fixed point version of the inverse maps, faster for remapping.
+        self._map1, self._map2 = cv2.convertMaps(arrays['map_x'],
+                                                 arrays['map_y'],
+                                                 cv2.CV_16SC2)
+
+    def _distort_coeffs(self, distance):
+        """Return the correction factor of each [row, col] distance."""
+        r = (distance ** 2).sum(axis=-1)
+        r /= (self.center ** 2).sum() * 2
+        return np.stack([r * self.ky, r * self.kx], axis=-1) + 1
+
+    def evaluate(self, points):
+        """Correct [row, col] points evaluating the distortion model.
+
+        Contrary to *undistort_points*, the polynomial is evaluated for
+        every point, so the result is exact but slower.
+
+        :param points: array of points, with the coordinates in the last
+         dimension.
+        :return: array of the same shape with the corrected coordinates.
+        :rtype: numpy.array
+        """
+        distance = np.asarray(points, dtype=np.float64) - self.center
+        return distance * self._distort_coeffs(distance) + self.center
+
+    def _calculate(self, iterations=20):
+        """Evaluate the distortion model for every pixel of the shape."""
+        rows, cols = np.indices(self.shape, dtype=np.float64)
+        distance = np.stack([rows, cols], axis=-1) - self.center
+        forward = self.evaluate(distance + self.center)
+        # Distorted position whose correction is each pixel.
+        inverse = distance.copy()
+        for _ in range(iterations):
+            inverse = distance / self._distort_coeffs(inverse)
+        inverse += self.center
+        return {'forward_rows': forward[..., 0].astype(np.float32),
+                'forward_cols': forward[..., 1].astype(np.float32),
+                'map_x': inverse[..., 1].astype(np.float32),
+                'map_y': inverse[..., 0].astype(np.float32)}
+
+    def undistort_image(self, image):
+        """Return the corrected version of an image of the maps' shape."""
+        return cv2.remap(image, self._map1, self._map2, cv2.INTER_LINEAR)
+
+    def undistort_points(self, points):
+        """Correct an array of [row, col] points of the distorted image.
+
+        The corrected coordinates are bilinearly interpolated from the
+        forward tables. The points outside the image use the values of
+        the nearest border pixels.
+
+        :param points: Mx2 array with the points coordinates.
+        :return: Mx2 array with the corrected coordinates.
+        :rtype: numpy.array
+        """
+        points = np.asarray(points, dtype=np.float64)
+        limits = np.array(self.shape) - 1
+        points = np.clip(points, 0, limits)
+        base = np.minimum(np.floor(points).astype(int), limits - 1)
+        row_weight, col_weight = (points - base).T
+        row, col = base.T
+        corrected = np.empty(points.shape)
+        for axis, table in enumerate((self.arrays['forward_rows'],
+                                      self.arrays['forward_cols'])):
+            top = (table[row, col] * (1 - col_weight)
+                   + table[row, col + 1] * col_weight)
+            bottom = (table[row + 1, col] * (1 - col_weight)
+                      + table[row + 1, col + 1] * col_weight)
+            corrected[:, axis] = top * (1 - row_weight) + bottom * row_weight
+        return corrected
+
+
+def get_distortion_maps(shape, kx=0.035, ky=0.035, cache_dir=None):
+    """Return the distortion maps of a shape, calculating them once.
+
+    The maps are kept in memory for the next calls. If a cache folder
+    is given, they are also loaded from or saved to a file on it.
+
+    :param shape: number of rows and columns of the images.
+    :type shape: (int, int)
+    :param float kx: X-Axe Distortion coefficient of the lens.
+    :param float ky: Y-Axe Distortion coefficient of the lens.
+    :param str cache_dir: folder of the maps files, or None.
+    :rtype: DistortionMaps
+    """
+    key = (tuple(shape), kx, ky)
+    maps = _distortion_maps.get(key)
+    if maps is not None:
+        return maps
+    filename = None
+    arrays = None
+    if cache_dir is not None:
+        filename = os.path.join(cache_dir, 'distortion_{}x{}_{!r}_{!r}.npz'
+                                ''.format(shape[0], shape[1], kx, ky))
+        if os.path.exists(filename):
+            cached = np.load(filename)
+            arrays = dict((name, cached[name]) for name in cached.files)
+            logger.debug("Loaded distortion maps from {}".format(filename))
+    maps = DistortionMaps(shape, kx, ky, arrays)
+    if filename is not None and arrays is None:
+        np.savez(filename, **maps.arrays)
+        logger.debug("Saved distortion maps on {}".format(filename))
+    _distortion_maps[key] = maps
+    return maps
@@ -6,6 +6,16 @@ Options
 
 - -s / --save2file: The data collected by the cameras will be stored in
 a spreadsheet and in a text file.
+- -c / --config <folder>: Folder with the configuration files of the
+cameras. By default, *./resources/config*. Use
+*./resources/config/simulator* for running against the nodes simulated
+with *resources/sim_fpga.py*.
+- -w / --warmstart <file>: JSON file where the tracker windows and the
+last poses are saved at the end of the execution, and loaded at the
+next start. By default, *warmstart.json* in the configuration folder.
+- -g / --grid <mm>: Resolution of the arena coverage grid used to
+evaluate if the UGVs are in the borders region of the cameras. By
+default, 10 mm. With 0, the exact geometric tests are used instead.
 
 ------------------------------------------------------------------------
 
@@ -15,8 +25,12 @@ waiting for external resources before continuing execution e.g. waiting
 for the TCP/IP client to deliver FPGA registers information. Namely, 6
 different threads are managed and indexed in a list called *threads*:
 
-* 4 threads that run the 4 FGPAs initialization routines. Afterwards,
-  endless loops continually request the UGVs' positions to each FPGA.
+* 4 threads that run the 4 FGPAs main routines. The cameras are
+  configured concurrently before the threads are created. Then, the
+  trackers are set with the windows saved by the previous execution, and
+  a full frame search is only done if they do not find any UGV.
+  Afterwards, endless loops continually request the UGVs' positions to
+  each FPGA.
 * Another thread that interacts with the user through keyboard. It reads
   input commands and performs corresponding actions.
 * A final thread is in charge of merging the information obtained at
@@ -31,8 +45,10 @@ have to be reset.
 import copy
 import getopt
 import glob
+import json
 import logging
 import os
+import socket
 import sys
 import threading
 import time
@@ -42,8 +58,13 @@ import numpy as np
 import zmq
 # Local libraries
 from resources import dataprocessing
+import arenagrid
+import geometry
+import imgprocessing
 import kalmanfilter
+import trackerwindow
 import videosensor
+import worldmap
 
 try:
     # Logging setup.
@@ -97,16 +118,33 @@ class CameraThread(threading.Thread):
 
     :param conf_file: String containing the relative path to the
      configuration file of the camera.
+
+    :param camera: *videosensor.VideoSensor* object already configured.
+     If None, the camera is started with the *conf_file*.
+
+    :param windows: Dictionary with the tracker windows of a previous
+     execution, indexed by tracker id. They are tried before searching
+     the UGVs in the whole frame. At the end of the execution, it
+     contains the last windows of the trackers.
     """
 
     def __init__(self, triangles, ntriangles, begin_event, end_event,
-                 condition, inborders, reset_flag, name=None, conf_file=''):
+                 condition, inborders, reset_flag, name=None, conf_file='',
+                 camera=None, windows=None):
         """Class constructor method."""
         threading.Thread.__init__(self, name=name)
         self.image = []
         self.cycletime = 0.02
         # Initialize TCP/IP connection and start FPGA operation.
-        self.camera = videosensor.camera_startup(conf_file)
+        if camera is None:
+            camera = videosensor.camera_startup(conf_file)
+        self.camera = camera
+        self.windows = windows or {}
+        # Window of the tracker, that follows the estimated UGV motion.
+        self.window = trackerwindow.AdaptiveWindow(
+                (camera._params['height'], camera._params['width']))
+        # Lookup table from FPGA pixels to global coordinates.
+        self.world_map = worldmap.get_world_map(camera, K=4)
         # Synchronization variables
         self.begin_event = begin_event
         self.end_event = end_event
@@ -126,8 +164,20 @@ class CameraThread(threading.Thread):
 
     def run(self):
         """Main routine of the CameraThread."""
-        # Look for shapes in whole image and configure trackers.
-        self.image, _ = videosensor.set_tracker(self.camera)
+        # Try the windows of the previous execution before looking for
+        # shapes in the whole image.
+        found = []
+        if self.windows:
+            found = videosensor.restore_trackers(self.camera, self.windows)
+        if found:
+            logger.info("{} warm started with trackers {}".format(self.name,
+                                                                  found))
+            # Void image of the full frame shape, for processing contours.
+            self.image = imgprocessing.Image(np.zeros(
+                    (self.camera._params['height'],
+                     self.camera._params['width']), dtype=np.uint8))
+        else:
+            self.image, _ = videosensor.set_tracker(self.camera)
         self.begin_event.set()
         while not self.end_event.isSet():
             # Start the cycle timer
@@ -143,7 +193,7 @@ class CameraThread(threading.Thread):
             # The code ONLY tracks the UGV with id=1.
             #
             try:
-                locations = self.camera.get_register('ACTUAL_LOCATION')['1']
+                locations = self.camera.get_locations()['1']
             except KeyError:
                 #
                 # Set a new tracker if the inborders flag is raised and
@@ -151,29 +201,42 @@ class CameraThread(threading.Thread):
                 #
                 if self._inborders['1']:
                     # Apply inverse homography and transform global to local.
-                    self._ntriangles['1'].inverse_homography(self.camera._H)
+                    self._ntriangles['1'].inverse_homography(
+                            self.camera._H, self.camera._H_inv)
                     self._ntriangles['1'].global2local(self.camera.offsets, K=4)
                     # get window and set tracker
                     self.image.triangles = [self._ntriangles['1']]
                     videosensor.set_tracker(self.camera, self.image)
+                    self.window.reset()
+                    self.window.window = self._ntriangles['1'].window
                 continue
             # Scale the contours obtained according to the FPGA to image ratio.
-            contours = np.array(locations) / self.camera._scale
+            contours = locations / self.camera._scale
             # Convert from Cartesian to Image coordinates
             tmp = np.copy(contours[:,0])
             contours[:,0] = contours[:,1]
             contours[:,1] = tmp
+            self.window.update(contours, cycle_start_time)
             self.image.contours = [contours]
-            # Correct barrel distortion.
-            self.image.correct_distortion()
-            # Obtain 3 vertices from the contours
-            shapes = self.image.get_shapes(get_contours=False)
+            # The lookup table from FPGA to global cartesian coordinates
+            # includes the barrel distortion, the 4:1 scale ratio and the
+            # homography.
+            vertices = None
+            if self.camera._params['shapes_fit'] == 'moments':
+                # Fit the triangle to the tracker points in global
+                # coordinates, without polygon approximation.
+                vertices = geometry.get_moments_triangle(
+                        self.world_map.lookup(locations))
+            else:
+                # Obtain 3 vertices from the contours
+                shapes = self.image.get_shapes(get_contours=False)
+                if len(shapes):
+                    vertices = self.world_map.lookup(
+                            shapes[0].vertices[:, ::-1] * self.camera._scale)
             # If triangles are detected, calculate coordinates.
-            if len(shapes):
-                self._triangles['1'] = shapes[0]
-                # Obtain global cartesian coordinates with a scale ratio 4:1.
-                self._triangles['1'].local2global(self.camera.offsets, K=4)
-                self._triangles['1'].homography(self.camera._H)
+            if vertices is not None:
+                self._triangles['1'] = geometry.Triangle(
+                        vertices, isglobal=True, cartesian=True)
             # If any triangle is detected, indicate it writing a None variable.
             else:
                 self._triangles['1'] = None
@@ -183,6 +246,12 @@ class CameraThread(threading.Thread):
                 logger.info('{} TRACKER FREED'.format(self.name))
                 self._reset_flag = {'1': False}
                 self._triangles.pop('1', None)
+                self.window.reset()
+                self.window.window = None
+            elif self._triangles['1'] is not None:
+                # The window is only moved while the UGV is located, as
+                # writing it to a freed tracker would arm it again.
+                self.move_window(cycle_start_time + self.cycletime)
             # Sync operations. Write to global variables.
             self.condition.acquire()
             if self._triangles.has_key('1'):
@@ -194,9 +263,27 @@ class CameraThread(threading.Thread):
             while (time.time() - cycle_start_time) < self.cycletime:
                 pass
         logger.debug('shutting down {}'.format(self.name))
+        # Keep the last windows of the trackers for the next execution.
+        try:
+            self.windows = dict((key, window.tolist()) for key, window
+                                in self.camera.get_windows().items())
+        except socket.error:
+            logger.warn("{} tracker windows not read".format(self.name))
         self.camera.disconnect_client()
 
 
+    def move_window(self, timestamp):
+        """Reprogram the tracker window if the UGV motion requires it.
+
+        :param float timestamp: time when the new window will be in use.
+        """
+        window = self.window.get_window(timestamp)
+        if window is None or not self.window.needs_update(window):
+            return
+        self.camera.set_tracker_window(1, window)
+        self.window.window = window
+
+
 class DataFusionThread(threading.Thread):
     """Child class of threading.Thread for merging and processing data.
 
@@ -239,17 +326,33 @@ class DataFusionThread(threading.Thread):
      flags set to True when a ROI tracker in specified FPGA to be reset.
 
     :param name: String containing the name of the current thread.
+
+    :param pose: Dictionary with the last pose of a previous execution,
+     with 'x', 'y' and 'theta' keys. It is the initial state of the
+     Kalman filter. At the end of the execution, it contains the last
+     published pose.
+
+    :param grid_resolution: Side, in millimetres, of the cells of the
+     *arenagrid.CoverageGrid* used to evaluate the borders regions. If 0,
+     the exact *geometry.QuadrantPolygons* tests are used instead.
     """
 
     def __init__(self, triangles, ntriangles, conditions, inborders,
                  quadrant_limits, begin_events, end_event, reset_flags,
-                 save2file=False, name='Fusion Thread'):
+                 save2file=False, name='Fusion Thread', pose=None,
+                 grid_resolution=10):
         """
         Class constructor method
         """
         threading.Thread.__init__(self, name=name)
         self.cycletime = 0.02
         self.quadrant_limits = quadrant_limits
+        # Precomputed borders regions of the cameras working spaces.
+        if grid_resolution:
+            self.borders = arenagrid.CoverageGrid(quadrant_limits,
+                                                  grid_resolution)
+        else:
+            self.borders = geometry.QuadrantPolygons(quadrant_limits)
         self.step = 0
         # Publishing socket instantiation.
         pose_publisher = zmq.Context.instance().socket(zmq.PUB)
@@ -291,6 +394,11 @@ class DataFusionThread(threading.Thread):
         self.kalman = kalmanfilter.Kalman(var_dim=3, input_dim=2)
         # Set the process noise, calculated empirically. units = (mm, mm, rad)^2
         self.kalman.set_prediction_noise((3.5**2, 3.5**2, 0.015**2))
+        # Start from the last known pose. Its uncertainty is kept high.
+        self.pose = pose
+        if pose:
+            self.kalman.states = np.array(
+                    [pose['x'], pose['y'], pose['theta']]).reshape(3,1)
         # Boolean to save data in spreadsheet and file text.
         self.save2file = save2file
 
@@ -322,9 +430,11 @@ class DataFusionThread(threading.Thread):
                     # Check that the element is not of None type.
                     if self._triangles[index]['1']:
                         triangle = self._triangles[index]['1']
-                        # Evaluate if triangle is in borders region.
-                        self._inborders[index]['1'] = triangle.in_borders(
-                                self.quadrant_limits[index])
+                        # Evaluate if triangle is in the borders region of
+                        # every camera at once.
+                        inborders = self.borders.in_borders(
+                                triangle.vertices)[:, 0]
+                        self._inborders[index]['1'] = bool(inborders[index])
                     # If dictionary element is None, skip to next camera.
                     else:
                         continue
@@ -341,8 +451,7 @@ class DataFusionThread(threading.Thread):
                     # Do not run the function for the current quadrant.
                     if index2 == index:
                         continue
-                    self._inborders[index2]['1'] = triangle.in_borders(
-                            self.quadrant_limits[index2])
+                    self._inborders[index2]['1'] = bool(inborders[index2])
                     # Update triangles[index2] if there is not any tracker
                     # initialized and UGV is within borders of the Camera.
                     if (self._inborders[index2]['1']
@@ -425,6 +534,7 @@ class DataFusionThread(threading.Thread):
             pose_msg = {'x': pose_list[0], 'y': pose_list[1],
                         'theta': pose_list[2], 'step': self.step}
             self.sockets['pose_publisher'].send_json(pose_msg)
+            self.pose = pose_msg
             publish_time = time.time()
             logger.debug("Triangles at: {}".format(self._triangles))
             # Allow to poll only during the remaining cycle time.
@@ -494,6 +604,95 @@ class UserThread(threading.Thread):
                 pass
 
 
+def start_cameras(conf_files, timeout=10.0):
+    """Bring up all the cameras concurrently.
+
+    *videosensor.camera_startup* is called for each configuration file
+    on a separate thread, so the connection and configuration round
+    trips of the cameras overlap.
+
+    :param list conf_files: paths to the configuration files.
+    :param float timeout: maximum time to wait for each camera, in
+     seconds.
+    :return: the configured cameras, in the same order. None for the
+     cameras that failed or were not ready in time.
+    :rtype: list
+    """
+    cameras = [None] * len(conf_files)
+    lock = threading.Lock()
+    expired = []
+
+    def startup(index, filename):
+        try:
+            camera = videosensor.camera_startup(filename)
+        except Exception as error:
+            # Any failure only discards its camera, not the whole startup.
+            logger.exception("Camera {} startup failed: {}".format(filename,
+                                                                   error))
+            return
+        with lock:
+            late = bool(expired)
+            if not late:
+                cameras[index] = camera
+        # Release the cameras that were ready after the timeout.
+        if late:
+            camera.disconnect_client()
+    threads = [threading.Thread(target=startup, args=(index, filename),
+                                name='Startup{}'.format(index))
+               for index, filename in enumerate(conf_files)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    deadline = time.time() + timeout
+    for thread in threads:
+        thread.join(max(0, deadline - time.time()))
+    with lock:
+        expired.append(True)
+        started = list(cameras)
+    for filename, camera in zip(conf_files, started):
+        if camera is None:
+            logger.error("Camera {} was not started".format(filename))
+    return started
+
+
+def load_warm_start(filename):
+    """Read the tracker windows and poses saved by a previous execution.
+
+    :param str filename: path to the JSON file.
+    :return: dictionary with the 'windows' of each camera, indexed by
+     the name of its configuration file, and the last 'poses' of the
+     UGVs. Void dictionaries if the file does not exist or is invalid.
+    :rtype: dict
+    """
+    state = {'windows': {}, 'poses': {}}
+    try:
+        with open(filename) as warm_file:
+            state.update(json.load(warm_file))
+    except IOError:
+        logger.info("No warm start file found at {}".format(filename))
+    except ValueError:
+        logger.warn("Invalid warm start file {}".format(filename))
+    return state
+
+
+def save_warm_start(filename, windows, poses):
+    """Write the tracker windows and poses for the next execution.
+
+    :param str filename: path to the JSON file.
+    :param dict windows: tracker windows of each camera, indexed by the
+     name of its configuration file.
+    :param dict poses: last poses of the UGVs, indexed by their id.
+    """
+    try:
+        with open(filename, 'w') as warm_file:
+            json.dump({'windows': windows, 'poses': poses}, warm_file,
+                      indent=2, sort_keys=True)
+    except IOError as error:
+        logger.warn("Warm start file not saved: {}".format(error))
+        return
+    logger.info("Saved warm start state in {}".format(filename))
+
+
 def main():
     """Main routine for multiplecamera.py
 
@@ -502,10 +701,18 @@ def main():
     """
     # Main routine
     save2file = False
-    help_msg = ("Usage: multiplecamera.py [-s | --save2file],")
+    config_folder = "./resources/config"
+    warm_filename = None
+    grid_resolution = 10
+    help_msg = ("Usage: multiplecamera.py [-s | --save2file], "
+                "[-c <folder> | --config=<folder>], "
+                "[-w <file> | --warmstart=<file>], "
+                "[-g <mm> | --grid=<mm>]")
     # This try/except clause forces to give the robot_id argument.
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hs", ["save2file"])
+        opts, args = getopt.getopt(sys.argv[1:], "hsc:w:g:",
+                                   ["save2file", "config=", "warmstart=",
+                                    "grid="])
     except getopt.GetoptError:
         print(help_msg)
     for opt, arg in opts:
@@ -514,10 +721,25 @@ def main():
             sys.exit()
         if opt in ("-s", "--save2file"):
             save2file = True
+        if opt in ("-c", "--config"):
+            config_folder = arg
+        if opt in ("-w", "--warmstart"):
+            warm_filename = arg
+        if opt in ("-g", "--grid"):
+            grid_resolution = float(arg)
+    if warm_filename is None:
+        warm_filename = os.path.join(config_folder, "warmstart.json")
     logger.info("BEGINNING MAIN EXECUTION")
     # Get the relative path to all the config files stored in /config folder.
-    conf_files = glob.glob("./resources/config/*.cfg")
+    conf_files = glob.glob(os.path.join(config_folder, "*.cfg"))
     conf_files.sort()
+    warm_state = load_warm_start(warm_filename)
+    # Configure all the cameras at the same time, and skip the failed ones.
+    cameras = start_cameras(conf_files)
+    started = [(filename, camera) for filename, camera
+               in zip(conf_files, cameras) if camera is not None]
+    if not started:
+        sys.exit("No camera could be started")
     threads = []
     # A Condition object for each camera thread execution.
     conditions = []
@@ -532,23 +754,29 @@ def main():
     # A begin event for each camera will be created
     begin_events = []
     end_event = threading.Event()
-    # New thread instantiation for each configuration file.
-    for index, filename in enumerate(conf_files):
+    # New thread instantiation for each started camera.
+    for index, (filename, camera) in enumerate(started):
         conditions.append(threading.Condition())
         begin_events.append(threading.Event())
+        windows = warm_state['windows'].get(os.path.basename(filename))
         threads.append(CameraThread(triangles[index], ntriangles[index],
                                     begin_events[index], end_event,
                                     conditions[index], inborders[index],
                                     reset_flags[index],
-                                    'Camera{}'.format(index), filename))
+                                    'Camera{}'.format(index), filename,
+                                    camera, windows))
+    camera_threads = list(threads)
     # List containing the points defining the space limits of each camera.
     quadrant_limits = []
     for camera_thread in threads:
         quadrant_limits.append(camera_thread.camera._limits)
     # Thread for merging the data obtained at every CameraThread.
-    threads.append(DataFusionThread(triangles, ntriangles, conditions,
-                                    inborders, quadrant_limits, begin_events,
-                                    end_event, reset_flags, save2file))
+    fusion_thread = DataFusionThread(triangles, ntriangles, conditions,
+                                     inborders, quadrant_limits, begin_events,
+                                     end_event, reset_flags, save2file,
+                                     pose=warm_state['poses'].get('1'),
+                                     grid_resolution=grid_resolution)
+    threads.append(fusion_thread)
     # Thread for getting user input.
     threads.append(UserThread(begin_events, end_event))
     # start threads
@@ -557,6 +785,13 @@ def main():
     # wait for threads to end
     for thread in threads:
         thread.join()
+    # Save the trackers windows and poses for the next execution.
+    windows = dict((os.path.basename(filename), thread.windows)
+                   for (filename, _), thread in zip(started, camera_threads))
+    poses = {}
+    if fusion_thread.pose:
+        poses['1'] = fusion_thread.pose
+    save_warm_start(warm_filename, windows, poses)
 
 
 if __name__ == '__main__':
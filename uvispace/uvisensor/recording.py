@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""This module contains classes for recording and reading camera sessions.
+
+A session file stores, in order of arrival, the frames captured by a
+*VideoSensor* and the replies of the register reads, each one with its
+timestamp. The configuration file of the camera is stored at the
+beginning, so the session can be replayed without any other file.
+
+The file starts with the *MAGIC* string, followed by records with this
+layout:
+
+* Header, packed with the *RECORD_HEADER* struct format: kind of
+  record (4 characters), timestamp (double), length of the metadata and
+  length of the payload.
+* Metadata: JSON object describing the payload e.g. the register name
+  or the frame shape.
+* Payload: raw bytes of the frame, or the register reply.
+
+The records are only appended, so an interrupted recording is still
+readable up to its last complete record. The payloads are not loaded
+into memory when reading: the frames are returned as views over a
+memory map of the file.
+"""
+# Standard libraries
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+# Third party libraries
+import numpy as np
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+MAGIC = "UVIREC1\n"
+# Kind, timestamp, metadata length and payload length.
+RECORD_HEADER = struct.Struct('<4sdII')
+# Kinds of records.
+CONFIG = 'CONF'
+FRAME = 'FRAM'
+REGISTER = 'REGS'
+
+
+class SessionRecorder(object):
+    """Writer of session files.
+
+    :param str filename: path of the session file. If it exists, the new
+     records are appended to it.
+    :param str conf_text: content of the camera configuration file. It
+     is stored in a first record, if given.
+    """
+
+    def __init__(self, filename, conf_text=None):
+        self.filename = filename
+        new_file = not os.path.exists(filename) or not os.path.getsize(
+                filename)
+        self._file = open(filename, 'ab')
+        # The frames of a FrameGrabber are added from its own thread.
+        self._lock = threading.Lock()
+        if new_file:
+            self._file.write(MAGIC)
+        if conf_text is not None:
+            self.add_record(CONFIG, {}, conf_text)
+        logger.info("Recording session on {}".format(filename))
+
+    def add_record(self, kind, metadata, payload, timestamp=None):
+        """Append a record to the file.
+
+        :param str kind: one of CONFIG, FRAME or REGISTER.
+        :param dict metadata: description of the payload.
+        :param payload: content of the record.
+        :type payload: str or buffer
+        :param float timestamp: time of the record. Current time if None.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        meta = json.dumps(metadata)
+        payload = buffer(payload)
+        with self._lock:
+            self._file.write(RECORD_HEADER.pack(kind, timestamp, len(meta),
+                                                len(payload)))
+            self._file.write(meta)
+            self._file.write(payload)
+            # Keep the file readable if the process is interrupted.
+            self._file.flush()
+
+    def add_frame(self, command, image):
+        """Append a captured frame.
+
+        :param str command: image request command i.e. 'GET_GRAY_IMAGE'
+         or 'GET_COLOR_IMAGE'.
+        :param numpy.array image: captured image, of uint8 type.
+        """
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        self.add_record(FRAME, {'command': command,
+                                'shape': list(image.shape)}, image)
+
+    def add_register(self, register, reply):
+        """Append the reply of a register read.
+
+        :param str register: name of the register.
+        :param str reply: reply of the FPGA, as received.
+        """
+        self.add_record(REGISTER, {'register': register}, reply)
+
+    def close(self):
+        """Close the session file."""
+        if not self._file.closed:
+            self._file.close()
+            logger.info("Closed session file {}".format(self.filename))
+
+
+class SessionReader(object):
+    """Reader of session files.
+
+    Only the headers and the metadata are read when the file is opened.
+    The payloads are accessed through a memory map of the file.
+
+    :param str filename: path of the session file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        # Each record is a (kind, timestamp, metadata, offset, length) tuple,
+        # where offset and length locate the payload inside the file.
+        self.records = []
+        with open(filename, 'rb') as session_file:
+            if session_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError("{} is not a session file".format(filename))
+            size = os.fstat(session_file.fileno()).st_size
+            offset = len(MAGIC)
+            while offset + RECORD_HEADER.size <= size:
+                kind, timestamp, meta_length, length = RECORD_HEADER.unpack(
+                        session_file.read(RECORD_HEADER.size))
+                meta_offset = offset + RECORD_HEADER.size
+                offset = meta_offset + meta_length + length
+                if offset > size:
+                    logger.warn("Discarded incomplete record at the end "
+                                "of {}".format(filename))
+                    break
+                metadata = json.loads(session_file.read(meta_length))
+                self.records.append((kind, timestamp, metadata,
+                                     meta_offset + meta_length, length))
+                session_file.seek(offset)
+        self._map = None
+        if size:
+            self._map = np.memmap(filename, dtype=np.uint8, mode='r')
+
+    def __len__(self):
+        return len(self.records)
+
+    def get_payload(self, record):
+        """Return the payload of a record as a string."""
+        _, _, _, offset, length = record
+        return self._map[offset:offset + length].tostring()
+
+    def get_frame(self, record):
+        """Return the image of a frame record.
+
+        :return: image array, that is a read-only view over the file.
+        :rtype: numpy.array
+        """
+        _, _, metadata, offset, length = record
+        return self._map[offset:offset + length].reshape(metadata['shape'])
+
+    def get_config(self):
+        """Return the text of the first configuration record, or None."""
+        for record in self.records:
+            if record[0] == CONFIG:
+                return self.get_payload(record)
+        return None
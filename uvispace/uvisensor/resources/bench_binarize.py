@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Micro-benchmark of the binarization backends of imgprocessing.Image.
+
+Frames of a simulated arena are binarized with the 2 available backends,
+and the masks are compared:
+
+* *skimage*: the original filters, i.e. five 5x5 dilations, a float
+  mask and the *skimage.morphology.label* hole filling.
+* *opencv*: *imgprocessing.binarize_region_cv*, which uses a single
+  21x21 dilation, bitwise operations and the OpenCV connected
+  components, with uint8 images end to end.
+
+Usage: bench_binarize.py [-n <frames>] [-r <robots>] [-w <width>]
+                         [-h <height>]
+"""
+# Standard libraries
+import getopt
+import sys
+import timeit
+# Third party libraries
+import numpy as np
+# Local libraries
+try:
+    from uvisensor import imgprocessing
+    from uvisensor.resources import sim_fpga
+except ImportError:
+    # Exit program if the uvisensor package can't be found.
+    sys.exit("Can't find uvisensor package. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+
+# Red thresholds of the simulator configuration files.
+THRESHOLDS = (551040525, 784051947)
+
+
+def main():
+    help_msg = ("Usage: bench_binarize.py [-n <frames>] [-r <robots>] "
+                "[-w <width>] [-h <height>]")
+    frames, robots, width, height = 20, 3, 648, 486
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "n:r:w:h:", ["help"])
+    except getopt.GetoptError:
+        print help_msg
+        sys.exit()
+    for opt, arg in opts:
+        if opt == '--help':
+            print help_msg
+            sys.exit()
+        elif opt == '-n':
+            frames = int(arg)
+        elif opt == '-r':
+            robots = int(arg)
+        elif opt == '-w':
+            width = int(arg)
+        elif opt == '-h':
+            height = int(arg)
+    arena = sim_fpga.SimulatedArena((1296, 972), robots=robots, seed=0)
+    corpus = [arena.render((height, width), 158, timestamp, noise=140)
+              for timestamp in np.linspace(0, 10, frames)]
+    # Compare the masks of both backends.
+    differences = 0
+    for frame in corpus:
+        masks = [imgprocessing.Image(frame).binarize(THRESHOLDS,
+                                                     backend=backend)
+                 for backend in ('skimage', 'opencv')]
+        differences += np.count_nonzero(masks[0] != masks[1])
+    print "{} frames of {}x{}, {} robot(s). {} different pixels".format(
+            frames, width, height, robots, differences)
+    for backend in ('skimage', 'opencv'):
+        def binarize_corpus():
+            for frame in corpus:
+                imgprocessing.Image(frame).binarize(THRESHOLDS,
+                                                    backend=backend)
+        elapsed = min(timeit.repeat(binarize_corpus, number=1, repeat=3))
+        print "{:>8}: {:8.2f} ms/frame".format(backend,
+                                               1e3 * elapsed / frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Benchmark of the frame reception paths of the uvisensor Client.
+
+A local TCP server emulating the image download of the FPGA is started
+in a background thread. Then, the same number of frames is downloaded
+with the 2 available reception paths:
+
+* *legacy*: the original reception loop, which joins every received
+  package in a new string, followed by a `numpy.fromstring` copy.
+* *zero-copy*: `Client.read_into`, which fills a preallocated buffer
+  with `recv_into`, followed by a `numpy.frombuffer` view.
+
+For each path, the frames per second and the allocation churn per frame
+are printed. As Python 2 has no allocation tracer, the churn is measured
+with the number of *recv* calls (each one creating a new string in the
+legacy path) and with the minor page faults of the process, which grow
+with every fresh block of memory that is touched.
+
+Usage: bench_capture.py [-n <frames>] [-w <width>] [-h <height>]
+"""
+# Standard libraries
+import getopt
+import resource
+import socket
+import sys
+import threading
+import time
+# Third party libraries
+import numpy as np
+# Local libraries
+try:
+    from uvisensor.client import Client
+except ImportError:
+    # Exit program if the uvisensor package can't be found.
+    sys.exit("Can't find uvisensor package. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+
+
+def serve_frames(server, frame):
+    """Answer every 'G' request on the first connection with *frame*."""
+    connection, _ = server.accept()
+    connection.send("Welcome to the bench server\n")
+    requests = ''
+    while True:
+        data = connection.recv(64)
+        if not data:
+            break
+        requests += data
+        while '\n' in requests:
+            line, requests = requests.split('\n', 1)
+            if line == 'G':
+                connection.sendall(frame)
+            elif line == 'Q':
+                connection.close()
+                return
+    connection.close()
+
+
+def legacy_read(client, size):
+    """Reception loop used before the *read_into* method was added."""
+    nbytes = 0
+    packages = []
+    while nbytes < size:
+        try:
+            received_package = client.recv(client.buffer_size)
+        except socket.timeout:
+            break
+        nbytes += len(received_package)
+        packages.append(received_package)
+    return ''.join(packages)
+
+
+def run_path(client, shape, frames, zero_copy):
+    """Download *frames* images and return the measured statistics."""
+    size = shape[0] * shape[1]
+    buffer = bytearray(size)
+    calls = [0]
+    # Count the reception calls by wrapping the delegated socket methods.
+    method = 'recv_into' if zero_copy else 'recv'
+    original = getattr(client, method)
+
+    def counted(*args):
+        calls[0] += 1
+        return original(*args)
+    setattr(client, method, counted)
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    start = time.time()
+    for _ in xrange(frames):
+        client.send('G\n')
+        if zero_copy:
+            client.read_into(buffer, size)
+            image = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+        else:
+            data = legacy_read(client, size)
+            image = np.fromstring(data, dtype=np.uint8).reshape(shape)
+    elapsed = time.time() - start
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults
+    setattr(client, method, original)
+    return {'fps': frames / elapsed,
+            'calls': float(calls[0]) / frames,
+            'faults': float(faults) / frames,
+            'checksum': int(image[::37, ::41].sum())}
+
+
+def main():
+    help_msg = "Usage: bench_capture.py [-n <frames>] [-w <width>] [-h <height>]"
+    frames, width, height = 200, 648, 486
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "n:w:h:")
+    except getopt.GetoptError:
+        print help_msg
+        sys.exit()
+    for opt, arg in opts:
+        if opt == '-n':
+            frames = int(arg)
+        elif opt == '-w':
+            width = int(arg)
+        elif opt == '-h':
+            height = int(arg)
+    shape = (height, width)
+    frame = np.random.randint(0, 256, shape).astype(np.uint8).tostring()
+    results = {}
+    for name, zero_copy in (('legacy', False), ('zero-copy', True)):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        thread = threading.Thread(target=serve_frames, args=(server, frame))
+        thread.daemon = True
+        thread.start()
+        client = Client()
+        client.open_connection(*server.getsockname())
+        results[name] = run_path(client, shape, frames, zero_copy)
+        client.close_connection()
+        thread.join()
+        server.close()
+    print "{} frames of {}x{} pixels".format(frames, width, height)
+    print "{:>10} {:>10} {:>14} {:>16}".format('path', 'fps', 'recv calls/fr',
+                                                 'page faults/fr')
+    for name in ('legacy', 'zero-copy'):
+        stats = results[name]
+        print "{:>10} {:>10.1f} {:>14.1f} {:>16.1f}".format(
+                name, stats['fps'], stats['calls'], stats['faults'])
+    if results['legacy']['checksum'] != results['zero-copy']['checksum']:
+        print "WARNING: the 2 paths returned different images"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Micro-benchmark of the decoding of the ACTUAL_LOCATION replies.
+
+A typical reply of the FPGA, with the 8 contour points of a tracker, is
+decoded many times with 2 methods:
+
+* *literal_eval*: the original path, i.e. *ast.literal_eval* followed by
+  the *np.array* conversion of the tracker's list of points.
+* *decoder*: the *TrackerDecoder.decode* method, which parses the reply
+  directly into a preallocated array.
+
+Usage: bench_decoder.py [-n <iterations>] [-t <trackers>]
+"""
+# Standard libraries
+import ast
+import getopt
+import sys
+import timeit
+# Third party libraries
+import numpy as np
+# Local libraries
+try:
+    from uvisensor.trackerdecoder import TrackerDecoder
+except ImportError:
+    # Exit program if the uvisensor package can't be found.
+    sys.exit("Can't find uvisensor package. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+
+
+def build_payload(trackers):
+    """Return an ACTUAL_LOCATION reply with 8 points per tracker."""
+    entries = []
+    for tracker in range(1, trackers + 1):
+        points = np.random.randint(0, 1296, (8, 2)).tolist()
+        entries.append("'{}': {}".format(tracker, points))
+    return "{{{}}}\n".format(', '.join(entries))
+
+
+def main():
+    help_msg = "Usage: bench_decoder.py [-n <iterations>] [-t <trackers>]"
+    iterations, trackers = 20000, 1
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hn:t:")
+    except getopt.GetoptError:
+        print help_msg
+        sys.exit()
+    for opt, arg in opts:
+        if opt == '-h':
+            print help_msg
+            sys.exit()
+        elif opt == '-n':
+            iterations = int(arg)
+        elif opt == '-t':
+            trackers = int(arg)
+    payload = build_payload(trackers)
+    decoder = TrackerDecoder(columns=2, rows=8)
+
+    def literal_path():
+        content = ast.literal_eval(payload)
+        return dict((key, np.array(value)) for key, value in content.items())
+
+    def decoder_path():
+        return decoder.decode(payload)
+    # Both methods must return the same values.
+    expected = literal_path()
+    obtained = decoder_path()
+    for key in expected:
+        np.testing.assert_array_equal(expected[key], obtained[key])
+    print "{} iterations, {} tracker(s): {}".format(iterations, trackers,
+                                                   repr(payload[:40] + '...'))
+    for name, function in (('literal_eval', literal_path),
+                           ('decoder', decoder_path)):
+        elapsed = min(timeit.repeat(function, number=iterations, repeat=3))
+        print "{:>14}: {:8.2f} us/reply".format(name,
+                                                1e6 * elapsed / iterations)
+
+
+if __name__ == '__main__':
+    main()
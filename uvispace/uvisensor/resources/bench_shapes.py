@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""Accuracy and throughput comparison of the Image.get_shapes backends.
+
+The same binarized frames are processed with every combination of the
+contours backend ('skimage' or 'opencv') and the triangle fitting
+(polygon approximation, minimum enclosing triangle or moments). For each
+one, the following values are printed:
+
+* The processing time per frame of *get_shapes*.
+* The number of reference triangles found, and the number of found
+  triangles that do not match any reference one.
+* The mean distance between the vertices found and the reference ones,
+  in image pixels.
+* The mean error of the pose obtained with *Triangle.get_pose*: the
+  distance between the base midpoints, in image pixels, and the angle
+  difference, in degrees.
+
+The frames are synthetic by default, drawn by the simulated arena, and
+the reference triangles are the drawn ones. If a session file recorded
+with *VideoSensor.start_recording* is given, its gray frames are used
+instead, and the reference triangles are the ones found by the current
+production path i.e. skimage with polygon approximation.
+
+Usage: bench_shapes.py [-n <frames>] [-r <robots>] [-s <session_file>]
+"""
+# Standard libraries
+import ast
+import ConfigParser
+import getopt
+import StringIO
+import sys
+import time
+# Third party libraries
+import numpy as np
+# Local libraries
+try:
+    from uvisensor import geometry
+    from uvisensor import imgprocessing
+    from uvisensor import recording
+    from uvisensor.resources import sim_fpga
+except ImportError:
+    # Exit program if the uvisensor package can't be found.
+    sys.exit("Can't find uvisensor package. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+
+# Red thresholds of the simulator configuration files.
+THRESHOLDS = (551040525, 784051947)
+# Backend and triangle fitting of each compared configuration.
+CONFIGURATIONS = [('skimage', 'polygon'), ('skimage', 'enclosing'),
+                  ('skimage', 'moments'), ('opencv', 'polygon'),
+                  ('opencv', 'enclosing'), ('opencv', 'moments')]
+
+
+def synthetic_corpus(frames, robots, shape=(486, 648)):
+    """Return simulated frames and the vertices of their triangles."""
+    arena = sim_fpga.SimulatedArena((1296, 972), robots=robots, seed=0)
+    # Ratio between the image and the arena coordinates, as [row, col].
+    ratio = np.array(shape, dtype=np.float64) / arena.shape[::-1]
+    corpus = []
+    for elapsed in np.linspace(0, 10, frames):
+        timestamp = arena.start_time + elapsed
+        frame = arena.render(shape, 158, timestamp, noise=140)
+        triangles = arena.get_triangles(timestamp)[:, :, ::-1] * ratio
+        corpus.append((frame, list(triangles)))
+    return corpus, THRESHOLDS
+
+
+def session_corpus(filename, frames):
+    """Return the gray frames of a session, without reference triangles."""
+    reader = recording.SessionReader(filename)
+    conf = ConfigParser.RawConfigParser()
+    conf.readfp(StringIO.StringIO(reader.get_config() or ''))
+    thresholds = ast.literal_eval(conf.get('Sensor', 'red_thresholds'))
+    corpus = []
+    for record in reader.records:
+        if (record[0] == recording.FRAME
+                and record[2]['command'] == 'GET_GRAY_IMAGE'):
+            corpus.append((np.array(reader.get_frame(record)), None))
+        if len(corpus) == frames:
+            break
+    return corpus, thresholds
+
+
+def get_pose_errors(found, reference):
+    """Return the midpoint distances and angle differences of the poses."""
+    poses = geometry.TriangleBatch(found).get_pose()
+    reference_poses = geometry.TriangleBatch(reference).get_pose()
+    distances = np.hypot(*(poses[:, :2] - reference_poses[:, :2]).T)
+    angles = (poses[:, 2] - reference_poses[:, 2] + np.pi) % (2 * np.pi)
+    return distances, np.abs(np.degrees(angles - np.pi))
+
+
+def match_triangles(found, reference):
+    """Return the matched pairs of triangles and their vertex distance."""
+    pairs = []
+    for vertices in reference:
+        if not found:
+            break
+        # Distance from every reference vertex to its nearest vertex.
+        errors = [np.linalg.norm(vertices[:, None] - candidate[None],
+                                 axis=2).min(axis=1).mean()
+                  for candidate in found]
+        best = int(np.argmin(errors))
+        # The triangles further than half of their size are not matched.
+        size = np.ptp(vertices, axis=0).max()
+        if errors[best] < size / 2:
+            pairs.append((found[best], vertices, errors[best]))
+    return pairs
+
+
+def main():
+    help_msg = ("Usage: bench_shapes.py [-n <frames>] [-r <robots>] "
+                "[-s <session_file>]")
+    frames, robots, session = 50, 3, ''
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hn:r:s:")
+    except getopt.GetoptError:
+        print help_msg
+        sys.exit()
+    for opt, arg in opts:
+        if opt == '-h':
+            print help_msg
+            sys.exit()
+        elif opt == '-n':
+            frames = int(arg)
+        elif opt == '-r':
+            robots = int(arg)
+        elif opt == '-s':
+            session = arg
+    if session:
+        corpus, thresholds = session_corpus(session, frames)
+    else:
+        corpus, thresholds = synthetic_corpus(frames, robots)
+    # The binarization is common to every configuration.
+    images = []
+    for frame, reference in corpus:
+        image = imgprocessing.Image(frame)
+        image.binarize(thresholds, backend='opencv')
+        if reference is None:
+            image.get_shapes()
+            reference = [triangle.vertices for triangle in image.triangles]
+        images.append((image, reference))
+    expected = sum(len(reference) for _, reference in images)
+    print "{} frames, {} reference triangles".format(len(images), expected)
+    print "{:>8} {:>9} {:>9} {:>8} {:>6} {:>9} {:>9} {:>9}".format(
+            'backend', 'fit', 'ms/frame', 'found', 'extra', 'error px',
+            'pose px', 'pose deg')
+    for backend, fit in CONFIGURATIONS:
+        elapsed, extra, pairs = 0, 0, []
+        for image, reference in images:
+            start_time = time.time()
+            triangles = image.get_shapes(backend=backend, fit=fit)
+            elapsed += time.time() - start_time
+            found = [triangle.vertices for triangle in triangles]
+            frame_pairs = match_triangles(found, reference)
+            extra += len(found) - len(frame_pairs)
+            pairs.extend(frame_pairs)
+        errors = [float('nan')] * 3
+        if pairs:
+            found, reference, distances = zip(*pairs)
+            errors = [np.mean(values) for values in
+                      (distances, ) + get_pose_errors(found, reference)]
+        print "{:>8} {:>9} {:9.3f} {:>8} {:6} {:9.2f} {:9.2f} {:9.2f}".format(
+                backend, fit, 1e3 * elapsed / len(images),
+                '{}/{}'.format(len(pairs), expected), extra, *errors)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,32 @@
 """
 Auxiliar module for obtaining an image from a Localization Node.
 
-The localization node can be accessed through TCP/IP.
+The localization node can be accessed through TCP/IP. With the
+-a / --attach <name> option, the image is taken from the frame bus
+published by *get_video.py* instead.
+
+Usage: get_image.py [-a <name>]
 """
+import getopt
 import numpy as np
 from scipy import misc
 import socket
+import sys
 
 
 def main():
+    help_msg = "Usage: get_image.py [-a <name>]"
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "ha:", ["attach="])
+    except getopt.GetoptError:
+        print help_msg
+        sys.exit()
+    for opt, arg in opts:
+        if opt == '-h':
+            print help_msg
+            sys.exit()
+        if opt in ("-a", "--attach"):
+            return get_bus_image(arg)
     client = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
     address = ("172.19.5.213", 36000)
     client.connect(address)
@@ -27,6 +45,28 @@ def main():
     client.send("quit\n")
 
 
+def get_bus_image(name):
+    """Save the next frame published on a frame bus."""
+    try:
+        from uvisensor.framebus import FrameBusReader
+    except ImportError:
+        # Exit program if the uvisensor package can't be found.
+        sys.exit("Can't find uvisensor package. Maybe environment variables "
+                 "are not set. Run the environment .sh script at the project "
+                 "root folder.")
+    reader = FrameBusReader(name)
+    sequence, _, raw_array = reader.get_frame(timeout=5.0)
+    if sequence is None:
+        print("timeout")
+        return
+    # Copy the frame, as the bus slot will be overwritten.
+    image_array = np.copy(raw_array[:, :, 0:3])
+    if not reader.is_valid(sequence):
+        print("frame overwritten")
+        return
+    misc.imsave("image.png", image_array)
+
+
 def recv_data(sck, size):
     """Read the specified number of packages from the input socket."""
     recv_bytes = 0
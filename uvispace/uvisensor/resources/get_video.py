@@ -2,13 +2,25 @@
 """
 Auxiliar module for streaming images from a Localization Node.
 
-The localization node can be accessed through TCP/IP.
+The localization node can be accessed through TCP/IP. A single process
+can share the frames of the node with any number of local viewers,
+recorders or detectors through a frame bus in shared memory:
+
+* -p / --publish <name>: capture the frames into the bus with the given
+  name, instead of showing them.
+* -a / --attach <name>: show and record the frames of the bus with the
+  given name, instead of connecting to the node.
+
+Usage: get_video.py [-p <name> | -a <name>]
 """
 import cv2
+import getopt
 import logging
 import numpy as np
+import Queue
 import socket
-import time
+import sys
+import threading
 
 try:
     # Logging setup.
@@ -18,54 +30,164 @@ except ImportError:
     sys.exit("Can't find settings module. Maybe environment variables are not"
 "set. Run the environment .sh script at the project root folder.")
 logger = logging.getLogger('sensor')
+# Local libraries
+try:
+    from uvisensor.framebus import FrameBus, FrameBusReader
+except ImportError:
+    # Exit program if the uvisensor package can't be found.
+    sys.exit("Can't find uvisensor package. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+
+ADDRESS = ("172.19.5.213", 36000)
+SHAPE = (480, 640, 4)
 
 
 def main():
-    address = ("172.19.5.213", 36000)
+    help_msg = "Usage: get_video.py [-p <name> | -a <name>]"
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hp:a:",
+                                   ["publish=", "attach="])
+    except getopt.GetoptError:
+        print help_msg
+        sys.exit()
+    for opt, arg in opts:
+        if opt == '-h':
+            print help_msg
+            sys.exit()
+        if opt in ("-p", "--publish"):
+            return publish(arg)
+        if opt in ("-a", "--attach"):
+            return attach(arg)
+    stream()
+
+
+def stream():
+    """Show and record the frames received directly from the node."""
     client = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
-    client.connect(address)
+    client.connect(ADDRESS)
 
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    videowriter = cv2.VideoWriter('output.avi', fourcc, 6.0, (640, 480))
+    videowriter = get_video_writer()
+
+    # The frames are downloaded on a background thread, while the previous
+    # one is shown and written. 2 buffers are exchanged through queues.
+    shape = SHAPE
+    free_buffers = Queue.Queue()
+    frames = Queue.Queue()
+    for _ in range(2):
+        free_buffers.put(bytearray(np.prod(shape)))
+    producer = threading.Thread(target=receive_frames,
+                                args=(client, 10000, free_buffers, frames))
+    producer.daemon = True
+    producer.start()
 
-    for frame in range(10000):
+    while True:
         try:
+            buffer = frames.get(timeout=1.0)
+        except Queue.Empty:
+            continue
+        except KeyboardInterrupt:
+            break
+        if buffer is None:
+            break
+        raw_array = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+        show_frame(raw_array, videowriter)
+        free_buffers.put(buffer)
+
+    # Stop the producer before closing the connection.
+    free_buffers.put(None)
+    producer.join()
+    client.send("quit\n")
+
+
+def publish(name, nframes=10000):
+    """Receive the frames of the node directly into a frame bus."""
+    client = socket.socket(family=socket.AF_INET, type=socket.SOCK_STREAM)
+    client.connect(ADDRESS)
+    bus = FrameBus(name, SHAPE)
+    try:
+        for frame in range(nframes):
+            sequence, slot = bus.begin_frame()
             logger.info("Requesting frame {}".format(frame))
             client.send("capture_frame\n")
-            message = recv_data(client, 480*640*4)
-        except socket.timeout:
-            break
+            # Flat view of the slot, so its length is the number of bytes.
+            flat_slot = slot.reshape(-1)
+            if recv_data(client, flat_slot) < len(flat_slot):
+                break
+            bus.commit_frame(sequence)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.close()
+        client.send("quit\n")
+
+
+def attach(name):
+    """Show and record the frames published on a frame bus."""
+    reader = FrameBusReader(name)
+    videowriter = get_video_writer()
+    while True:
+        try:
+            sequence, _, raw_array = reader.get_frame(timeout=1.0)
         except KeyboardInterrupt:
             break
-        else:
-            shape = (480, 640, 4)
-            raw_array = np.fromstring(message, dtype=np.uint8).reshape(shape)
-            image = raw_array[:, :, 0:3]
-            cv2.imshow('stream', image)
-            cv2.waitKey(1)
-            videowriter.write(image)
+        if sequence is None:
+            continue
+        show_frame(raw_array, videowriter)
+        if not reader.is_valid(sequence):
+            logger.warn("Frame {} was overwritten while shown".format(
+                    sequence))
+    logger.info("{} frames were lost".format(reader.overruns))
 
-    client.send("quit\n")
+
+def get_video_writer():
+    """Return the writer of the output video."""
+    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+    return cv2.VideoWriter('output.avi', fourcc, 6.0, (640, 480))
 
 
-def recv_data(sck, size):
-    """Read the specified number of packages from the input socket."""
+def show_frame(raw_array, videowriter):
+    """Show a raw 4-channel frame and write it to the output video."""
+    image = raw_array[:, :, 0:3]
+    cv2.imshow('stream', image)
+    cv2.waitKey(1)
+    videowriter.write(image)
+
+
+def receive_frames(sck, nframes, free_buffers, frames):
+    """Request frames and receive them into the free buffers.
+
+    Each filled buffer is put on the *frames* queue, and a None element
+    is put when the acquisition finishes.
+    """
+    for frame in range(nframes):
+        buffer = free_buffers.get()
+        if buffer is None:
+            break
+        logger.info("Requesting frame {}".format(frame))
+        sck.send("capture_frame\n")
+        if recv_data(sck, buffer) < len(buffer):
+            break
+        frames.put(buffer)
+    frames.put(None)
+
+
+def recv_data(sck, buffer):
+    """Receive data from the input socket until the buffer is full."""
+    view = memoryview(buffer)
     recv_bytes = 0
-    packages = []
     count = 0
-    # Do not stop reading new packages until target 'size' is reached
-    while recv_bytes < size:
+    # Do not stop reading new packages until the buffer is filled
+    while recv_bytes < len(buffer):
         try:
-            received_package = sck.recv(size)
+            nbytes = sck.recv_into(view[recv_bytes:])
         except socket.timeout:
             break
-        recv_bytes += len(received_package)
-        packages.append(received_package)
+        if not nbytes:
+            break
+        recv_bytes += nbytes
         count += 1
-    # Concatenate all the packages in a unique variable
     logger.debug("recv_data: {}".format(count))
-    data = ''.join(packages)
-    return data
+    return recv_bytes
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+"""This module simulates the FPGA-camera nodes for testing uvisensor.
+
+Each simulated node is a TCP server that speaks the same protocol as
+the boards, as defined by the *_COMMANDS* and *_REGISTERS* dictionaries
+of the *client.Client* class:
+
+* A welcome message is sent when a client connects.
+* 'r,xx' and 'w,xx,value' requests read and write the registers. Every
+  write request is acknowledged with an 'ACK' message.
+* The 'S' command captures a frame of a synthetic arena, with triangles
+  (UGVs) moving in circles, and replies 'Image captured.'. Then, the
+  'G' and 'D' commands download it in gray scale or color. Only the
+  sensor window set in 'START_INDEXES' and 'SYSTEM_SHAPE' is rendered,
+  scaled to 'IMAGE_SHAPE'.
+* The trackers set with the 'SET_WINDOW' register follow the triangle
+  inside their window, and 'ACTUAL_LOCATION' returns 8 contour points
+  of the triangle, in FPGA (full resolution) coordinates. With static
+  windows, the trackers keep the programmed window instead, so a
+  triangle that leaves it is lost until the client moves the window.
+
+The replies can be delayed with a configurable latency and jitter, and
+split in small packages for testing the reassembly of the messages.
+
+The nodes are configured with the same files as the video sensors, and
+are bound to the IP and port of each file. The files in the
+*config/simulator* folder point to the local host, so *multiplecamera*
+can be run against 4 simulated nodes. An optional *Simulator* section
+sets the default simulation parameters of each node.
+
+Usage: sim_fpga.py [-c <config_files_pattern>], [-l <latency_ms>],
+[-j <jitter_ms>], [-f <fragment_bytes>], [-r <robots>], [-s]
+
+The -s option sets static tracker windows.
+"""
+# Standard libraries
+import ast
+import collections
+import ConfigParser
+import getopt
+import glob
+import logging
+import random
+import signal
+import socket
+import SocketServer
+import sys
+import threading
+import time
+# Third party libraries
+import cv2
+import numpy as np
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger('sensor')
+
+
+class SimulatedArena(object):
+    """Synthetic scene with triangles moving in circles.
+
+    The coordinates are expressed in FPGA (full resolution) pixels, in
+    the form [x, y] i.e. [column, row].
+
+    :param shape: width and height of the arena, in FPGA pixels.
+    :type shape: (int, int)
+    :param int robots: number of triangles in the scene.
+    :param float size: length of the triangles' base, in FPGA pixels.
+    :param float speed: angular speed of the triangles, in rad/s.
+    :param int seed: seed of the random trajectories.
+    """
+
+    def __init__(self, shape, robots=1, size=60, speed=0.5, seed=None):
+        self.shape = shape
+        self.size = size
+        self.speed = speed
+        self.start_time = time.time()
+        generator = random.Random(seed)
+        width, height = shape
+        self._trajectories = []
+        for _ in range(robots):
+            radius = generator.uniform(0.15, 0.35) * min(width, height)
+            center = (generator.uniform(radius + size, width - radius - size),
+                      generator.uniform(radius + size, height - radius - size))
+            phase = generator.uniform(0, 2 * np.pi)
+            direction = generator.choice((-1, 1))
+            self._trajectories.append((center, radius, phase, direction))
+
+    def get_triangles(self, timestamp=None):
+        """Return the vertices of the triangles at the given time.
+
+        :param float timestamp: time at which the poses are calculated.
+         If None, the current time is used.
+        :return: array of shape Nx3x2, with the [x, y] coordinates of the
+         3 vertices of the N triangles. The first vertex is the front one.
+        :rtype: numpy.array
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        elapsed = timestamp - self.start_time
+        triangles = np.zeros([len(self._trajectories), 3, 2])
+        # Isosceles triangle with the 2 equal sides bigger than the base.
+        shape = np.array([[1.2, 0], [-0.6, 0.5], [-0.6, -0.5]]) * self.size
+        for index, (center, radius, phase, direction) in enumerate(
+                self._trajectories):
+            angle = phase + direction * self.speed * elapsed
+            position = (center[0] + radius * np.cos(angle),
+                        center[1] + radius * np.sin(angle))
+            heading = angle + direction * np.pi / 2
+            rotation = np.array([[np.cos(heading), -np.sin(heading)],
+                                 [np.sin(heading), np.cos(heading)]])
+            triangles[index] = shape.dot(rotation.T) + position
+        return triangles
+
+    def render(self, image_shape, intensity, timestamp=None, noise=8,
+               window=None):
+        """Draw the triangles on a gray scale image.
+
+        :param image_shape: height and width of the output image. The
+         arena window is scaled to fit it.
+        :type image_shape: (int, int)
+        :param int intensity: gray level of the triangles.
+        :param float timestamp: time of the scene.
+        :param int noise: maximum value of the background noise.
+        :param window: region of the arena that is rendered, as
+         (x, y, width, height) in FPGA pixels. By default, the whole
+         arena.
+        :type window: (float, float, float, float)
+        :return: gray scale image of the scene.
+        :rtype: MxN numpy.array of uint8
+        """
+        height, width = image_shape
+        if window is None:
+            window = (0, 0) + tuple(self.shape)
+        image = np.random.randint(0, noise + 1, (height, width)).astype(
+                np.uint8)
+        scale = np.array([float(width) / window[2],
+                          float(height) / window[3]])
+        for triangle in self.get_triangles(timestamp):
+            points = np.round((triangle - window[:2]) * scale).astype(
+                    np.int32)
+            cv2.fillPoly(image, [points], int(intensity))
+        return image
+
+
+class SimulatedFPGA(SocketServer.ThreadingTCPServer):
+    """TCP server with the registers and the camera of a simulated node.
+
+    :param address: IP and port where the server is bound.
+    :type address: (str, int)
+    :param arena: *SimulatedArena* instance with the scene.
+    :param float latency: delay of every reply, in seconds.
+    :param float jitter: maximum random variation of the latency.
+    :param int fragment: if not 0, the replies are split in packages of
+     a random length between 1 and *fragment* bytes.
+    :param float scale: ratio between the FPGA full resolution and the
+     resolution of the images.
+    :param bool follow: if True, the tracker windows are re-centred on
+     their triangles at every location read. If False, they stay where
+     they were programmed.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+    WELCOME = "Welcome to the UviSpace FPGA simulator\n"
+    # Columns and rows of the camera sensor. The arena covers all of it.
+    SENSOR_SHAPE = (2592, 1944)
+
+    def __init__(self, address, arena, latency=0.0, jitter=0.0, fragment=0,
+                 scale=2.0, follow=True):
+        SocketServer.ThreadingTCPServer.__init__(self, address,
+                                                 FPGARequestHandler)
+        self.arena = arena
+        self.latency = latency
+        self.jitter = jitter
+        self.fragment = fragment
+        self.scale = scale
+        self.follow = follow
+        self.lock = threading.Lock()
+        width, height = arena.shape
+        self.registers = {
+            'rt': (551040525, 784051947),
+            'gt': (4198404, 0),
+            'bt': (4198404, 0),
+            'is': (int(width / scale), int(height / scale)),
+            'ie': 1111,
+            'si': (0, 0),
+            'ss': self.SENSOR_SHAPE,
+            'sm': (1, 1),
+            'so': 0,
+        }
+        # Tracker windows [x, y, width, height], indexed by tracker id.
+        self.trackers = {}
+        self.max_trackers = 8
+        # Last captured frame, in gray scale.
+        self.frame = None
+        # Latest requests received, for inspecting the client traffic.
+        self.requests = collections.deque(maxlen=1000)
+
+    def get_intensity(self):
+        """Return the gray level inside the red thresholds register."""
+        # Same slice as in imgprocessing.Image.binarize
+        thresholds = [(value >> 20) & 0x3ff for value in self.registers['rt']]
+        return sum(thresholds) / 8
+
+    def capture(self):
+        """Render the acquisition window set in the registers.
+
+        The sensor window is given by the *START_INDEXES* and
+        *SYSTEM_SHAPE* registers, and it is scaled to *IMAGE_SHAPE*.
+        """
+        width, height = self.registers['is']
+        # Ratio between the arena and the sensor pixels.
+        ratio = float(self.arena.shape[0]) / self.SENSOR_SHAPE[0]
+        window = np.array(self.registers['si'] + self.registers['ss'],
+                          dtype=np.float64) * ratio
+        self.frame = self.arena.render((height, width), self.get_intensity(),
+                                       window=window)
+
+    def read_register(self, reg):
+        """Return the reply to a register read request."""
+        with self.lock:
+            if reg == 'al':
+                return repr(self.get_locations())
+            elif reg == 'aw':
+                return repr(dict((key, list(window)) for key, window
+                                 in self.trackers.items()))
+            elif reg == 'tr':
+                return repr(self.max_trackers - len(self.trackers))
+            return repr(self.registers.get(reg, 0))
+
+    def write_register(self, reg, value):
+        """Store the value of a register write request."""
+        with self.lock:
+            if reg == 'sw':
+                fields = [int(float(field)) for field in value.split(',')]
+                self.trackers[str(fields[0])] = fields[1:5]
+            elif reg == 'ft':
+                self.trackers.pop(value.strip(), None)
+            elif reg == 'fa':
+                self.trackers.clear()
+            elif reg in ('at', 'dt'):
+                pass
+            else:
+                try:
+                    self.registers[reg] = ast.literal_eval(
+                            '({},)'.format(value))
+                except (SyntaxError, ValueError):
+                    logger.warn("Invalid value for {}: {}".format(reg, value))
+                    return
+                if len(self.registers[reg]) == 1:
+                    self.registers[reg] = self.registers[reg][0]
+
+    def get_locations(self):
+        """Return 8 contour points of the triangle in each tracker window.
+
+        If *follow* is set, the windows are re-centred on the triangles
+        they contain, so they follow them as they move.
+        """
+        triangles = self.arena.get_triangles()
+        barycenters = triangles.mean(axis=1)
+        locations = {}
+        for key, (x, y, width, height) in self.trackers.items():
+            inside = np.flatnonzero(
+                    (barycenters[:, 0] >= x) & (barycenters[:, 0] <= x + width)
+                    & (barycenters[:, 1] >= y)
+                    & (barycenters[:, 1] <= y + height))
+            if not len(inside):
+                continue
+            triangle = triangles[inside[0]]
+            # Vertices and intermediate points of the sides. The initial
+            # vertex is repeated at the end for closing the contour.
+            v0, v1, v2 = triangle
+            points = [v0, v0 + (v1 - v0) / 3, v0 + 2 * (v1 - v0) / 3, v1,
+                      (v1 + v2) / 2, v2, (v2 + v0) / 2, v0]
+            locations[key] = np.round(points).astype(int).tolist()
+            if not self.follow:
+                continue
+            center = barycenters[inside[0]]
+            self.trackers[key] = [int(center[0] - width / 2),
+                                  int(center[1] - height / 2), width, height]
+        return locations
+
+
+class FPGARequestHandler(SocketServer.BaseRequestHandler):
+    """Handler of a client connection to a *SimulatedFPGA*."""
+
+    def send_reply(self, data):
+        """Send a reply, delayed and fragmented as configured."""
+        server = self.server
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if not server.fragment:
+            self.request.sendall(data)
+            return
+        view = memoryview(data)
+        while len(view):
+            size = random.randint(1, server.fragment)
+            self.request.sendall(view[:size])
+            view = view[size:]
+
+    def handle(self):
+        """Serve the requests of a client until it closes the connection."""
+        logger.info("Simulator {} connected to {}".format(
+                self.server.server_address, self.client_address))
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # The nodes send the welcome message in a single package, that
+        # the client discards with a single read.
+        self.request.sendall(SimulatedFPGA.WELCOME)
+        pending = ''
+        while True:
+            try:
+                data = self.request.recv(4096)
+            except socket.error:
+                break
+            if not data:
+                break
+            pending += data
+            while '\n' in pending:
+                line, pending = pending.split('\n', 1)
+                if not self.process(line.strip()):
+                    return
+
+    def process(self, line):
+        """Execute a request. Return False if the connection was closed."""
+        server = self.server
+        server.requests.append(line)
+        if line.startswith('r,'):
+            self.send_reply('{}\n'.format(server.read_register(line[2:])))
+        elif line.startswith('w,'):
+            fields = line.split(',', 2)
+            server.write_register(fields[1],
+                                  fields[2] if len(fields) > 2 else '')
+            self.send_reply("ACK\n")
+        elif line == 'S':
+            server.capture()
+            self.send_reply("Image captured.\n")
+        elif line in ('G', 'D'):
+            if server.frame is None:
+                server.capture()
+            frame = server.frame
+            if line == 'D':
+                frame = np.dstack([frame] * 3)
+            self.send_reply(frame.tostring())
+        elif line == 'C':
+            self.send_reply("Camera configured.\n")
+        elif line == 'V':
+            pass
+        elif line == 'Q':
+            logger.info("Simulator {} disconnected".format(
+                    server.server_address))
+            return False
+        elif line:
+            logger.warn("Unknown request to simulator: {}".format(line))
+        return True
+
+
+def create_simulator(filename, latency=None, jitter=None, fragment=None,
+                     robots=None, follow=None):
+    """Create a simulated node from a video sensor configuration file.
+
+    The arguments that are None are read from the optional *Simulator*
+    section of the file, or set to their default values.
+    """
+    conf = ConfigParser.RawConfigParser()
+    conf.read(filename)
+
+    def option(name, value, default):
+        if value is not None:
+            return value
+        if conf.has_option('Simulator', name):
+            return type(default)(conf.get('Simulator', name))
+        return default
+    address = (conf.get('VideoSensor', 'IP'),
+               conf.getint('VideoSensor', 'PORT'))
+    width = conf.getint('Camera', 'width')
+    height = conf.getint('Camera', 'height')
+    scale = 2.0
+    arena = SimulatedArena((int(width * scale), int(height * scale)),
+                           robots=option('robots', robots, 1),
+                           seed=option('seed', None, 0))
+    if follow is None:
+        follow = (not conf.has_option('Simulator', 'follow')
+                  or conf.getboolean('Simulator', 'follow'))
+    simulator = SimulatedFPGA(address, arena,
+                              latency=option('latency', latency, 0.0),
+                              jitter=option('jitter', jitter, 0.0),
+                              fragment=option('fragment', fragment, 0),
+                              scale=scale, follow=follow)
+    return simulator
+
+
+def main():
+    help_msg = ("Usage: sim_fpga.py [-c <config_files_pattern>], "
+                "[-l <latency_ms>], [-j <jitter_ms>], [-f <fragment_bytes>], "
+                "[-r <robots>], [-s]")
+    pattern = "./resources/config/simulator/*.cfg"
+    latency = jitter = fragment = robots = follow = None
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hc:l:j:f:r:s")
+    except getopt.GetoptError:
+        print help_msg
+        sys.exit()
+    for opt, arg in opts:
+        if opt == '-h':
+            print help_msg
+            sys.exit()
+        elif opt == '-c':
+            pattern = arg
+        elif opt == '-l':
+            latency = float(arg) / 1000
+        elif opt == '-j':
+            jitter = float(arg) / 1000
+        elif opt == '-f':
+            fragment = int(arg)
+        elif opt == '-r':
+            robots = int(arg)
+        elif opt == '-s':
+            follow = False
+    conf_files = sorted(glob.glob(pattern))
+    if not conf_files:
+        sys.exit("No configuration files found in {}".format(pattern))
+    simulators = []
+    for filename in conf_files:
+        simulator = create_simulator(filename, latency, jitter, fragment,
+                                     robots, follow)
+        thread = threading.Thread(target=simulator.serve_forever)
+        thread.daemon = True
+        thread.start()
+        simulators.append(simulator)
+        logger.info("Simulating {} at {}".format(filename,
+                                                 simulator.server_address))
+
+    # SIGINT handling: stop the servers and exit.
+    global run_program
+    run_program = True
+
+    def sigint_handler(signal, frame):
+        global run_program
+        logger.info("Shutting down")
+        run_program = False
+    signal.signal(signal.SIGINT, sigint_handler)
+    while run_program:
+        time.sleep(0.1)
+    for simulator in simulators:
+        simulator.shutdown()
+        simulator.server_close()
+
+
+if __name__ == '__main__':
+    main()
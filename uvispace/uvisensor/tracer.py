@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""This module contains the ProtocolTracer class, for the FPGA link timing.
+
+A *ProtocolTracer* attached to a *client.Client* receives an event for
+every operation performed on the link: register reads and writes,
+commands and frame downloads. Each event stores when the operation
+started, its round trip time and the number of bytes sent and received.
+
+The events are stored in a fixed size ring, so a long session only
+keeps the last ones, while the per key statistics accumulate all of
+them. The round trip times of each key are counted in a histogram with
+logarithmic bins, from which the percentiles are estimated without
+storing every sample.
+
+The events can be dumped to a trace file, with this layout:
+
+* The *MAGIC* string.
+* Length of the keys table, as a little-endian unsigned 32-bit integer.
+* Keys table: JSON list with the key of each event identifier.
+* Events: packed array of *EVENT_DTYPE* records.
+
+The keys are the register names prefixed by 'r:' or 'w:' for the reads
+and writes, and the command names e.g. 'GET_GRAY_IMAGE' for the
+commands and frame downloads.
+"""
+# Standard libraries
+import json
+import logging
+import math
+import struct
+import sys
+import time
+# Third party libraries
+import numpy as np
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+MAGIC = "UVITRC1\n"
+# Key identifier, start time, round trip time, bytes sent and received.
+EVENT_DTYPE = np.dtype([('key', '<u2'), ('start', '<f8'),
+                        ('duration', '<f4'), ('sent', '<u4'),
+                        ('received', '<u4')])
+_KEYS_LENGTH = struct.Struct('<I')
+# Range of the latency histograms, in seconds, and resolution.
+MIN_LATENCY = 1e-6
+MAX_LATENCY = 100.0
+BINS_PER_DECADE = 20
+
+
+class ProtocolTracer(object):
+    """Collector of the timing of the operations on an FPGA link.
+
+    :param int capacity: number of events kept in memory. When it is
+     reached, the oldest events are overwritten.
+    """
+
+    def __init__(self, capacity=65536):
+        self.clock = time.time
+        self._events = np.zeros(capacity, dtype=EVENT_DTYPE)
+        # Identifier of each key, and keys in identifier order.
+        self._ids = {}
+        self.keys = []
+        # Per key accumulated values, indexed by the key identifier.
+        self._histograms = []
+        self._totals = []
+        self._min_exponent = math.log10(MIN_LATENCY)
+        self._bins = int(round((math.log10(MAX_LATENCY)
+                                - self._min_exponent) * BINS_PER_DECADE))
+        # Number of events recorded since the last reset.
+        self.count = 0
+
+    def reset(self):
+        """Discard the events and the statistics."""
+        self._ids.clear()
+        del self.keys[:]
+        del self._histograms[:]
+        del self._totals[:]
+        self.count = 0
+
+    def _get_id(self, key):
+        """Return the identifier of a key, registering it if it is new."""
+        key_id = self._ids.get(key)
+        if key_id is None:
+            key_id = len(self.keys)
+            self._ids[key] = key_id
+            self.keys.append(key)
+            self._histograms.append(np.zeros(self._bins + 1, dtype=np.int64))
+            # Count, total time, maximum time, bytes sent and received.
+            self._totals.append([0, 0.0, 0.0, 0, 0])
+        return key_id
+
+    def record(self, key, start, sent=0, received=0, end=None):
+        """Add the event of an operation.
+
+        :param str key: operation identifier e.g. 'r:ACTUAL_LOCATION'.
+        :param float start: time when the operation started, obtained
+         with the *clock* attribute.
+        :param int sent: number of bytes sent.
+        :param int received: number of bytes received.
+        :param float end: time when the operation finished. Current time
+         if None.
+        """
+        if end is None:
+            end = self.clock()
+        duration = end - start
+        key_id = self._get_id(key)
+        self._events[self.count % len(self._events)] = (
+                key_id, start, duration, sent, received)
+        self.count += 1
+        if duration > MIN_LATENCY:
+            index = int((math.log10(duration) - self._min_exponent)
+                        * BINS_PER_DECADE) + 1
+            index = min(index, self._bins)
+        else:
+            index = 0
+        self._histograms[key_id][index] += 1
+        totals = self._totals[key_id]
+        totals[0] += 1
+        totals[1] += duration
+        totals[2] = max(totals[2], duration)
+        totals[3] += sent
+        totals[4] += received
+
+    @property
+    def events(self):
+        """Events kept in memory, from the oldest to the newest one."""
+        capacity = len(self._events)
+        if self.count <= capacity:
+            return self._events[:self.count]
+        split = self.count % capacity
+        return np.concatenate((self._events[split:], self._events[:split]))
+
+    def get_percentile(self, key, percentile):
+        """Estimate a percentile of the round trip time of a key.
+
+        The value is the upper edge of the histogram bin where the
+        percentile falls, so its relative error is below 12%.
+
+        :param str key: operation identifier.
+        :param float percentile: percentile between 0 and 100.
+        :return: round trip time, in seconds, or None if the key has no
+         events.
+        :rtype: float or None
+        """
+        key_id = self._ids.get(key)
+        if key_id is None:
+            return None
+        histogram = self._histograms[key_id]
+        cumulative = np.cumsum(histogram)
+        index = int(np.searchsorted(cumulative,
+                                    percentile / 100.0 * cumulative[-1]))
+        upper = 10 ** (self._min_exponent
+                       + float(index) / BINS_PER_DECADE)
+        # The maximum is exact, and tighter in the last bins.
+        return min(upper, self._totals[key_id][2])
+
+    def get_statistics(self):
+        """Return the accumulated statistics of every key.
+
+        :return: dictionary with the operation identifiers as keys, and
+         a dictionary for each one with the number of events ('count'),
+         the mean, maximum and 'p50', 'p95' and 'p99' round trip times
+         in seconds, and the total 'sent' and 'received' bytes.
+        :rtype: dict
+        """
+        statistics = {}
+        for key, (count, total, maximum, sent, received) in zip(
+                self.keys, self._totals):
+            statistics[key] = {
+                'count': count,
+                'mean': total / count,
+                'max': maximum,
+                'p50': self.get_percentile(key, 50),
+                'p95': self.get_percentile(key, 95),
+                'p99': self.get_percentile(key, 99),
+                'sent': sent,
+                'received': received,
+            }
+        return statistics
+
+    def log_statistics(self):
+        """Write a summary of the statistics in the logger."""
+        for key, values in sorted(self.get_statistics().items()):
+            logger.info("{}: {} ops, p50 {:.3f} ms, p95 {:.3f} ms, p99 "
+                        "{:.3f} ms, {} B sent, {} B received".format(
+                            key, values['count'], 1000 * values['p50'],
+                            1000 * values['p95'], 1000 * values['p99'],
+                            values['sent'], values['received']))
+
+    def dump(self, filename):
+        """Write the events kept in memory to a trace file.
+
+        :param str filename: path of the trace file.
+        """
+        keys = json.dumps(self.keys)
+        with open(filename, 'wb') as trace_file:
+            trace_file.write(MAGIC)
+            trace_file.write(_KEYS_LENGTH.pack(len(keys)))
+            trace_file.write(keys)
+            trace_file.write(self.events.tostring())
+        logger.info("Dumped {} protocol events to {}".format(
+                min(self.count, len(self._events)), filename))
+
+
+def load_trace(filename):
+    """Read a trace file written by *ProtocolTracer.dump*.
+
+    :param str filename: path of the trace file.
+    :return: the keys table, and the events array. The 'key' field of
+     each event is an index of the keys table.
+    :rtype: list, numpy.array
+    """
+    with open(filename, 'rb') as trace_file:
+        if trace_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a trace file".format(filename))
+        length, = _KEYS_LENGTH.unpack(trace_file.read(_KEYS_LENGTH.size))
+        keys = json.loads(trace_file.read(length))
+        events = np.fromfile(trace_file, dtype=EVENT_DTYPE)
+    return keys, events
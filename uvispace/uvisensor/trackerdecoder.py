@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""This module contains the TrackerDecoder class, for tracker replies.
+
+The FPGA returns the content of the tracker registers (e.g.
+*ACTUAL_LOCATION* or *ACTIVE_WINDOWS*) as the string representation of
+a Python dictionary, whose keys are the tracker identifiers and whose
+values are lists of coordinates, for example::
+
+    {'1': [[120, 250], [124, 251], ..., [118, 262]], '2': [...]}
+
+Evaluating these strings with *ast.literal_eval* builds a syntax tree,
+a dictionary and nested lists only to convert them later to an array.
+The decoder parses the string directly into numeric arrays that are
+allocated once for each tracker identifier and then reused.
+"""
+# Standard libraries
+import ast
+import logging
+import re
+import sys
+# Third party libraries
+import numpy as np
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+# Characters allowed in the value of a tracker entry.
+_VALUE_PATTERN = re.compile(r'^[\s\d\-\.,\[\]]*$')
+# Characters allowed in a tracker identifier.
+_KEY_PATTERN = re.compile(r'^\w+$')
+
+
+class TrackerDecoder(object):
+    """Decoder of the tracker replies of the FPGA into numpy arrays.
+
+    The decoded arrays are preallocated and reused for every call of
+    *decode* with the same tracker identifier. Thus, they will be
+    overwritten by the next decoded reply, and they have to be copied if
+    they need to be kept.
+
+    :param columns: number of columns of the decoded arrays e.g. 2 for
+     lists of [x, y] points. If None, the values are decoded as a flat
+     1-D array.
+    :type columns: int or None
+    :param int rows: expected number of rows of each tracker array. It
+     is only used for the initial allocation, as the arrays are resized
+     if a reply with a different length is received.
+    """
+
+    def __init__(self, columns=2, rows=8):
+        """Set the arrays layout and the preallocated arrays pool."""
+        self.columns = columns
+        self.rows = rows
+        # Preallocated arrays, indexed by tracker identifier.
+        self._arrays = {}
+
+    def _get_array(self, key, size):
+        """Return the preallocated array of a tracker, resized if needed."""
+        array = self._arrays.get(key)
+        if array is None or array.size != size:
+            if self.columns:
+                shape = (size // self.columns, self.columns)
+            else:
+                shape = (size,)
+            array = np.empty(shape, dtype=np.float64)
+            self._arrays[key] = array
+        return array
+
+    def preallocate(self, keys):
+        """Allocate in advance the arrays of the given tracker ids."""
+        size = self.rows * (self.columns or 1)
+        for key in keys:
+            self._get_array(str(key), size)
+
+    def decode(self, payload):
+        """Decode a tracker reply into arrays indexed by tracker id.
+
+        The fast parser is tried at first. If the reply does not have the
+        expected layout, it is evaluated with *ast.literal_eval* instead.
+        Malformed replies do not raise any exception.
+
+        :param str payload: reply of the FPGA to a tracker register read.
+        :return: dictionary whose keys are the tracker ids and whose
+         values are the preallocated arrays with the decoded values. None
+         is returned if the reply is malformed.
+        :rtype: dict or None
+        """
+        trackers = self.fast_decode(payload)
+        if trackers is None:
+            trackers = self.literal_decode(payload)
+        return trackers
+
+    def fast_decode(self, payload):
+        """Parse a tracker reply without evaluating it as Python code.
+
+        :param str payload: reply of the FPGA to a tracker register read.
+        :return: dictionary with the decoded arrays, or None if the reply
+         does not have the expected layout.
+        :rtype: dict or None
+        """
+        payload = payload.strip()
+        if not (payload.startswith('{') and payload.endswith('}')):
+            return None
+        # Splitting by the quotes, the odd elements are the keys and the
+        # even ones are the values, surrounded by ':' and ',' or '}'.
+        fields = payload[1:-1].split("'")
+        if fields[0].strip() or not len(fields) % 2:
+            return None
+        trackers = {}
+        for index in range(1, len(fields), 2):
+            key = fields[index]
+            value = fields[index + 1].strip()
+            if not _KEY_PATTERN.match(key) or not value.startswith(':'):
+                return None
+            value = value[1:].rstrip(', ').lstrip()
+            if (not value.startswith('[') or not value.endswith(']')
+                    or value.count('[') != value.count(']')
+                    or not _VALUE_PATTERN.match(value)):
+                return None
+            numbers = value.translate(None, '[] \t')
+            if not numbers:
+                return None
+            size = numbers.count(',') + 1
+            # Every row of the array must be inside its own brackets.
+            rows = size // self.columns if self.columns else 0
+            if ((self.columns and size % self.columns)
+                    or value.count('[') != rows + 1):
+                return None
+            decoded = np.fromstring(numbers, dtype=np.float64, sep=',')
+            # A shorter array means that a value could not be parsed.
+            if decoded.size != size:
+                return None
+            array = self._get_array(key, size)
+            array.flat[:] = decoded
+            trackers[key] = array
+        return trackers
+
+    def literal_decode(self, payload):
+        """Evaluate a tracker reply with *ast.literal_eval*.
+
+        :param str payload: reply of the FPGA to a tracker register read.
+        :return: dictionary with the decoded arrays, or None if the reply
+         is malformed.
+        :rtype: dict or None
+        """
+        try:
+            content = ast.literal_eval(payload.strip())
+            trackers = {}
+            for key, value in content.items():
+                decoded = np.array(value, dtype=np.float64)
+                if self.columns and decoded.shape[-1:] != (self.columns,):
+                    raise ValueError("Unexpected shape {}".format(
+                            decoded.shape))
+                array = self._get_array(str(key), decoded.size)
+                array.flat[:] = decoded.flat
+                trackers[str(key)] = array
+        except (AttributeError, SyntaxError, TypeError, ValueError):
+            logger.warn("Discarded malformed tracker reply: {}".format(
+                    repr(payload)))
+            return None
+        return trackers
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""This module contains the AdaptiveWindow class, for FPGA tracker windows.
+
+A tracker only finds the UGV while it stays inside its window. A fixed
+window around the last detected position is lost by fast UGVs, and then
+a new detection is needed for re-arming it.
+
+The *AdaptiveWindow* estimates the motion of the tracked shape in image
+coordinates, with a constant velocity model, and calculates a window:
+
+* Centred on the position predicted for the next cycle.
+* Whose half-width is the shape diameter times *k*, as in
+  *geometry.Triangle.get_window*, enlarged by the distance that the
+  shape travels in a cycle and by the uncertainty of the estimate. The
+  diameter of a triangle is its longest side, so the window of a still
+  UGV is the one set by *videosensor.set_tracker*.
+
+The window is only reprogrammed when it differs from the current one
+by more than a hysteresis band, so that the FPGA registers are not
+written at every cycle. When the shape is lost, the window keeps moving
+with the predicted position and grows with the time since the last
+detection, until a timeout. However, the *CameraThread* only writes the
+window while the UGV is located, because writing the window of a
+tracker freed by the FPGA arms it again.
+
+The position uncertainty is estimated from the prediction errors of
+each camera, in its image coordinates. The covariance of the Kalman
+filter of the data fusion is not used: it is a global pose estimate,
+updated at the fusion rate, and it is inflated on purpose whenever the
+speeds or the detections are missing.
+"""
+# Standard libraries
+import logging
+import sys
+# Third party libraries
+import numpy as np
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+
+class AdaptiveWindow(object):
+    """Tracker window that follows a shape according to its motion.
+
+    All the coordinates are image coordinates, in the form [row, col].
+    The windows are 2x2 arrays, with the minimum [row, col] values in
+    the first row and the maximum ones in the second row, as in
+    *geometry.Triangle.window*.
+
+    :param frame_shape: number of rows and columns of the full frame.
+    :type frame_shape: (int, int)
+    :param float k: relative size between the window half-width and the
+     shape diameter, as in *geometry.Triangle.get_window*. It should be
+     bigger than 1.
+    :param float sigmas: number of standard deviations of the position
+     error added to the window size.
+    :param float hysteresis: relative change of the window, with respect
+     to its size, needed for reprogramming it.
+    :param float smoothing: weight of the new measurements in the
+     velocity and error estimates, between 0 and 1.
+    :param float timeout: time after the last detection when the window
+     stops following the predicted position, in seconds.
+    """
+
+    def __init__(self, frame_shape, k=1.25, sigmas=3.0, hysteresis=0.2,
+                 smoothing=0.5, timeout=1.0):
+        self.limits = np.array(frame_shape, dtype=np.float64) - 1
+        self.k = k
+        self.sigmas = sigmas
+        self.hysteresis = hysteresis
+        self.smoothing = smoothing
+        self.timeout = timeout
+        # Window programmed in the tracker.
+        self.window = None
+        self.reset()
+
+    def reset(self):
+        """Forget the motion estimate, e.g. when the tracker is freed."""
+        self.position = None
+        self.velocity = np.zeros(2)
+        self.variance = np.zeros(2)
+        self.size = 0
+        self.timestamp = None
+
+    def update(self, points, timestamp):
+        """Update the motion estimate with a new detection.
+
+        :param points: Nx2 array with the [row, col] coordinates of the
+         shape contour. The position of the shape is the mean of the
+         distinct points i.e. the barycenter if only the vertices of a
+         triangle are given.
+        :param float timestamp: time of the detection, in seconds.
+        """
+        # The contours may repeat the first point for closing them.
+        points = np.unique(np.asarray(points, dtype=np.float64), axis=0)
+        position = points.mean(axis=0)
+        # Longest distance between 2 points of the shape.
+        differences = points[:, np.newaxis] - points[np.newaxis]
+        self.size = np.sqrt((differences ** 2).sum(axis=2)).max()
+        if self.position is not None and timestamp > self.timestamp:
+            delta_t = timestamp - self.timestamp
+            error = position - self.predict(timestamp)
+            velocity = (position - self.position) / delta_t
+            self.velocity += self.smoothing * (velocity - self.velocity)
+            self.variance += self.smoothing * (error ** 2 - self.variance)
+        self.position = position
+        self.timestamp = timestamp
+
+    def predict(self, timestamp):
+        """Return the predicted [row, col] position at a given time."""
+        return self.position + self.velocity * (timestamp - self.timestamp)
+
+    def get_window(self, timestamp):
+        """Calculate the window for the shape position at a given time.
+
+        :param float timestamp: time when the window will be in use e.g.
+         the start of the next cycle.
+        :return: the window, or None if there is no estimate or the last
+         detection is older than the timeout.
+        :rtype: 2x2 np.array or None
+        """
+        if self.position is None:
+            return None
+        elapsed = timestamp - self.timestamp
+        if elapsed > self.timeout:
+            return None
+        center = self.predict(timestamp)
+        # The shape diameter times k, plus the travelled distance since
+        # the last detection and the position uncertainty, on each axis.
+        distance = (self.size * self.k + np.abs(self.velocity) * elapsed
+                    + self.sigmas * np.sqrt(self.variance))
+        window = np.array([center - distance, center + distance])
+        return np.clip(window, 0, self.limits)
+
+    def needs_update(self, window):
+        """Check if a window differs from the programmed one enough.
+
+        :param window: candidate window.
+        :type window: 2x2 np.array
+        :return: True if the candidate window should be programmed.
+        :rtype: bool
+        """
+        if self.window is None:
+            return True
+        size = np.maximum(self.window[1] - self.window[0], 1)
+        change = np.abs(window - self.window).max(axis=0) / size
+        return bool(np.any(change > self.hysteresis))
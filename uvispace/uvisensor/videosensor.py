@@ -7,17 +7,24 @@ class and its methods.
 """
 # Standard libraries
 import ast
+import collections
 import ConfigParser
 import logging
 import socket
+import StringIO
 import sys
+import threading
+import time
 # Third party libraries
 import numpy as np
-import pylab
 from scipy import misc
 # Local libraries
 from client import Client
+import geometry
 import imgprocessing
+import recording
+import tracer
+from trackerdecoder import TrackerDecoder
 
 try:
     # Logging setup.
@@ -40,35 +47,151 @@ def camera_startup(filename):
     if not camera._connected:
         logger.error("No connection to specified camera.")
         raise AttributeError("No connection to specified camera.")
+    # Only the registers that differ from the FPGA ones are written.
     camera.load_configuration()
-    # Reset trackers
-    camera.set_register('FREE_ALL', '')
-    # System output = 4?
-    camera.set_register('SYSTEM_OUTPUT', 4)
-    conf = camera._client.write_command('CONFIGURE_CAMERA', True)
+    # Reset trackers and set system output = 4? in a single round trip.
+    camera.set_registers([('FREE_ALL', ''), ('SYSTEM_OUTPUT', 4)])
     return camera
 
 
-def get_image(camera, filename=''):
+def get_image(camera, filename='', windows=None, timeout=1.0):
     """Capture a frame with the specified camera and process it.
 
     If a filename is specified, the captured frame will be saved on the
     specified path.
 
+    In the continuous acquisition mode, the newest frame of the grabber
+    is processed. If the acquisition has stopped, a frame is captured
+    directly instead.
+
     :param camera: 
     :type camera: VideoSensor() object
     :param str filename: path to the file where the captured frame will
      be stored (optional).
+    :param windows: if given, only these regions of the frame are
+     processed e.g. the windows of the known triangles. The format is
+     the one of the *geometry.Triangle.window* attribute.
+    :type windows: list of 2x2 numpy.array
+    :param float timeout: maximum time to wait for a frame of the
+     continuous acquisition, in seconds.
     :return: The image from the captured frame after processing it.
+    :raises: socket.timeout if the running acquisition gave no frame in
+     time.
     """
-    screenshot = camera.capture_frame(gray=True, output_file=filename)
+    screenshot = None
+    if camera.acquiring:
+        # Take the newest frame of the continuous acquisition.
+        screenshot = camera.get_frame(timeout)
+        if screenshot is None and camera.acquiring:
+            raise socket.timeout("No frame acquired in {} s".format(
+                    timeout))
+        if screenshot is not None and filename:
+            misc.imsave(filename, screenshot)
+    if screenshot is None:
+        screenshot = camera.capture_frame(gray=True, output_file=filename)
     image = imgprocessing.Image(screenshot)
-    image.binarize(camera._params['red_thresholds'])
-    image.get_shapes()
+    image.binarize(camera._params['red_thresholds'], windows,
+                   camera._params['binarize_backend'])
+    image.get_shapes(windows=windows,
+                     backend=camera._params['shapes_backend'],
+                     fit=camera._params['shapes_fit'])
     return image
 
 
-def set_tracker(camera, image=None):
+def get_image_roi(camera, window, filename='', restore=True):
+    """Capture a region of a frame and process it.
+
+    Only the pixels inside the window are transferred from the FPGA. The
+    shapes found are moved to full frame coordinates, so they can be
+    used in the same way as the ones obtained by *get_image*.
+
+    :param camera: 
+    :type camera: VideoSensor() object
+    :param window: region of the frame, in image coordinates, as
+     [[min_row, min_col], [max_row, max_col]] (i.e. the format of the
+     *geometry.Triangle.window* attribute).
+    :type window: 2x2 numpy.array
+    :param str filename: path to the file where the captured region will
+     be stored (optional).
+    :param bool restore: if True, the full frame acquisition window is
+     restored after the capture.
+    :return: The image from the captured region after processing it.
+     Its triangles and contours are in full frame coordinates.
+    """
+    (min_row, min_col), (max_row, max_col) = np.asarray(window, dtype=int)
+    screenshot, offsets = camera.capture_roi(min_col, min_row,
+                                             max_col - min_col,
+                                             max_row - min_row,
+                                             restore=restore)
+    if filename:
+        misc.imsave(filename, screenshot)
+    image = imgprocessing.Image(screenshot)
+    image.binarize(camera._params['red_thresholds'],
+                   backend=camera._params['binarize_backend'])
+    image.get_shapes(backend=camera._params['shapes_backend'],
+                     fit=camera._params['shapes_fit'])
+    # Move the results from region to full frame coordinates.
+    image.contours = [contour + offsets for contour in image.contours]
+    image.triangles = [geometry.Triangle(triangle.vertices + offsets)
+                       for triangle in image.triangles]
+    return image
+
+
+def scan_arena(camera, factor=4, margin=8, min_area=4):
+    """Find the triangles with a coarse to fine search.
+
+    It is an alternative to *get_image* that transfers and processes
+    fewer pixels:
+
+    1. A decimated frame is captured, and the bright regions on it are
+       taken as candidates.
+    2. Only the regions around the candidates are captured at full
+       resolution, and the triangles are fitted on them.
+
+    The duration of each stage is logged and stored in the *timings*
+    attribute of the returned image.
+
+    :param camera: 
+    :type camera: VideoSensor() object
+    :param int factor: decimation factor of the first stage.
+    :param int margin: pixels added around each candidate region, in
+     full resolution.
+    :param int min_area: minimum size of a candidate, in pixels of the
+     decimated frame.
+    :return: Image object with the decimated frame. Its triangles and
+     contours are the ones found in the second stage, in full frame
+     coordinates.
+    :rtype: imgprocessing.Image
+    """
+    start_time = time.time()
+    frame = camera.capture_decimated(factor, restore=False)
+    coarse_image = imgprocessing.Image(frame)
+    blobs = coarse_image.get_blobs(camera._params['red_thresholds'],
+                                   min_area)
+    coarse_time = time.time()
+    # Ratio between the full frame and the decimated frame sizes.
+    ratio = np.array([float(camera._params['height']) / frame.shape[0],
+                      float(camera._params['width']) / frame.shape[1]])
+    try:
+        for blob in blobs:
+            window = np.array([np.floor(blob[0] * ratio) - margin,
+                               np.ceil(blob[1] * ratio) + margin])
+            region = get_image_roi(camera, window, restore=False)
+            coarse_image.triangles.extend(region.triangles)
+            coarse_image.contours.extend(region.contours)
+    finally:
+        camera.restore_window()
+    fine_time = time.time()
+    coarse_image.timings = {'coarse': coarse_time - start_time,
+                            'fine': fine_time - coarse_time}
+    logger.info("Arena scanned in {:.3f}s + {:.3f}s. {} candidates, {} "
+                "triangles".format(coarse_image.timings['coarse'],
+                                   coarse_image.timings['fine'], len(blobs),
+                                   len(coarse_image.triangles)))
+    return coarse_image
+
+
+def set_tracker(camera, image=None, scan=False):
     """Configure trackers according to detected triangles.
 
     :param camera: Instance of the VideoSensor() class, from whom the 
@@ -80,6 +203,8 @@ def set_tracker(camera, image=None):
      image. If the parameter is not present, an image will be captured
      from the camera.
     :type image: imgprocessing.Image() object
+    :param bool scan: if True and no image is passed, the triangles are
+     searched with *scan_arena* instead of *get_image*.
 
     :return: A frame captured and obtained from the FPGA; and a list
      with the information about the configured tracker whose first
@@ -89,22 +214,77 @@ def set_tracker(camera, image=None):
     """
     if image is None:
         # Get an Image object with triangle shapes in it already segregated.
-        tracker_image = get_image(camera)
+        if scan:
+            tracker_image = scan_arena(camera)
+        else:
+            tracker_image = get_image(camera)
     else:
         tracker_image = image
     tracker_position = []
     for index, triangle in enumerate(tracker_image.triangles):
         triangle.get_pose()
-        triangle.get_window(min_value=0, max_value=tracker_image.image.shape)
-        min_x = int(camera._scale * triangle.window[0, 1])
-        min_y = int(camera._scale * triangle.window[0, 0])
-        width = int(camera._scale * triangle.window[1, 1] - min_x)
-        height = int(camera._scale * triangle.window[1, 0] - min_y)
-        camera.configure_tracker(index + 1, min_x, min_y, width, height)
-        tracker_position = [index + 1, min_x, min_y, width, height]
+        # The window is limited to the full frame, as the image could be
+        # just a region of it.
+        triangle.get_window(min_value=0, max_value=(camera._params['height'],
+                                                    camera._params['width']))
+        tracker_position = [index + 1] + camera.set_tracker_window(
+                index + 1, triangle.window)
     return tracker_image, tracker_position
 
 
+def restore_trackers(camera, windows, tries=5, delay=0.02):
+    """Configure trackers with known windows and check they find the UGVs.
+
+    It is used for warm starts, with the windows of the previous
+    execution. The trackers whose window does not locate any shape after
+    the given tries are freed. The windows that are not 4 integers within
+    the sensor bounds (e.g. from a file saved with another
+    configuration) are skipped.
+
+    :param camera: 
+    :type camera: VideoSensor() object
+    :param dict windows: tracker windows [min_x, min_y, width, height],
+     in FPGA coordinates, indexed by the tracker id.
+    :param int tries: number of times the locations are read.
+    :param float delay: time between reads, in seconds.
+    :return: ids of the trackers that located a shape.
+    :rtype: list of str
+    """
+    # Bounds of the sensor, in FPGA coordinates.
+    width, height = camera._params['col_size'], camera._params['row_size']
+    valid = {}
+    for tracker_id, window in sorted(windows.items()):
+        try:
+            tracker = int(tracker_id)
+            min_x, min_y, size_x, size_y = window
+            bounds = [int(value) for value in window]
+        except (TypeError, ValueError):
+            logger.warn("Skipped tracker {} with invalid window {}".format(
+                    tracker_id, window))
+            continue
+        if (any(bound != value for bound, value in zip(bounds, window))
+                or min(bounds) < 0 or size_x == 0 or size_y == 0
+                or min_x + size_x > width or min_y + size_y > height):
+            logger.warn("Skipped tracker {} with window {} out of the {}x{} "
+                        "sensor".format(tracker_id, window, width, height))
+            continue
+        camera.configure_tracker(tracker, *bounds)
+        valid[str(tracker_id)] = bounds
+    windows = valid
+    found = []
+    for _ in range(tries):
+        locations = camera.get_locations()
+        found = [str(key) for key in windows if str(key) in locations]
+        if len(found) == len(windows):
+            break
+        time.sleep(delay)
+    for tracker_id in windows:
+        if str(tracker_id) not in found:
+            camera.set_register('FREE_TRACKER', str(tracker_id))
+    logger.debug("Restored trackers {} of {}".format(found, windows.keys()))
+    return found
+
+
 class VideoSensor(object):
     """This class contains methods for dealing with FPGA-camera system.
 
@@ -131,6 +311,22 @@ class VideoSensor(object):
                   'exposure',
                   'skip',
                   'output')
+    # Configuration registers, whose values are kept in the shadow copy.
+    SHADOW_REGISTERS = ('RED_THRESHOLD',
+                        'GREEN_THRESHOLD',
+                        'BLUE_THRESHOLD',
+                        'IMAGE_SHAPE',
+                        'IMAGE_EXPOSURE',
+                        'START_INDEXES',
+                        'SYSTEM_SHAPE',
+                        'SYSTEM_MODES',
+                        'SYSTEM_OUTPUT')
+    # Registers that are only applied after a 'CONFIGURE_CAMERA' command.
+    GEOMETRY_REGISTERS = ('IMAGE_SHAPE',
+                          'IMAGE_EXPOSURE',
+                          'START_INDEXES',
+                          'SYSTEM_SHAPE',
+                          'SYSTEM_MODES')
 
     def __init__(self, filename='', scale=2.0):
         """
@@ -142,12 +338,30 @@ class VideoSensor(object):
         self._port = None
         self._scale = scale
         self._H = None
+        # Inverse of the homography matrix, for the inverse projections.
+        self._H_inv = None
         self._limits = None
         # Dictionary variable where camera parameters are stored.
         self._params = {}
         # The Client class handles the TCP/IP connection to the device.
-        self._client = Client()
+        self._client = self._new_client()
         self._connected = False
+        # Reusable reception buffers for the captured frames, indexed by
+        # the image command. They are (re)allocated on demand.
+        self._frame_buffers = {}
+        # Decoders of the tracker registers replies.
+        self._locations_decoder = TrackerDecoder(columns=2, rows=8)
+        self._windows_decoder = TrackerDecoder(columns=None, rows=4)
+        # Shadow copy of the FPGA configuration registers, with their
+        # values formatted as they are written. It is filled on connection.
+        self._shadow = {}
+        # True when geometry registers were written after the last
+        # 'CONFIGURE_CAMERA' command.
+        self._configure_pending = False
+        # Background producer of the continuous acquisition mode.
+        self._grabber = None
+        # Session recorder, when the captured data is being recorded.
+        self._recorder = None
         # Instantiate a configuration class and read input filename.
         self.conf = ConfigParser.RawConfigParser()
         self.read_conffile(filename)
@@ -155,6 +369,10 @@ class VideoSensor(object):
         if self.conf.sections():
             self.connect_client()
 
+    def _new_client(self):
+        """Return the client of the TCP/IP link with the FPGA."""
+        return Client()
+
     def connect_client(self):
         """Read TCP/IP parameters in config file and connect to the device. """
         # The IP and PORT parameters are stored in the config file.
@@ -171,6 +389,41 @@ class VideoSensor(object):
             self._connected = True
         except socket.timeout:
             logger.warn('Unable to connect to port. Timeout')
+            return
+        self.read_shadow()
+
+    def read_shadow(self):
+        """Fill the shadow copy of the registers from the FPGA.
+
+        All the SHADOW_REGISTERS are read in a single round trip. The
+        registers without a valid reply are left out of the copy, so
+        they will always be written.
+
+        :return: shadow copy, with the register names as keys and the
+         values in the format they are written to the FPGA.
+        :rtype: dict
+        """
+        values = self.get_registers(self.SHADOW_REGISTERS)
+        return self._load_shadow(values)
+
+    def _load_shadow(self, values):
+        """Fill the shadow copy with the values of the SHADOW_REGISTERS.
+
+        :param list values: contents of the registers, in the order of
+         SHADOW_REGISTERS, as returned by a register read.
+        :return: shadow copy.
+        :rtype: dict
+        """
+        self._shadow = {}
+        for register, value in zip(self.SHADOW_REGISTERS, values):
+            # Lists are formatted in the same way as tuples.
+            if type(value) is list:
+                value = tuple(value)
+            if type(value) not in (str, int, tuple):
+                logger.debug("{} register is not cached".format(register))
+                continue
+            self._shadow[register] = self._format_value(value)
+        return self._shadow
 
     def disconnect_client(self):
         """Close TCP/IP connection with the device.
@@ -181,9 +434,12 @@ class VideoSensor(object):
         if not self._connected:
             logger.warn('Cannot disconnect, as it was not connected.')
             return
+        self.stop_acquisition()
+        self.stop_recording()
         self.set_register('SYSTEM_OUTPUT', 0)
         self._client.close_connection()
         self._connected = False
+        self._shadow = {}
 
     def load_configuration(self, write2fpga=True):
         """Load the config file and send the configuration to the FPGA.
@@ -191,8 +447,10 @@ class VideoSensor(object):
         * Read camera and sensor parameters in self.filename. They are 
           then stored in the self._params variable. 
         * If write2fpga flag is True, write parameters in the FPGA 
-          registers by calling set_register() method. Finally, send 
-          'CONFIGURE_CAMERA' command to FPGA.
+          registers by calling set_register() method. Only the registers
+          whose value differs from the shadow copy are written. Finally,
+          send 'CONFIGURE_CAMERA' command to FPGA if any geometry
+          register changed.
         """
         # Check that the filename is correct
         if not self.conf.sections():
@@ -205,6 +463,19 @@ class VideoSensor(object):
                 self.conf.get('Sensor', 'green_thresholds'))
         self._params['blue_thresholds'] = ast.literal_eval(
                 self.conf.get('Sensor', 'blue_thresholds'))
+        # Implementation of the image binarization. See imgprocessing.
+        self._params['binarize_backend'] = 'skimage'
+        if self.conf.has_option('Sensor', 'binarize_backend'):
+            self._params['binarize_backend'] = self.conf.get(
+                    'Sensor', 'binarize_backend')
+        # Implementation of the shapes extraction. See imgprocessing.
+        self._params['shapes_backend'] = 'skimage'
+        if self.conf.has_option('Sensor', 'shapes_backend'):
+            self._params['shapes_backend'] = self.conf.get(
+                    'Sensor', 'shapes_backend')
+        self._params['shapes_fit'] = 'polygon'
+        if self.conf.has_option('Sensor', 'shapes_fit'):
+            self._params['shapes_fit'] = self.conf.get('Sensor', 'shapes_fit')
         # Camera acquisition geometry parameters
         self._params['width'] = self.conf.getint('Camera', 'width')
         self._params['height'] = self.conf.getint('Camera', 'height')
@@ -227,29 +498,53 @@ class VideoSensor(object):
             return
         # --------------------------------------------------------------#
         # Write to the FPGA registers the loaded configuration.
-        # SENSOR COLOR THRESHOLDS
-        # They must be of string type.
-        self.set_register('RED_THRESHOLD', self._params['red_thresholds'])
-        self.set_register('GREEN_THRESHOLD', self._params['green_thresholds'])
-        self.set_register('BLUE_THRESHOLD', self._params['blue_thresholds'])
-
-        # CAMERA GEOMETRY PARAMETERS
-        # They must be string type.
-        self.set_register('IMAGE_SHAPE', (self._params['width'],
-                                          self._params['height']))
-        self.set_register('IMAGE_EXPOSURE', self._params['exposure'])
-        # Ignore initial rows and columns, as they contain useless pixels.
-        self.set_register('START_INDEXES', (self._params['start_col'],
-                                            self._params['start_row']))
-        self.set_register('SYSTEM_SHAPE', (self._params['col_size'],
-                                           self._params['row_size']))
-        self.set_register('SYSTEM_MODES', (self._params['col_mode'],
-                                           self._params['row_mode']))
-        self.set_register('SYSTEM_OUTPUT', self._params['output'])
-        # Send the configuration command to the FPGA
+        # All the registers are written in a single round trip.
+        self.set_registers(self.get_configuration_registers())
+        # Send the configuration command to the FPGA, if needed.
+        self.configure_camera()
+
+    def get_configuration_registers(self):
+        """Return the register values of the loaded configuration.
+
+        :return: pairs of register names and values, in writing order.
+        :rtype: list of (str, value)
+        """
+        return [
+            # SENSOR COLOR THRESHOLDS
+            ('RED_THRESHOLD', self._params['red_thresholds']),
+            ('GREEN_THRESHOLD', self._params['green_thresholds']),
+            ('BLUE_THRESHOLD', self._params['blue_thresholds']),
+            # CAMERA GEOMETRY PARAMETERS
+            ('IMAGE_SHAPE', (self._params['width'], self._params['height'])),
+            ('IMAGE_EXPOSURE', self._params['exposure']),
+            # Ignore initial rows and columns, as they contain useless pixels.
+            ('START_INDEXES', (self._params['start_col'],
+                               self._params['start_row'])),
+            ('SYSTEM_SHAPE', (self._params['col_size'],
+                              self._params['row_size'])),
+            ('SYSTEM_MODES', (self._params['col_mode'],
+                              self._params['row_mode'])),
+            ('SYSTEM_OUTPUT', self._params['output']),
+        ]
+
+    def configure_camera(self, force=False):
+        """Send the 'CONFIGURE_CAMERA' command to the FPGA.
+
+        The command is only sent if any of the GEOMETRY_REGISTERS was
+        written since the last time it was sent.
+
+        :param bool force: if True, the command is always sent.
+        :return: message obtained back from the FPGA, or None if the
+         command was not needed.
+        """
+        if not (force or self._configure_pending):
+            logger.debug("Geometry unchanged. 'CONFIGURE_CAMERA' not sent")
+            return None
         conf = self._client.write_command('CONFIGURE_CAMERA', True)
+        self._configure_pending = False
         logger.debug(repr("Obtained '{}' "
                           "after 'CONFIGURE_CAMERA'".format(conf)))
+        return conf
 
     def read_conffile(self, filename):
         """Look for a configuration file on the given path and read it."""
@@ -269,6 +564,7 @@ class VideoSensor(object):
         tuple_format = ','.join(raw_H.split('\n'))
         array_format = ast.literal_eval(tuple_format)
         self._H = np.array(array_format)
+        self._H_inv = np.linalg.inv(self._H)
         return self._H
 
     def get_limits_array(self):
@@ -324,12 +620,81 @@ class VideoSensor(object):
          can be found on the documentation of the *client.Client* class.
         :return: the data stored in the indicated register.
         """
-        value = self._client.read_register(register)
+        value = ast.literal_eval(self._read_raw_register(register))
         return value
 
-    def set_register(self, register, value):
+    def _read_raw_register(self, register):
+        """Read the reply of a register as received, and record it."""
+        payload = self._client.read_register(register, raw=True)
+        if self._recorder is not None:
+            self._recorder.add_register(register, payload)
+        return payload
+
+    def start_recording(self, filename):
+        """Record the captured frames and register reads in a file.
+
+        The frames obtained with *capture_frame*, *capture_roi*,
+        *capture_decimated* and *FrameGrabber*, and the replies read by
+        *get_register*, *get_locations* and *get_windows* are appended
+        to a session file, that can be played with *ReplayVideoSensor*.
+        The region and decimated frames are recorded with the *_ROI*
+        and *_DECIMATED* suffixes appended to their image command.
+
+        :param str filename: path of the session file.
+        """
+        self.stop_recording()
+        conf_text = None
+        if self.filename:
+            with open(self.filename) as conf_file:
+                conf_text = conf_file.read()
+        self._recorder = recording.SessionRecorder(filename, conf_text)
+
+    def _record_frame(self, command, image):
+        """Append a captured frame to the session, if it is recorded."""
+        if self._recorder is not None:
+            self._recorder.add_frame(command, image)
+
+    def stop_recording(self):
+        """Stop recording the session, if it was being recorded."""
+        if self._recorder is None:
+            return
+        self._recorder.close()
+        self._recorder = None
+
+    def start_tracing(self, capacity=65536):
+        """Time every operation performed on the FPGA link.
+
+        :param int capacity: number of events kept in memory.
+        :return: the tracer collecting the events and statistics.
+        :rtype: tracer.ProtocolTracer
+        """
+        self._client.tracer = tracer.ProtocolTracer(capacity)
+        return self._client.tracer
+
+    def stop_tracing(self, filename=''):
+        """Stop timing the link operations and log their statistics.
+
+        :param str filename: path of the trace file where the events are
+         dumped. If empty, they are not dumped.
+        :return: the tracer with the collected events, or None if the
+         link was not being traced.
+        :rtype: tracer.ProtocolTracer or None
+        """
+        link_tracer = self._client.tracer
+        if link_tracer is None:
+            return None
+        self._client.tracer = None
+        link_tracer.log_statistics()
+        if filename:
+            link_tracer.dump(filename)
+        return link_tracer
+
+    def set_register(self, register, value, force=False):
         """Write a value into an FPGA register.
 
+        If the register is in the shadow copy and already holds the
+        value, nothing is sent to the FPGA.
+
         :param str register: key identifier of valid register name of 
          the FPGA. The full list of valid keys and their associated name
          can be found on the documentation of the *client.Client* class.
@@ -338,8 +703,10 @@ class VideoSensor(object):
          be converted. For tuples or lists, brackets or parenthesis are
          not allowed, so they have to be eliminated.
         :type value: int or tuple/list   
+        :param bool force: if True, the value is written even if it is
+         equal to the one in the shadow copy.
         :return: message obtained back from the FPGA after writing into 
-         the register. 
+         the register, or None if the write was skipped.
 
         :examples:
         
@@ -348,6 +715,134 @@ class VideoSensor(object):
            * sent_value = '(3.45, 2.21)' ---> No OK
            * sent_value = '3.45, 2.21' ---> OK
         """
+        formatted_value = self._format_value(value)
+        if not force and self._shadow.get(register) == formatted_value:
+            logger.debug("{} register unchanged. Write skipped.".format(
+                    register))
+            return None
+        message = self._client.write_register(register, formatted_value)
+        logger.debug("Obtained '{}' after writing {} on {} register.".format(
+                message, formatted_value, register))
+        self._update_shadow(register, formatted_value, message)
+        return message
+
+    def get_locations(self):
+        """Read the contour points of every active tracker.
+
+        The *ACTUAL_LOCATION* reply is parsed with a *TrackerDecoder*
+        instead of being evaluated as a Python literal. The returned
+        arrays are reused by the next call.
+
+        :return: dictionary whose keys are the tracker ids and whose
+         values are Nx2 arrays with the [x, y] coordinates of the
+         contour points. If the reply is malformed, an empty dictionary
+         is returned.
+        :rtype: dict
+        """
+        payload = self._read_raw_register('ACTUAL_LOCATION')
+        locations = self._locations_decoder.decode(payload)
+        return locations or {}
+
+    def get_windows(self):
+        """Read the windows of every active tracker.
+
+        :return: dictionary whose keys are the tracker ids and whose
+         values are 1-D arrays with the window parameters. If the reply
+         is malformed, an empty dictionary is returned.
+        :rtype: dict
+        """
+        payload = self._read_raw_register('ACTIVE_WINDOWS')
+        windows = self._windows_decoder.decode(payload)
+        return windows or {}
+
+    def get_registers(self, registers):
+        """Read the content of several registers in a single round trip.
+
+        :param registers: key identifiers of valid register names of the
+         FPGA.
+        :type registers: iterable of str
+        :return: the data stored in the indicated registers, in the same
+         order.
+        :rtype: list
+        """
+        values = self._client.read_registers(registers)
+        return values
+
+    def set_registers(self, values, force=False):
+        """Write several FPGA registers in a single round trip.
+
+        The values are formatted in the same way as in *set_register*,
+        and the registers that already hold their value in the shadow
+        copy are not written.
+
+        :param values: pairs of key identifiers of valid register names
+         and the values that will be written on them, in writing order.
+        :type values: iterable of (str, value) pairs
+        :param bool force: if True, all the values are written.
+        :return: messages obtained back from the FPGA after writing into
+         each register. None for the skipped writes.
+        :rtype: list
+        """
+        formatted, changed = self._filter_writes(values, force)
+        pending = [pair for pair, write in zip(formatted, changed) if write]
+        replies = self._client.write_registers(pending) if pending else []
+        return self._apply_writes(formatted, changed, replies)
+
+    def _filter_writes(self, values, force=False):
+        """Format register values and compare them with the shadow copy.
+
+        :return: the formatted (register, value) pairs, and flags set to
+         True for the ones that have to be written.
+        :rtype: list, list of bool
+        """
+        formatted = [(register, self._format_value(value))
+                     for register, value in values]
+        changed = [force or self._shadow.get(register) != value
+                   for register, value in formatted]
+        return formatted, changed
+
+    def _apply_writes(self, formatted, changed, replies):
+        """Update the shadow copy with the replies of the writes.
+
+        :param list formatted: pairs returned by *_filter_writes*.
+        :param list changed: flags returned by *_filter_writes*.
+        :param list replies: messages of the written registers, in order.
+        :return: messages for every pair. None for the skipped writes.
+        :rtype: list
+        """
+        replies = iter(replies)
+        messages = []
+        for (register, value), write in zip(formatted, changed):
+            if not write:
+                logger.debug("{} register unchanged. Write skipped.".format(
+                        register))
+                messages.append(None)
+                continue
+            message = next(replies)
+            logger.debug("Obtained '{}' after writing {} on {} register."
+                         "".format(message, value, register))
+            self._update_shadow(register, value, message)
+            messages.append(message)
+        return messages
+
+    def _update_shadow(self, register, value, message):
+        """Keep the shadow copy in sync after writing a register."""
+        if register in self.GEOMETRY_REGISTERS:
+            self._configure_pending = True
+        if register not in self.SHADOW_REGISTERS:
+            return
+        if message == "EMPTY BUFFER":
+            # The write was not acknowledged, so the value is unknown.
+            self._shadow.pop(register, None)
+        else:
+            self._shadow[register] = value
+
+    @staticmethod
+    def _format_value(value):
+        """Convert a register value to the string format of the FPGA.
+
+        See *set_register* for the allowed value types.
+        """
         # int values are directly converted to string variables.
         if type(value) in (str, int):
             formatted_value = str(value)
@@ -361,10 +856,8 @@ class VideoSensor(object):
                 formatted_value = "{},{}".format(formatted_value, item)
         else:
             logger.warn("Not valid value type for {}".format(value))
-        message = self._client.write_register(register, formatted_value)
-        logger.debug("Obtained '{}' after writing {} on {} register.".format(
-                message, formatted_value, register))
-        return message
+            raise TypeError("Not valid value type for {}".format(value))
+        return formatted_value
 
     def configure_tracker(self, tracker_id, min_x, min_y, width, height):
         """Send to FPGA rectangle parameters for defining a tracker.
@@ -388,9 +881,238 @@ class VideoSensor(object):
         self.set_register('SET_WINDOW', '{},{},{},{},{}'.format(
                 tracker_id, min_x, min_y, width, height))
 
+    def set_tracker_window(self, tracker_id, window):
+        """Configure a tracker with a window in image coordinates.
+
+        :param int tracker_id: identifier of the tracker.
+        :param window: window in image coordinates, in the form
+         [[min_row, min_col], [max_row, max_col]] (i.e. the format of the
+         *geometry.Triangle.window* attribute).
+        :type window: 2x2 numpy.array
+        :return: the window parameters sent to the FPGA i.e. [min_x,
+         min_y, width, height] in FPGA coordinates.
+        :rtype: list
+        """
+        min_x = int(self._scale * window[0, 1])
+        min_y = int(self._scale * window[0, 0])
+        width = int(self._scale * window[1, 1] - min_x)
+        height = int(self._scale * window[1, 0] - min_y)
+        self.configure_tracker(tracker_id, min_x, min_y, width, height)
+        return [min_x, min_y, width, height]
+
+    def get_frame_buffer(self, command, size):
+        """Return the reusable reception buffer for the given command.
+
+        A new *bytearray* is only allocated the first time a command is
+        used or if the size of the requested image changed.
+
+        :param str command: image request command i.e. 'GET_GRAY_IMAGE'
+         or 'GET_COLOR_IMAGE'.
+        :param int size: number of bytes of the image.
+        :rtype: bytearray
+        """
+        buffer = self._frame_buffers.get(command)
+        if buffer is None or len(buffer) != size:
+            logger.debug("Allocating a {} bytes buffer for '{}'".format(
+                    size, command))
+            buffer = bytearray(size)
+            self._frame_buffers[command] = buffer
+        return buffer
+
+    def get_frame_format(self, gray=True):
+        """Return the image command and the shape of the frames.
+
+        :param bool gray: if true, the gray-scale image format is
+         returned. If false, the RGB one.
+        :return: image request command and shape of the image array.
+        :rtype: str, tuple
+        """
+        if gray:
+            return 'GET_GRAY_IMAGE', (self._params['height'],
+                                      self._params['width'])
+        return 'GET_COLOR_IMAGE', (self._params['height'],
+                                   self._params['width'], 3)
+
+    def capture_roi(self, x, y, width, height, gray=True, tries=20,
+                    restore=True):
+        """Capture and download only a region of the frame.
+
+        The acquisition window registers (*START_INDEXES*, *SYSTEM_SHAPE*
+        and *IMAGE_SHAPE*) are reprogrammed for covering only the region,
+        keeping the same pixel size as the full frame. Afterwards, the
+        full frame window is restored.
+
+        The FPGA trackers work on the acquired image, so the region
+        should not be captured while they are in use.
+
+        :param int x: first column of the region, in image coordinates.
+        :param int y: first row of the region, in image coordinates.
+        :param int width: number of columns of the region.
+        :param int height: number of rows of the region.
+        :param bool gray: if true, a gray-scale image will be
+         requested. If false, the requested image will be RGB.
+        :param int tries: number of times that the capture reply is
+         polled.
+        :param bool restore: if True, the full frame window is written
+         back after the capture. Set it to False for capturing the same
+         region several times, and call *restore_window* at the end.
+        :return: image of the region, that is a view over a reusable
+         buffer, and [row, col] offsets of the region in the full frame.
+         The region is clipped to the full frame limits.
+        :rtype: numpy.array, list
+        :raises: socket.timeout if the FPGA did not capture a frame.
+        """
+        full_width = self._params['width']
+        full_height = self._params['height']
+        x = int(np.clip(x, 0, full_width - 1))
+        y = int(np.clip(y, 0, full_height - 1))
+        width = int(min(width, full_width - x))
+        height = int(min(height, full_height - y))
+        if width <= 0 or height <= 0:
+            raise ValueError("Empty region: {}x{}".format(width, height))
+        # Sensor pixels per image pixel, in each axis.
+        col_ratio = float(self._params['col_size']) / full_width
+        row_ratio = float(self._params['row_size']) / full_height
+        self.set_registers([
+            ('START_INDEXES',
+             (self._params['start_col'] + int(round(x * col_ratio)),
+              self._params['start_row'] + int(round(y * row_ratio)))),
+            ('SYSTEM_SHAPE', (int(round(width * col_ratio)),
+                              int(round(height * row_ratio)))),
+            ('IMAGE_SHAPE', (width, height)),
+            ('SYSTEM_MODES', (self._params['col_mode'],
+                              self._params['row_mode'])),
+        ])
+        self.configure_camera()
+        try:
+            image = self._capture_window('ROI', width, height, gray, tries)
+        finally:
+            if restore:
+                self.restore_window()
+        return image, [y, x]
+
+    def capture_decimated(self, factor=4, gray=True, tries=20,
+                          restore=True):
+        """Capture the full frame at a lower resolution.
+
+        The skip factors in *SYSTEM_MODES* are multiplied by *factor*,
+        and *IMAGE_SHAPE* is divided by it. The sensor skip mode value
+        is the number of skipped pixels minus 1, and it has to be
+        supported by the sensor e.g. factors that are powers of 2.
+
+        :param int factor: decimation factor on each axis.
+        :param bool gray: if true, a gray-scale image will be
+         requested. If false, the requested image will be RGB.
+        :param int tries: number of times that the capture reply is
+         polled.
+        :param bool restore: if True, the full resolution is written back
+         after the capture.
+        :return: decimated image, that is a view over a reusable buffer.
+        :rtype: numpy.array
+        :raises: socket.timeout if the FPGA did not capture a frame.
+        """
+        width = self._params['width'] // factor
+        height = self._params['height'] // factor
+        self.set_registers([
+            ('START_INDEXES', (self._params['start_col'],
+                               self._params['start_row'])),
+            ('SYSTEM_SHAPE', (self._params['col_size'],
+                              self._params['row_size'])),
+            ('IMAGE_SHAPE', (width, height)),
+            ('SYSTEM_MODES', ((self._params['col_mode'] + 1) * factor - 1,
+                              (self._params['row_mode'] + 1) * factor - 1)),
+        ])
+        self.configure_camera()
+        try:
+            image = self._capture_window('DECIMATED', width, height, gray,
+                                         tries)
+        finally:
+            if restore:
+                self.restore_window()
+        return image
+
+    def _capture_window(self, mode, width, height, gray, tries):
+        """Capture a frame with the programmed window and image shape.
+
+        Each *mode* label has its own reusable buffers, separated from
+        the full frame ones.
+        """
+        if not self.trigger_frame(tries):
+            raise socket.timeout("No frame captured after {} tries".format(
+                    tries))
+        command, _ = self.get_frame_format(gray)
+        if gray:
+            shape = (height, width)
+        else:
+            shape = (height, width, 3)
+        key = '{}_{}'.format(command, mode)
+        buffer = self.get_frame_buffer(key, int(np.prod(shape)))
+        if self.download_frame(command, buffer) < len(buffer):
+            raise socket.timeout("Incomplete {} frame transfer".format(mode))
+        image = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+        self._record_frame(key, image)
+        return image
+
+    def restore_window(self):
+        """Write back the full frame acquisition window registers."""
+        self.set_registers([
+            ('START_INDEXES', (self._params['start_col'],
+                               self._params['start_row'])),
+            ('SYSTEM_SHAPE', (self._params['col_size'],
+                              self._params['row_size'])),
+            ('IMAGE_SHAPE', (self._params['width'], self._params['height'])),
+            ('SYSTEM_MODES', (self._params['col_mode'],
+                              self._params['row_mode'])),
+        ])
+        self.configure_camera()
+
+    def trigger_frame(self, tries=20):
+        """Request the FPGA to capture a new frame and wait for it.
+
+        :param int tries: number of times that the reply will be polled.
+        :return: True if the FPGA replied that the frame was captured.
+        :rtype: bool
+        """
+        # Request a frame capture to the socket client
+        message = self._client.write_command('GET_NEW_FRAME', True)
+        remaining = tries
+        while message != "Image captured.\n":
+            if not remaining:
+                return False
+            remaining -= 1
+            # None means that the FPGA buffer is empty after a timeout. If
+            # this happens, it will try to read the buffer again.
+            message = self._client.read_message()
+        logger.debug(repr("'{}' after {} tries.".format(
+                message, tries - remaining)))
+        return True
+
+    def download_frame(self, command, buffer):
+        """Download the last captured frame into the given buffer.
+
+        :param str command: image request command i.e. 'GET_GRAY_IMAGE'
+         or 'GET_COLOR_IMAGE'.
+        :param bytearray buffer: reception buffer, with exactly the size
+         of the image.
+        :return: number of received bytes. It is smaller than the buffer
+         size if the transfer timed out.
+        :rtype: int
+        """
+        nbytes = self._client.read_command_data(command, buffer, len(buffer))
+        if nbytes < len(buffer):
+            logger.warn("Received {} of {} image bytes".format(
+                    nbytes, len(buffer)))
+        return nbytes
+
     def capture_frame(self, gray=True, tries=20, output_file=''):
         """This method requests a frame to the FPGA.
 
+        The image data is received directly into a preallocated buffer
+        that is reused on every call. Thus, the returned array is a view
+        over that buffer, and its contents will be overwritten by the
+        next frame captured with the same color mode. Copy it if it has
+        to be kept.
+
         :param bool gray: if true, a gray-scale image will be
          requested. If false, the requested image will be RGB.
         :param int tries: number of times that the system will try to 
@@ -404,36 +1126,320 @@ class VideoSensor(object):
          will be 1, and 3 for False (representing color images). dim
          equals to the number of components per pixel.
         :rtype: MxNxdim numpy.array
+        :raises: socket.timeout if the image was not completely received.
+         The reused buffer would contain the tail of the previous frame.
         """
-        # Request a frame capture to the socket client
-        message = self._client.write_command('GET_NEW_FRAME', True)
-        while message != "Image captured.\n":
-            if not tries:
-                logger.warn("Stop waiting for a frame after 20 tries")
-                sys.exit()
-            tries -= 1
-            # Timeout error means that the FPGA buffer is empty. If this
-            # happens, it will try to read the buffer again.
-            try:
-                message = self._client.recv(self._client.buffer_size)
-            except socket.timeout:
-                pass
-        logger.debug(repr("'{}' after {} tries.".format(message, 20 - tries)))
-        # Set dim (dimensions) to the number of components per pixel.
-        if gray:
-            command = 'GET_GRAY_IMAGE'
-            dim = 1
-            shape = (self._params['height'], self._params['width'])
-        else:
-            command = 'GET_COLOR_IMAGE'
-            dim = 3
-            shape = (self._params['height'], self._params['width'], dim)
-        self._client.write_command(command)
-        logger.debug("'{}' command sent.".format(command))
-        # SIZE = Width x Height x Dimensions
-        img_size = self._params['width'] * self._params['height'] * dim
-        data = self._client.read_data(img_size)
-        image = pylab.fromstring(data, dtype=pylab.uint8).reshape(shape)
+        if not self.trigger_frame(tries):
+            logger.warn("Stop waiting for a frame after {} tries".format(
+                    tries))
+            sys.exit()
+        command, shape = self.get_frame_format(gray)
+        buffer = self.get_frame_buffer(command, int(np.prod(shape)))
+        if self.download_frame(command, buffer) < len(buffer):
+            raise socket.timeout("Incomplete frame transfer")
+        image = np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+        self._record_frame(command, image)
+        if output_file:
+            misc.imsave(output_file, image)
+        return image
+
+    @property
+    def acquiring(self):
+        """True while the continuous acquisition mode is running."""
+        return self._grabber is not None and self._grabber.is_alive()
+
+    def start_acquisition(self, gray=True, buffers=3):
+        """Start capturing frames continuously on a background thread.
+
+        A *FrameGrabber* thread requests and downloads the next frame
+        while the current one is processed. The frames are obtained with
+        *get_frame*. While the acquisition is running, the connection is
+        used by that thread, so no other FPGA access can be done until
+        *stop_acquisition* is called.
+
+        :param bool gray: if true, gray-scale images are captured.
+        :param int buffers: number of frame buffers in the ring.
+        :return: the running grabber thread.
+        :rtype: FrameGrabber
+        """
+        self.stop_acquisition()
+        self._grabber = FrameGrabber(self, gray=gray, buffers=buffers)
+        self._grabber.start()
+        return self._grabber
+
+    def stop_acquisition(self):
+        """Stop the continuous acquisition mode, if it was running."""
+        if self._grabber is None:
+            return
+        self._grabber.stop()
+        self._grabber = None
+
+    def get_frame(self, timeout=None):
+        """Return the newest frame of the continuous acquisition.
+
+        The returned array is a view over a buffer of the grabber ring,
+        that is held until the next call. Copy it if it has to be kept
+        for longer.
+
+        :param timeout: maximum time to wait for a new frame, in
+         seconds. If None, wait until it is available.
+        :type timeout: int, float or None
+        :return: the image array, or None after a timeout or if the
+         acquisition stopped.
+        :rtype: MxNxdim numpy.array or None
+        """
+        if self._grabber is None:
+            raise RuntimeError("The continuous acquisition is not running")
+        _, frame = self._grabber.get_frame(timeout)
+        return frame
+
+
+class ReplayVideoSensor(VideoSensor):
+    """VideoSensor that plays a session recorded by *start_recording*.
+
+    It has the same interface as *VideoSensor*, but the frames and the
+    register replies are read from the session file, in the recorded
+    order. The register writes are ignored. The configuration is the one
+    stored in the session.
+
+    :param str filename: path of the session file.
+    :param bool realtime: if True, each record is served at the same
+     time offset as it was recorded. If False, as fast as possible.
+    :param float scale: scale ratio of the camera. See *VideoSensor*.
+    """
+
+    def __init__(self, filename, realtime=False, scale=2.0):
+        VideoSensor.__init__(self, scale=scale)
+        self.session = recording.SessionReader(filename)
+        self.realtime = realtime
+        conf_text = self.session.get_config()
+        if conf_text is None:
+            raise ValueError("No configuration in {}".format(filename))
+        self.conf.readfp(StringIO.StringIO(conf_text))
+        self.filename = filename
+        self.load_configuration(write2fpga=False)
+        # Pending records for each frame command and register name.
+        self._pending = {}
+        for record in self.session.records:
+            kind, _, metadata, _, _ = record
+            if kind == recording.FRAME:
+                key = metadata['command']
+            elif kind == recording.REGISTER:
+                key = metadata['register']
+            else:
+                continue
+            self._pending.setdefault(key, collections.deque()).append(record)
+        # Recording and replay times of the first served record.
+        self._origin = None
+        self._connected = True
+
+    def _next_record(self, key):
+        """Return the next record of a command or register.
+
+        :raises: EOFError if there are no more records of that type.
+        """
+        records = self._pending.get(key)
+        if not records:
+            raise EOFError("No more {} records in {}".format(key,
+                                                            self.filename))
+        record = records.popleft()
+        timestamp = record[1]
+        if self._origin is None:
+            self._origin = (timestamp, time.time())
+        if self.realtime:
+            delay = (timestamp - self._origin[0]
+                     - (time.time() - self._origin[1]))
+            if delay > 0:
+                time.sleep(delay)
+        return record
+
+    def _new_client(self):
+        """No TCP/IP link is needed for replaying a session."""
+        return None
+
+    def connect_client(self):
+        """Nothing to connect to. The session is read from its file."""
+        self._connected = True
+
+    def disconnect_client(self):
+        """Stop the replay."""
+        self._connected = False
+
+    def _read_raw_register(self, register):
+        """Return the next recorded reply of the register."""
+        return self.session.get_payload(self._next_record(register))
+
+    def get_registers(self, registers):
+        """Return the next recorded values of several registers."""
+        return [self.get_register(register) for register in registers]
+
+    def set_register(self, register, value, force=False):
+        """Ignore the register write, as the replay can not change it."""
+        logger.debug("Replay: ignored write of {} on {} register".format(
+                value, register))
+        return None
+
+    def set_registers(self, values, force=False):
+        """Ignore the register writes, as the replay can not change them."""
+        return [self.set_register(register, value)
+                for register, value in values]
+
+    def configure_camera(self, force=False):
+        """Nothing to configure in a replay."""
+        return None
+
+    def start_tracing(self, capacity=65536):
+        """Nothing to trace, as there is no link in a replay."""
+        return None
+
+    def stop_tracing(self, filename=''):
+        """Nothing to trace, as there is no link in a replay."""
+        return None
+
+    def _capture_window(self, mode, width, height, gray, tries):
+        """Return the next recorded region or decimated frame.
+
+        It replays the frames of *capture_roi* and *capture_decimated*,
+        whose register writes are ignored.
+
+        :raises: EOFError at the end of the recorded frames.
+        """
+        command, _ = self.get_frame_format(gray)
+        key = '{}_{}'.format(command, mode)
+        return self.session.get_frame(self._next_record(key))
+
+    def capture_frame(self, gray=True, tries=20, output_file=''):
+        """Return the next recorded frame of the requested color mode.
+
+        :return: image array, that is a read-only view over the session
+         file.
+        :rtype: MxNxdim numpy.array
+        :raises: EOFError at the end of the recorded frames.
+        """
+        command, _ = self.get_frame_format(gray)
+        image = self.session.get_frame(self._next_record(command))
         if output_file:
             misc.imsave(output_file, image)
         return image
+
+
+class FrameGrabber(threading.Thread):
+    """Child class of threading.Thread for continuous frame acquisition.
+
+    The thread keeps capturing frames into a ring of preallocated
+    buffers, so that the next frame is transferred while the consumer
+    processes the current one. The consumer always gets the newest
+    frame, and the frames that were not consumed in time are dropped.
+
+    The buffer of the newest frame and the one held by the consumer are
+    never overwritten. Hence, with 3 buffers the producer never waits,
+    and with 2 buffers it waits until the consumer releases its frame.
+
+    :param camera: connected camera whose frames are captured.
+    :type camera: VideoSensor() object
+    :param bool gray: if true, gray-scale images are captured.
+    :param int buffers: number of frame buffers in the ring. At least 2.
+    :param int tries: number of times that the capture reply is polled.
+    """
+
+    def __init__(self, camera, gray=True, buffers=3, tries=20):
+        threading.Thread.__init__(self, name='FrameGrabber')
+        self.daemon = True
+        if buffers < 2:
+            raise ValueError("At least 2 frame buffers are needed")
+        self.camera = camera
+        self.tries = tries
+        self._command, shape = camera.get_frame_format(gray)
+        size = int(np.prod(shape))
+        self._buffers = [bytearray(size) for _ in range(buffers)]
+        self._frames = [np.frombuffer(buffer, dtype=np.uint8).reshape(shape)
+                        for buffer in self._buffers]
+        self._condition = threading.Condition()
+        # Indexes of the newest frame and of the one held by the consumer.
+        self._latest = None
+        self._held = None
+        # Number of frames captured, and number of the last consumed one.
+        self.frame_count = 0
+        self._consumed = 0
+        self._stopped = False
+        # Exception that stopped the acquisition, if any.
+        self.error = None
+
+    def run(self):
+        """Capture frames until *stop* is called or the link fails."""
+        try:
+            while True:
+                index = self._get_free_buffer()
+                if index is None:
+                    break
+                if not self.camera.trigger_frame(self.tries):
+                    logger.warn("No frame captured after {} tries".format(
+                            self.tries))
+                    continue
+                buffer = self._buffers[index]
+                if self.camera.download_frame(self._command,
+                                              buffer) < len(buffer):
+                    continue
+                # Recorded as full frames, replayed with capture_frame.
+                self.camera._record_frame(self._command, self._frames[index])
+                with self._condition:
+                    self._latest = index
+                    self.frame_count += 1
+                    self._condition.notify_all()
+        except socket.error as error:
+            logger.error("Frame acquisition stopped: {}".format(error))
+            self.error = error
+        finally:
+            with self._condition:
+                self._stopped = True
+                self._condition.notify_all()
+
+    def _get_free_buffer(self):
+        """Wait for a buffer that can be written. None if stopped."""
+        with self._condition:
+            while not self._stopped:
+                for index in range(len(self._buffers)):
+                    if index not in (self._latest, self._held):
+                        return index
+                self._condition.wait()
+        return None
+
+    def get_frame(self, timeout=None):
+        """Wait for a frame newer than the last one consumed.
+
+        The buffer of the previously returned frame is released, and the
+        one of the new frame is held until the next call.
+
+        :param timeout: maximum time to wait, in seconds. If None, wait
+         until a new frame is available.
+        :type timeout: int, float or None
+        :return: number of the frame and the image array. (None, None)
+         after a timeout or if the acquisition stopped.
+        :rtype: int, numpy.array
+        """
+        with self._condition:
+            self._held = None
+            self._condition.notify_all()
+            if timeout is not None:
+                deadline = time.time() + timeout
+            while self.frame_count == self._consumed and not self._stopped:
+                if timeout is None:
+                    self._condition.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if self.frame_count == self._consumed:
+                return None, None
+            self._held = self._latest
+            self._consumed = self.frame_count
+            return self.frame_count, self._frames[self._held]
+
+    def stop(self):
+        """Stop the acquisition and wait for the thread to finish."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
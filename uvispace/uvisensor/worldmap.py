@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""This module contains the WorldMap class, a pixel to world lookup table.
+
+The points of the tracker contours are obtained in FPGA coordinates, and
+they are converted to the global arena coordinates with this chain of
+operations, whose parameters are fixed for each camera:
+
+* Scale from the FPGA to the image resolution, and swap the axes to the
+  image *[row, column]* convention.
+* Correct the lens barrel distortion.
+* Move to the global 4-quadrant system, with the camera offsets, scale
+  them with the ratio *K* and swap the axes to the cartesian
+  convention (see *geometry.Triangle.local2global*).
+* Apply the camera homography.
+
+A *WorldMap* evaluates the chain once for every FPGA pixel and stores
+the result in a table, so the conversion of any point becomes a
+bilinear interpolation of 4 table elements. The tables are saved as
+*.npy* files, and the next executions memory-map them instead of
+calculating them again. The name of the file is a hash of all the
+parameters of the chain, so a change in the configuration of a camera
+produces a new table.
+"""
+# Standard libraries
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+# Third party libraries
+import numpy as np
+# Local libraries
+import geometry
+import imgprocessing
+
+try:
+    # Logging setup.
+    import settings
+except ImportError:
+    # Exit program if the settings module can't be found.
+    sys.exit("Can't find settings module. Maybe environment variables are not"
+             "set. Run the environment .sh script at the project root folder.")
+logger = logging.getLogger("sensor")
+
+
+class WorldMap(object):
+    """Lookup table from FPGA pixel coordinates to global millimetres.
+
+    :param table: array of shape (height, width, 2) whose element [y, x]
+     contains the global cartesian coordinates of the FPGA pixel [x, y].
+     It can be a memory-mapped array.
+    :type table: numpy.array
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.shape = table.shape[:2]
+        self._limits = np.array([self.shape[1], self.shape[0]]) - 1
+
+    def lookup(self, points):
+        """Convert FPGA points to global cartesian coordinates.
+
+        The sub-pixel coordinates are bilinearly interpolated. The points
+        outside the table use the values of the nearest border pixels.
+
+        :param points: Mx2 array with the [x, y] FPGA coordinates e.g.
+         the contours given by *VideoSensor.get_locations*.
+        :return: Mx2 array with the [x, y] global coordinates.
+        :rtype: numpy.array
+        """
+        points = np.clip(np.asarray(points, dtype=np.float64), 0,
+                         self._limits)
+        base = np.minimum(np.floor(points).astype(int), self._limits - 1)
+        weights = points - base
+        x, y = base.T
+        x_weight = weights[:, 0:1]
+        y_weight = weights[:, 1:2]
+        top = (self.table[y, x] * (1 - x_weight)
+               + self.table[y, x + 1] * x_weight)
+        bottom = (self.table[y + 1, x] * (1 - x_weight)
+                  + self.table[y + 1, x + 1] * x_weight)
+        return top * (1 - y_weight) + bottom * y_weight
+
+
+def pixels_to_world(points, image_shape, scale, offsets, H, K=4,
+                    kx=0.035, ky=0.035):
+    """Convert FPGA points to global coordinates with the full chain.
+
+    This is the reference conversion evaluated by the tables, done as
+    in *CameraThread* before the tables were introduced.
+
+    :param points: array of points, with the [x, y] FPGA coordinates in
+     the last dimension.
+    :param image_shape: number of rows and columns of the camera images.
+    :type image_shape: (int, int)
+    :param float scale: ratio between the FPGA and image resolutions.
+    :param offsets: row and column offsets of the camera.
+    :type offsets: list[int, int]
+    :param H: homography matrix of the camera.
+    :type H: np.array(shape=3x3)
+    :param K: scale ratio between the images and the global system.
+    :param float kx: X-Axe Distortion coefficient of the lens.
+    :param float ky: Y-Axe Distortion coefficient of the lens.
+    :return: array of the same shape with the [x, y] global coordinates.
+    :rtype: numpy.array
+    """
+    points = np.asarray(points, dtype=np.float64)
+    # FPGA [x, y] to image [row, column] coordinates.
+    image_points = points[..., ::-1] / scale
+    maps = imgprocessing.get_distortion_maps(image_shape, kx, ky)
+    corrected = maps.evaluate(image_points)
+    # Local image coordinates to global cartesian ones.
+    cartesian = np.empty(corrected.shape)
+    cartesian[..., 0] = (corrected[..., 1] - offsets[1]) * K
+    cartesian[..., 1] = (offsets[0] - corrected[..., 0]) * K
+    return geometry.projective_transform(cartesian, H)
+
+
+def get_world_map(camera, K=4, kx=0.035, ky=0.035, cache_dir=None):
+    """Return the lookup table of a configured camera.
+
+    The table is loaded from the cache folder if it was already
+    calculated for the same parameters. Otherwise, it is calculated
+    and saved there.
+
+    :param camera: camera whose configuration was loaded.
+    :type camera: videosensor.VideoSensor
+    :param K: scale ratio between the images and the global system.
+    :param float kx: X-Axe Distortion coefficient of the lens.
+    :param float ky: Y-Axe Distortion coefficient of the lens.
+    :param str cache_dir: folder of the tables files. By default, the
+     temporary folder of the system.
+    :rtype: WorldMap
+    """
+    image_shape = (camera._params['height'], camera._params['width'])
+    scale = camera._scale
+    shape = (int(round(image_shape[0] * scale)),
+             int(round(image_shape[1] * scale)))
+    parameters = (shape, image_shape, scale, tuple(camera.offsets), K, kx, ky,
+                  np.asarray(camera._H, dtype=np.float64).tolist())
+    key = hashlib.sha1(repr(parameters)).hexdigest()[:16]
+    if cache_dir is None:
+        cache_dir = tempfile.gettempdir()
+    filename = os.path.join(cache_dir, 'uvispace_worldmap_{}.npy'.format(key))
+    if not os.path.exists(filename):
+        y, x = np.indices(shape, dtype=np.float64)
+        table = pixels_to_world(np.stack([x, y], axis=-1), image_shape,
+                                scale, camera.offsets, camera._H, K, kx, ky)
+        # Write to a temporary name, so a reader never finds a partial
+        # table of another process.
+        partial = '{}.{}.tmp'.format(filename, os.getpid())
+        with open(partial, 'wb') as table_file:
+            np.save(table_file, table.astype(np.float32))
+        os.rename(partial, filename)
+        logger.info("Saved world map of {} on {}".format(camera.filename,
+                                                         filename))
+    return WorldMap(np.load(filename, mmap_mode='r'))